@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+from array import array
+from typing import TYPE_CHECKING, Optional, Sequence
+
+from .cache import Cache, EvictedLine
+from .replacement import ReplacementPolicy, create_policy
+
+if TYPE_CHECKING:
+    from .mainmemory import PagedMemory
+
+
+class ArrayCache(Cache):
+    """
+    A cache that keeps the state of all lines in flat typed arrays rather than in one `CacheLine`
+    object per line.
+
+    Line 'way' of set 'index' is stored at slot `index * num_lines + way` of each array. This makes
+    large caches cheap to create and to copy (each array is copied as a single buffer), and allows
+    queries over the whole cache, like `residency()`, without visiting every line.
+
+    It supports all replacement policies of replacement.py, and behaves exactly like a
+    `PolicyCache` with the same policy.
+    """
+
+    # Tag of lines that are not in use
+    _INVALID = 0xFFFFFFFF
+
+    policy: ReplacementPolicy
+
+    # Tag of each line, or _INVALID
+    _tags: array
+    # Whether each line is in use
+    _valid: bytearray
+    # Data of each line, `line_size` entries per line, with -1 for no data. None in tag-only mode.
+    _data: Optional[array]
+
+    def __init__(
+        self,
+        num_sets: int,
+        num_lines: int,
+        line_size: int,
+        replacement_policy: str = "LRU",
+        decode_table: bool = False,
+        backing: Optional[PagedMemory] = None,
+        seed: Optional[int] = None,
+    ):
+        """
+        Parameters:
+            replacement_policy (str) -- the name of the replacement policy,
+                see replacement.py (default = "LRU").
+            seed (int) -- the seed of the random numbers used by the
+                replacement policy, if it uses any. None for a seed that
+                differs on every run (default = None).
+
+        See `Cache` for the other parameters.
+        """
+        super().__init__(num_sets, num_lines, line_size, decode_table, backing)
+        self.policy = create_policy(replacement_policy, num_sets, num_lines, seed)
+
+    def _create_lines(self) -> None:
+        num_slots = self.num_sets * self.num_lines
+        self._tags = array("L", [self._INVALID]) * num_slots
+        self._valid = bytearray(num_slots)
+        self._data = None
+        if self._backing is None:
+            self._data = array("h", [-1]) * (num_slots * self.line_size)
+
+    def _reset_replacement_state(self) -> None:
+        self.policy.reset()
+
+    def _find(self, index: int, tag: int) -> Optional[int]:
+        """Returns the way of the line holding 'tag' in set 'index', if any."""
+        start = index * self.num_lines
+        try:
+            return self._tags[start:start + self.num_lines].index(tag)
+        except ValueError:
+            return None
+
+    def _free_way(self, index: int) -> int:
+        start = index * self.num_lines
+        return self._valid.index(0, start, start + self.num_lines) - start
+
+    def _set_line_tag(self, index: int, way: int, tag: int) -> None:
+        slot = index * self.num_lines + way
+        self._tags[slot] = tag
+        self._valid[slot] = 1
+
+    def _select_victim(self, index: int) -> int:
+        return self.policy.victim(index)
+
+    def _update_replacement_state(self, index: int, way: int, filled: bool) -> None:
+        self.policy.touch(index, way, filled)
+
+    def _evict(self, index: int, way: int) -> Optional[EvictedLine]:
+        slot = index * self.num_lines + way
+        if not self._valid[slot]:
+            return None
+
+        evicted = EvictedLine(
+            (self._tags[slot] << self._tag_shift) | (index << self._offset_bits),
+            self.line_data(index, way),
+        )
+        self._tags[slot] = self._INVALID
+        self._valid[slot] = 0
+        if self._data is not None:
+            start = slot * self.line_size
+            self._data[start:start + self.line_size] = array("h", [-1]) * self.line_size
+        return evicted
+
+    def _replace_line(self, index: int, way: int, tag: int, offset: int, data: int) -> None:
+        self._evict(index, way)
+        self._set_line_tag(index, way, tag)
+        self._write_data(index, way, offset, data)
+        self._update_replacement_state(index, way, True)
+
+    def _write_data(self, index: int, way: int, offset: int, data: Optional[int]) -> None:
+        if self._data is not None and data is not None:
+            self._data[(index * self.num_lines + way) * self.line_size + offset] = data
+
+    def line_tag(self, index: int, way: int) -> Optional[int]:
+        slot = index * self.num_lines + way
+        return self._tags[slot] if self._valid[slot] else None
+
+    def line_data(self, index: int, way: int) -> list[int]:
+        slot = index * self.num_lines + way
+        if not self._valid[slot]:
+            return [None] * self.line_size
+        if self._data is None:
+            base_addr = (self._tags[slot] << self._tag_shift) | (index << self._offset_bits)
+            return list(self._backing[base_addr:base_addr + self.line_size])
+        start = slot * self.line_size
+        return [None if x < 0 else x for x in self._data[start:start + self.line_size]]
+
+    def read(self, addr: int, side_effects=True) -> int:
+        tag, index, offset = self.parse_addr(addr)
+
+        way = self._find(index, tag)
+        if self.stats is not None and side_effects:
+            self.stats.record_access(index, way is not None)
+        if way is None:
+            return None
+
+        if self._data is None:
+            data = self._backing[addr]
+        else:
+            data = self._data[(index * self.num_lines + way) * self.line_size + offset]
+            if data < 0:
+                data = None
+        if data is not None and side_effects:
+            self._update_replacement_state(index, way, False)
+        return data
+
+    def write(self, addr: int, data: int, side_effects: bool = True) -> None:
+        tag, index, offset = self.parse_addr(addr)
+
+        way = self._find(index, tag)
+        filled = way is None
+        if filled:
+            start = index * self.num_lines
+            full = all(self._valid[start:start + self.num_lines])
+            if self.stats is not None:
+                self.stats.fills[index] += 1
+                self.stats.evictions[index] += full
+
+            if full:
+                self._apply_replacement_policy(addr, data)
+                return
+
+            way = self._free_way(index)
+            self._set_line_tag(index, way, tag)
+
+        self._write_data(index, way, offset, data)
+        if side_effects:
+            self._update_replacement_state(index, way, filled)
+
+    def fill_line(
+        self, base_addr: int, data: Optional[Sequence[int]], side_effects: bool = True
+    ) -> Optional[EvictedLine]:
+        tag, index, offset = self.parse_addr(base_addr)
+
+        evicted = None
+        way = self._find(index, tag)
+        filled = way is None
+        if filled:
+            start = index * self.num_lines
+            if all(self._valid[start:start + self.num_lines]):
+                way = self._select_victim(index)
+                evicted = self._evict(index, way)
+                side_effects = True
+            else:
+                way = self._free_way(index)
+            self._set_line_tag(index, way, tag)
+            if self.stats is not None:
+                self.stats.fills[index] += 1
+                self.stats.evictions[index] += evicted is not None
+
+        if self._data is not None:
+            start = (index * self.num_lines + way) * self.line_size
+            # array() would read bytes-like data as raw shorts, so convert it to a list first
+            self._data[start:start + self.line_size] = array("h", list(data))
+        if side_effects:
+            self._update_replacement_state(index, way, filled)
+        return evicted
+
+    def flush(self, addr: int) -> None:
+        tag, index, offset = self.parse_addr(addr)
+
+        way = self._find(index, tag)
+        if way is not None:
+            self._evict(index, way)
+            if self.stats is not None:
+                self.stats.flushes[index] += 1
+
+    def flush_all(self) -> None:
+        if self.stats is not None:
+            for index in self.occupied_sets():
+                start = index * self.num_lines
+                self.stats.flushes[index] += sum(self._valid[start:start + self.num_lines])
+
+        num_slots = self.num_sets * self.num_lines
+        self._tags = array("L", [self._INVALID]) * num_slots
+        self._valid = bytearray(num_slots)
+        if self._data is not None:
+            self._data = array("h", [-1]) * (num_slots * self.line_size)
+        self._reset_replacement_state()
+
+    def residency(self) -> bytes:
+        """
+        Returns whether each line is in use, one byte per line (1 if in
+        use), ordered by set and then by way.
+        """
+        return bytes(self._valid)
+
+    def occupied_sets(self) -> list[int]:
+        """Returns the indices of all sets with at least one line in use."""
+        empty = bytes(self.num_lines)
+        return [
+            index for index in range(self.num_sets)
+            if self._valid[index * self.num_lines:(index + 1) * self.num_lines] != empty
+        ]
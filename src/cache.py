@@ -1,23 +1,27 @@
 from __future__ import annotations
 
-import math
-import random
-from time import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional, Sequence
 # from word import Word
+from .replacement import ReplacementPolicy, create_policy
 from .word import Word
 
+if TYPE_CHECKING:
+    from .mainmemory import PagedMemory
+
+# Decode tables shared by all caches with the same number of sets and line size, see
+# Cache.parse_addr()
+_decode_tables: dict[tuple[int, int], list[tuple[int, int, int]]] = {}
+
 
 class CacheLine:
     """
     A helper class representing a cache line in a cache.
 
-    It may be used if no additional data is needed to
-    implement the cache replacement policy. An example of
-    this is the random replacement policy.
-
-    If additional information, such as the last time of
-    access, is needed by the replacement policy, this
-    class should be extended accordingly.
+    A line only holds its tag and data. Any state needed
+    by the replacement policy, such as the order in which
+    lines were accessed, is kept by the cache, see
+    Cache._update_replacement_state().
     """
     data: list[int]
     tag: int
@@ -108,13 +112,88 @@ class CacheLine:
 
         self.set_tag(None)
 
+    def fill(self, data: Sequence[int]) -> None:
+        """
+        Replaces all data held by this cache line.
+
+        Parameters:
+            data (Sequence[int]) -- the new data, one entry per offset
+
+        Returns:
+            This function does not have a return value.
+        """
+        self.data[:] = data
+
+
+@dataclass
+class EvictedLine:
+    """A line that was evicted from a cache to make room for another one."""
+
+    # Address of the first byte of the line
+    address: int
+    # Data held by the line
+    data: list[int]
+
+
+class CacheStats:
+    """
+    Counters of the events of a cache, for each set. Only accesses with side effects are counted
+    as hits and misses.
+    """
+
+    # Number of each event, for each set
+    hits: list[int]
+    misses: list[int]
+    # Lines that were filled with a new tag
+    fills: list[int]
+    # Lines that were evicted to make room for another one
+    evictions: list[int]
+    # Lines that were flushed
+    flushes: list[int]
+
+    def __init__(self, num_sets: int):
+        self.hits = [0] * num_sets
+        self.misses = [0] * num_sets
+        self.fills = [0] * num_sets
+        self.evictions = [0] * num_sets
+        self.flushes = [0] * num_sets
+
+    def record_access(self, index: int, hit: bool) -> None:
+        """Counts an access to set 'index' as a hit or a miss."""
+        if hit:
+            self.hits[index] += 1
+        else:
+            self.misses[index] += 1
+
+    def totals(self) -> dict[str, int]:
+        """Returns the number of each event over all sets."""
+        return {
+            "hits": sum(self.hits),
+            "misses": sum(self.misses),
+            "fills": sum(self.fills),
+            "evictions": sum(self.evictions),
+            "flushes": sum(self.flushes),
+        }
+
+    @property
+    def hit_rate(self) -> float:
+        """The share of accesses that hit."""
+        hits = sum(self.hits)
+        accesses = hits + sum(self.misses)
+        return hits / accesses if accesses else 0.0
+
 
 class Cache:
     """
     An abstract class implementing a cache. Using this class directly is not possible, as it
     does not implement any cache replacement policies.
 
-    Instead, use any of the following classes: CacheRR, CacheLRU, CacheFIFO
+    Instead, use `PolicyCache` with any replacement policy from replacement.py, or any of the
+    following classes: CacheRR, CacheLRU, CacheFIFO
+
+    Since the memory subsystem writes through to main memory, the data held by the cache always
+    equals the contents of main memory. In tag-only mode, the cache therefore only keeps the tags
+    and replacement state of its lines, and reads the data from main memory when it is needed.
     """
 
     num_sets: int
@@ -122,17 +201,105 @@ class Cache:
     line_size: int
     sets: list[list[CacheLine]]
 
-    def __init__(self, num_sets: int, num_lines: int, line_size: int):
-        self.sets = [[CacheLine(line_size) for a in range(num_lines)]
-                     for b in range(num_sets)]
+    # Way of every line in use, by tag, for each set
+    _ways: list[dict[int, int]]
+
+    # Address decoding, see parse_addr()
+    _offset_bits: int
+    _offset_mask: int
+    _index_mask: int
+    _tag_shift: int
+    # (tag, index, offset) of every address, or None to compute them on every access
+    _decode_table: Optional[list[tuple[int, int, int]]]
+    # Main memory the data is read from in tag-only mode, or None if lines hold their data
+    _backing: Optional[PagedMemory]
+    # Counters of the events of the cache, or None if they are not counted
+    stats: Optional[CacheStats]
+
+    def __init__(
+        self,
+        num_sets: int,
+        num_lines: int,
+        line_size: int,
+        decode_table: bool = False,
+        backing: Optional[PagedMemory] = None,
+    ):
+        """
+        Parameters:
+            num_sets (int) -- the number of sets, a power of two.
+            num_lines (int) -- the number of lines (ways) per set.
+            line_size (int) -- the number of bytes per line, a power of two.
+            decode_table (bool) -- whether to decode addresses using a table
+                precomputed for the whole address space (default = False).
+            backing (PagedMemory) -- if given, the cache is in tag-only mode
+                and reads its data from this memory (default = None).
+        """
+        self._backing = backing
+        self.stats = None
 
         if num_sets <= 0 or num_lines <= 0 or line_size <= 0:
             raise Exception("Invalid cache parameters.")
+        if num_sets & (num_sets - 1) != 0 or line_size & (line_size - 1) != 0:
+            raise Exception("The number of sets and the line size must be powers of two.")
 
         self.num_sets = num_sets
         self.num_lines = num_lines
         self.line_size = line_size
 
+        self._offset_bits = line_size.bit_length() - 1
+        self._offset_mask = line_size - 1
+        self._index_mask = num_sets - 1
+        self._tag_shift = self._offset_bits + num_sets.bit_length() - 1
+        if self._tag_shift >= Word.WIDTH:
+            raise Exception("Not enough bits for cache tag left")
+
+        self._decode_table = self._get_decode_table() if decode_table else None
+
+        self._create_lines()
+
+    def _create_lines(self) -> None:
+        """Creates the empty lines of the cache."""
+        # Lines in tag-only mode do not hold any data
+        line_size = self.line_size if self._backing is None else 0
+        self.sets = [[CacheLine(line_size) for a in range(self.num_lines)]
+                     for b in range(self.num_sets)]
+        self._ways = [{} for b in range(self.num_sets)]
+
+    def enable_stats(self) -> CacheStats:
+        """Starts counting the events of the cache, and returns the counters."""
+        self.stats = CacheStats(self.num_sets)
+        return self.stats
+
+    @property
+    def tag_only(self) -> bool:
+        """Whether the cache only keeps tags, and reads its data from main memory."""
+        return self._backing is not None
+
+    def __getstate__(self) -> dict:
+        # The decode table is shared and much larger than the cache itself, so it is not copied
+        state = self.__dict__.copy()
+        state["_decode_table"] = self._decode_table is not None
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._decode_table = self._get_decode_table() if state["_decode_table"] else None
+
+    def _get_decode_table(self) -> list[tuple[int, int, int]]:
+        """Returns the decode table for the geometry of this cache, computing it if needed."""
+        key = (self.num_sets, self.line_size)
+        if key not in _decode_tables:
+            _decode_tables[key] = [self._decode(addr) for addr in range(1 << Word.WIDTH)]
+        return _decode_tables[key]
+
+    def _decode(self, addr: int) -> tuple[int, int, int]:
+        """Splits an address into tag, index, and offset."""
+        return (
+            addr >> self._tag_shift,
+            (addr >> self._offset_bits) & self._index_mask,
+            addr & self._offset_mask,
+        )
+
     def parse_addr(self, addr: int) -> tuple[int, int, int]:
         """
         Parses the given address and returns a 3-tuple consisting of
@@ -144,28 +311,9 @@ class Cache:
         Returns:
             tuple[int, int, int]: tag, index, offset
         """
-        num_offset_bits = math.floor(math.log2(self.line_size))
-        num_index_bits = math.floor(math.log2(self.num_sets))
-        num_tag_bits = Word.WIDTH - num_offset_bits - num_index_bits
-
-        if num_tag_bits == 0:
-            raise Exception("Not enough bits for cache tag left")
-
-        addr_bits = bin(addr)[2:].zfill(Word.WIDTH)
-        tag = int(addr_bits[:num_tag_bits], base=2)
-
-        index = 0
-        if num_index_bits > 0:
-            index = int(
-                addr_bits[num_tag_bits:num_tag_bits + num_index_bits], base=2
-            )
-
-        offset = 0
-        if num_offset_bits != 0:
-            offset = int(addr_bits[num_tag_bits + num_index_bits:], base=2
-                         )
-
-        return tag, index, offset
+        if self._decode_table is not None:
+            return self._decode_table[addr]
+        return self._decode(addr)
 
     def _apply_replacement_policy(self, addr: int, data: int) -> None:
         """
@@ -181,8 +329,103 @@ class Cache:
         Returns:
             This function does not have a return value.
         """
+        tag, index, offset = self.parse_addr(addr)
+        self._replace_line(index, self._select_victim(index), tag, offset, data)
+
+    def _select_victim(self, index: int) -> int:
+        """
+        Chooses the line to be replaced in set 'index', according to the
+        replacement policy. When called, all cache lines of the set must be
+        already in use.
+
+        Parameters:
+            index (int) -- the index of the set
+
+        Returns:
+            int: The way of the line to be replaced.
+        """
         raise Exception("Cache Replacement Policy not implemented.")
 
+    def _update_replacement_state(self, index: int, way: int, filled: bool) -> None:
+        """
+        Updates the state of the replacement policy after an access with
+        side effects. Policies that do not depend on the accesses, like
+        random replacement, do not need to overwrite this.
+
+        Parameters:
+            index (int) -- the index of the accessed set
+            way (int) -- the way of the accessed line within the set
+            filled (bool) -- whether the access filled the line with a
+                new tag, rather than accessing a line already in use.
+
+        Returns:
+            This function does not have a return value.
+        """
+
+    def _replace_line(self, index: int, way: int, tag: int, offset: int, data: int) -> None:
+        """
+        Evicts the line at 'way' of set 'index' and fills it with 'data'
+        for 'tag'. The replacement counts as an access with side effects.
+        """
+        self._evict(index, way)
+        self._set_line_tag(index, way, tag)
+        if self._backing is None:
+            self.sets[index][way].write(offset, data)
+        self._update_replacement_state(index, way, True)
+
+    def _evict(self, index: int, way: int) -> Optional[EvictedLine]:
+        """Flushes the line at 'way' of set 'index', returning what it held."""
+        line = self.sets[index][way]
+        if not line.is_in_use():
+            return None
+
+        evicted = EvictedLine(
+            (line.tag << self._tag_shift) | (index << self._offset_bits), self.line_data(index, way)
+        )
+        del self._ways[index][line.tag]
+        line.flush()
+        return evicted
+
+    def _free_way(self, index: int) -> int:
+        """Returns the first line of set 'index' that is not in use."""
+        return next(i for i, line in enumerate(self.sets[index]) if not line.is_in_use())
+
+    def _set_line_tag(self, index: int, way: int, tag: int) -> None:
+        """Assigns 'tag' to the line at 'way' of set 'index'."""
+        self.sets[index][way].set_tag(tag)
+        self._ways[index][tag] = way
+
+    def line_tag(self, index: int, way: int) -> Optional[int]:
+        """
+        Returns the tag of a cache line, or None if the line is not in use.
+
+        Parameters:
+            index (int) -- the index of the set
+            way (int) -- the way of the line within the set
+        """
+        return self.sets[index][way].tag
+
+    def line_data(self, index: int, way: int) -> list[int]:
+        """
+        Returns a copy of the data held by a cache line. In tag-only mode,
+        the data is read from main memory.
+
+        Parameters:
+            index (int) -- the index of the set
+            way (int) -- the way of the line within the set
+
+        Returns:
+            list[int]: The data at each offset of the line, all None if the
+                line is not in use.
+        """
+        line = self.sets[index][way]
+        if self._backing is None:
+            return list(line.data)
+        if not line.is_in_use():
+            return [None] * self.line_size
+        base_addr = (line.tag << self._tag_shift) | (index << self._offset_bits)
+        return list(self._backing[base_addr:base_addr + self.line_size])
+
     def read(self, addr: int, side_effects=True) -> int:
         """
         Returns the data at address addr as an integer.
@@ -201,11 +444,19 @@ class Cache:
 
         tag, index, offset = self.parse_addr(addr)
 
-        for i in range(self.num_lines):
-            if self.sets[index][i].check_tag(tag):
-                return self.sets[index][i].read(offset, side_effects)
+        way = self._ways[index].get(tag)
+        if self.stats is not None and side_effects:
+            self.stats.record_access(index, way is not None)
+        if way is None:
+            return None
 
-        return None
+        if self._backing is not None:
+            data = self._backing[addr]
+        else:
+            data = self.sets[index][way].read(offset, side_effects)
+        if data is not None and side_effects:
+            self._update_replacement_state(index, way, False)
+        return data
 
     def write(self, addr: int, data: int, side_effects: bool = True) -> None:
         """
@@ -224,17 +475,71 @@ class Cache:
         """
         tag, index, offset = self.parse_addr(addr)
 
-        # check if all cache lines of the corresponding cache
-        # set are already in use.
-        for i in range(self.num_lines):
-            if not self.sets[index][i].is_in_use():
-                self.sets[index][i].set_tag(tag)
-            if self.sets[index][i].check_tag(tag):
-                self.sets[index][i].write(offset, data, side_effects)
+        way = self._ways[index].get(tag)
+        filled = way is None
+        if filled:
+            full = len(self._ways[index]) == self.num_lines
+            if self.stats is not None:
+                self.stats.fills[index] += 1
+                self.stats.evictions[index] += full
+
+            # apply replacement policy if all cache lines of the
+            # corresponding cache set are already in use.
+            if full:
+                self._apply_replacement_policy(addr, data)
                 return
 
-        # apply replacement policy of all cache lines are in use
-        self._apply_replacement_policy(addr, data)
+            # otherwise, use the first free line
+            way = self._free_way(index)
+            self._set_line_tag(index, way, tag)
+
+        if self._backing is None:
+            self.sets[index][way].write(offset, data, side_effects)
+        if side_effects:
+            self._update_replacement_state(index, way, filled)
+
+    def fill_line(
+        self, base_addr: int, data: Optional[Sequence[int]], side_effects: bool = True
+    ) -> Optional[EvictedLine]:
+        """
+        Caches a whole line of data at once. If the line is not cached yet,
+        the replacement policy is applied at most once.
+
+        Parameters:
+            base_addr (int) -- the address of the line. Note that the
+                offset does not matter.
+            data (Sequence[int]) -- the data of the line, 'line_size'
+                entries. Ignored in tag-only mode, where it may be None.
+            side_effects (bool) -- whether the fill should have an effect
+                on caches that use access times for their replacement
+                policy, like LRU. Replacing a line always has an effect.
+
+        Returns:
+            EvictedLine: The line that was evicted to make room for the new
+                one, or None if no line was evicted.
+        """
+        tag, index, offset = self.parse_addr(base_addr)
+
+        evicted = None
+        way = self._ways[index].get(tag)
+        filled = way is None
+        if filled:
+            if len(self._ways[index]) == self.num_lines:
+                way = self._select_victim(index)
+                evicted = self._evict(index, way)
+                side_effects = True
+            else:
+                way = self._free_way(index)
+            self._set_line_tag(index, way, tag)
+            if self.stats is not None:
+                self.stats.fills[index] += 1
+                self.stats.evictions[index] += evicted is not None
+
+        if self._backing is None:
+            self.sets[index][way].fill(data)
+        if side_effects:
+            self._update_replacement_state(index, way, filled)
+        return evicted
 
     def flush(self, addr: int) -> None:
         """
@@ -249,10 +554,33 @@ class Cache:
 
         tag, index, offset = self.parse_addr(addr)
 
-        for i in range(self.num_lines):
-            if self.sets[index][i].check_tag(tag):
-                self.sets[index][i].flush()
-                return
+        way = self._ways[index].pop(tag, None)
+        if way is not None:
+            self.sets[index][way].flush()
+            if self.stats is not None:
+                self.stats.flushes[index] += 1
+
+    def flush_all(self) -> None:
+        """
+        Removes all data from the cache, and resets the state of the
+        replacement policy as if the cache had just been created.
+
+        Returns:
+            This function does not have a return value.
+        """
+        for index in range(self.num_sets):
+            for way in self._ways[index].values():
+                self.sets[index][way].flush()
+            if self.stats is not None:
+                self.stats.flushes[index] += len(self._ways[index])
+            self._ways[index].clear()
+        self._reset_replacement_state()
+
+    def _reset_replacement_state(self) -> None:
+        """
+        Resets the state of the replacement policy of all sets. Policies
+        that do not depend on the accesses do not need to overwrite this.
+        """
 
     def get_num_sets(self):
         """Returns the number of sets this cache uses."""
@@ -298,8 +626,8 @@ class Cache:
             "sets": [
                 [
                     {
-                        "data": self.sets[i][j].data,
-                        "tag": self.sets[i][j].tag
+                        "data": self.line_data(i, j),
+                        "tag": self.line_tag(i, j)
                     } for j in range(self.num_lines)
                 ] for i in range(self.num_sets)],
             "num_sets": self.get_num_sets(),
@@ -309,130 +637,84 @@ class Cache:
         return cache
 
 
-class CacheRR(Cache):
-    """A cache implementing the random replacement policy."""
-
-    def __init__(self, num_sets: int, num_lines: int, line_size: int):
-        super().__init__(num_sets, num_lines, line_size)
-
-    def _apply_replacement_policy(self, addr: int, data: int) -> None:
-        tag, index, offset = self.parse_addr(addr)
-
-        replaceIndex = random.randrange(self.num_lines)
-        self.sets[index][replaceIndex].flush()
-        self.sets[index][replaceIndex].set_tag(tag)
-        self.sets[index][replaceIndex].write(offset, data)
-
-
-class CacheLineLRU(CacheLine):
+class PolicyCache(Cache):
     """
-    A helper class representing a cache line in a cache that
-    implements the least-recently-used replacement policy.
+    A cache using a replacement policy from the registry in replacement.py, chosen by its name.
     """
 
-    # update this variable each time we read/write.
-    lru_timestamp: float
-
-    def __init__(self, line_size: int):
-        super().__init__(line_size)
-        self.lru_timestamp = time()
-
-    def read(self, offset: int, side_effects: bool = True) -> int:
-        data = super().read(offset)
-        if data is not None and side_effects:
-            self.lru_timestamp = time()
-        return data
-
-    def write(self, offset, data: int, side_effects: bool = True) -> None:
-        super().write(offset, data)
-
-        if side_effects:
-            self.lru_timestamp = time()
-
-    def get_lru_time(self):
-        return self.lru_timestamp
-
-
-class CacheLRU(Cache):
-    """A cache implementing the least-recently-used replacement policy."""
-
-    def __init__(self, num_sets: int, num_lines: int, line_size: int):
-        super().__init__(num_sets, num_lines, line_size)
-        self.sets = [[CacheLineLRU(line_size) for a in range(
-            num_lines)] for b in range(num_sets)]
-
-    def _apply_replacement_policy(self, addr: int, data: int) -> None:
-        """
-        Implements a least-recently-used policy by using the lru_timestamp variable
-        from CacheLineLRU.
+    policy: ReplacementPolicy
+
+    def __init__(
+        self,
+        num_sets: int,
+        num_lines: int,
+        line_size: int,
+        replacement_policy: str = "LRU",
+        decode_table: bool = False,
+        backing: Optional[PagedMemory] = None,
+        seed: Optional[int] = None,
+    ):
         """
+        Parameters:
+            replacement_policy (str) -- the name of the replacement policy,
+                see replacement.py (default = "LRU").
+            seed (int) -- the seed of the random numbers used by the
+                replacement policy, if it uses any. None for a seed that
+                differs on every run (default = None).
 
-        tag, index, offset = self.parse_addr(addr)
-
-        lru_index = 0
-        lru_time = self.sets[index][0].get_lru_time()
-        for i in range(self.num_lines):
-            if self.sets[index][i].get_lru_time() < lru_time:
-                lru_index = i
-                lru_time = self.sets[index][i].get_lru_time()
-
-        self.sets[index][lru_index].flush()
-        self.sets[index][lru_index].set_tag(tag)
-        self.sets[index][lru_index].write(offset, data)
-
-
-class CacheLineFIFO(CacheLine):
-    """
-    A helper class representing a cache line in a cache that
-    implements the first-in-first-out replacement policy.
-    """
-
-    # update this variable on the first write/on initialization.
-    first_write: float
-
-    def __init__(self, line_size: int):
-        super().__init__(line_size)
-        self.first_write = time()
-
-    def write(self, offset: int, data: int, side_effects: bool = True) -> None:
-        empty = True
-        for i in range(self.line_size):
-            if self.data[i] is not None:
-                empty = False
-                break
-
-        if empty and side_effects:
-            self.first_write = time()
-
-        super().write(offset, data, side_effects)
-
-    def get_fifo_time(self):
-        return self.first_write
-
-
-class CacheFIFO(Cache):
-    """A Cache implementing the first-in-first-out replacement policy."""
-
-    def __init__(self, num_sets: int, num_lines: int, line_size: int):
-        super().__init__(num_sets, num_lines, line_size)
-        self.sets = [[CacheLineFIFO(line_size) for a in range(
-            num_lines)] for b in range(num_sets)]
-
-    def _apply_replacement_policy(self, addr: int, data: int) -> None:
-        """
-        Implements a least-recently-used policy by using the first_write variable
-        from CacheLineFIFO.
+        See `Cache` for the other parameters.
         """
-
-        tag, index, offset = self.parse_addr(addr)
-
-        fifo_index = 0
-        fifo_time = self.sets[index][0].get_fifo_time()
-        for i in range(self.num_lines):
-            if self.sets[index][i].get_fifo_time() < fifo_time:
-                fifo_index = i
-                fifo_time = self.sets[index][i].get_fifo_time()
-
-        self.sets[index][fifo_index].flush()
-        self.sets[index][fifo_index].set_tag(tag)
-        self.sets[index][fifo_index].write(offset, data)
+        super().__init__(num_sets, num_lines, line_size, decode_table, backing)
+        self.policy = create_policy(replacement_policy, num_sets, num_lines, seed)
+
+    def _select_victim(self, index: int) -> int:
+        return self.policy.victim(index)
+
+    def _update_replacement_state(self, index: int, way: int, filled: bool) -> None:
+        self.policy.touch(index, way, filled)
+
+    def _reset_replacement_state(self) -> None:
+        self.policy.reset()
+
+
+class CacheRR(PolicyCache):
+    """A cache implementing the random replacement policy, see `RandomPolicy`."""
+
+    def __init__(
+        self,
+        num_sets: int,
+        num_lines: int,
+        line_size: int,
+        decode_table: bool = False,
+        backing: Optional[PagedMemory] = None,
+        seed: Optional[int] = None,
+    ):
+        super().__init__(num_sets, num_lines, line_size, "RR", decode_table, backing, seed)
+
+
+class CacheLRU(PolicyCache):
+    """A cache implementing the least-recently-used replacement policy, see `LRUPolicy`."""
+
+    def __init__(
+        self,
+        num_sets: int,
+        num_lines: int,
+        line_size: int,
+        decode_table: bool = False,
+        backing: Optional[PagedMemory] = None,
+    ):
+        super().__init__(num_sets, num_lines, line_size, "LRU", decode_table, backing)
+
+
+class CacheFIFO(PolicyCache):
+    """A cache implementing the first-in-first-out replacement policy, see `FIFOPolicy`."""
+
+    def __init__(
+        self,
+        num_sets: int,
+        num_lines: int,
+        line_size: int,
+        decode_table: bool = False,
+        backing: Optional[PagedMemory] = None,
+    ):
+        super().__init__(num_sets, num_lines, line_size, "FIFO", decode_table, backing)
@@ -1,15 +1,17 @@
 from __future__ import annotations
 
-import copy
-
 from .bpu import BPU, SimpleBPU
 from .execution import ExecutionEngine, FaultInfo
 from .frontend import Frontend, InstrFrontendInfo
 from .instructions import InstructionKind, InstrBranch, InstrFlush, InstrLoad, InstrStore
 from .memory import MemorySubsystem
 from .parser import Parser
+from .snapshot import SnapshotStore, snapshot_stores
 
 from dataclasses import dataclass
+from typing import Optional
+import mmap
+import os
 
 
 @dataclass
@@ -31,9 +33,6 @@ class CPUStatus:
     issued_instructions: list[int]
 
 
-_snapshots: list[CPU] = []
-
-
 class CPU:
 
     _parser: Parser
@@ -47,14 +46,27 @@ class CPU:
     # Execution engine.
     _exec_engine: ExecutionEngine
 
+    # History of this CPU, shared with all CPU instances restored from it.
+    _snapshots: SnapshotStore
+
     # Index for snapshot list.
     _snapshot_index: int
 
+    # Whether the state was changed other than by executing a cycle since the last snapshot.
+    _edited: bool
+
     _config: dict
 
     _microprograms: dict[str, list]
 
-    def __init__(self, config: dict):
+    def __init__(self, config: dict, snapshot_store: Optional[SnapshotStore] = None):
+        """
+        Parameters:
+            config (dict) -- the configuration, as read from config.yml.
+            snapshot_store (SnapshotStore) -- the store recording the history
+                of this CPU. If None, the store is created as selected by the
+                History section of the config.
+        """
 
         self._config = config
 
@@ -86,10 +98,16 @@ class CPU:
             self._microprograms[instr_type.lower()] = (filename, self._parser.parse(source))
 
         # Snapshots
-        global _snapshots
+        if snapshot_store is None:
+            history_conf = config["History"]
+            if history_conf["store"] not in snapshot_stores:
+                raise Exception("Unknown snapshot store. Check the config.yml file.")
+            snapshot_store = snapshot_stores[history_conf["store"]].from_config(history_conf)
+
+        self._snapshots = snapshot_store
         self._snapshot_index = 0
-        _snapshots = []
-        _snapshots.append(copy.deepcopy(self))
+        self._edited = False
+        self._snapshots.append(self)
 
     def load_program_from_file(self, path: str):
         """Loads a program given a file path."""
@@ -97,15 +115,43 @@ class CPU:
             source = f.read()
         self.load_program(source)
 
+    def load_image_from_file(self, path: str, base: int = 0):
+        """
+        Maps a binary file into main memory, starting at address 'base'.
+        Access rights are not checked, so data can also be placed in the
+        inaccessible upper half of memory. Load images before the program,
+        so the snapshot taken when loading the program includes them.
+        """
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as image:
+                self._mem.load_image(image, base)
+        self.notify_edit()
+
+    def dump_image_to_file(self, path: str, start: int = 0, end: Optional[int] = None):
+        """
+        Writes the contents of main memory from address 'start' up to
+        (excluding) 'end' to a binary file. By default, all of memory is
+        written.
+        """
+        image = self._mem.dump_image(start, end)
+        with open(path, "wb") as f:
+            f.write(image)
+
     def load_program(self, source: str):
         """
         Loads a program given the source code.
-        Initializes the frontend and execution engine.
+        Writes the data of its data directives to memory, and
+        initializes the frontend and execution engine.
         """
-        instructions = self._parser.parse(source)
+        program = self._parser.parse_program(source)
+
+        for base, data in program.data:
+            self._mem.load_image(data, base)
 
         # Initialize frontend
-        self._frontend = Frontend(self._bpu, instructions, self._config)
+        self._frontend = Frontend(self._bpu, program.instructions, self._config)
         # Reset reservation stations?
         self._exec_engine = ExecutionEngine(self._mem, self._bpu, self._config)
 
@@ -122,10 +168,55 @@ class CPU:
                 details on this class.
         """
 
+        cpu_status = self._tick()
+
         # check if any program is being executed
+        if cpu_status is None:
+            return CPUStatus(False, None, None, [])
+
+        # create snapshot
+        self._take_snapshot(ticked=True)
+
+        return cpu_status
+
+    def run(self, max_cycles: int = -1) -> CPUStatus:
+        """
+        Executes cycles until the program finishes, without stopping at faults.
+
+        Parameters:
+            max_cycles (int) -- the maximum number of cycles to execute, or a
+                negative number to execute until the program finishes.
+
+        Returns:
+            status (CPUStatus): The status of the last executed cycle, or
+                the current one if no cycle is executed.
+        """
         if self._frontend is None:
             return CPUStatus(False, None, None, [])
 
+        cpu_status = CPUStatus(
+            not (self._frontend.is_done() and self._exec_engine.is_done()), None, None, []
+        )
+        cycles = 0
+        while cpu_status.executing_program and (max_cycles < 0 or cycles < max_cycles):
+            cpu_status = self._tick()
+            self._take_snapshot(ticked=True)
+            cycles += 1
+
+        return cpu_status
+
+    def _tick(self) -> Optional[CPUStatus]:
+        """
+        Executes one cycle without taking a snapshot.
+
+        Returns:
+            status (CPUStatus): See tick(). None if no program is loaded.
+        """
+
+        # check if any program is being executed
+        if self._frontend is None:
+            return None
+
         cpu_status: CPUStatus = CPUStatus(True, None, None, [])
 
         # fill execution units
@@ -140,7 +231,10 @@ class CPU:
                 break
 
         # tick execution engine
-        if (fault_info := self._exec_engine.tick()) is not None:
+        fault_info = self._exec_engine.tick()
+        # advance outstanding cache misses
+        self._mem.tick()
+        if fault_info is not None:
             cpu_status.fault_info = fault_info
 
             resume_at_pc = fault_info.pc
@@ -178,9 +272,6 @@ class CPU:
         # fill up instruction queue
         self._frontend.add_instructions_to_queue()
 
-        # create snapshot
-        self._take_snapshot()
-
         if self._frontend.is_done() and self._exec_engine.is_done():
             return CPUStatus(False, None, None, [])
 
@@ -207,44 +298,44 @@ class CPU:
         '''Returns an instance of the ExecutionEngine class.'''
         return self._exec_engine
 
-    def _take_snapshot(self) -> None:
+    def notify_edit(self) -> None:
         """
-        This function creates a snapshot of the current CPU instance by deepcopying
-        it and adding an entry to the global snapshot list. Note that the snapshot
-        list is not part of the CPU class.
+        Notifies the CPU that its state was changed other than by executing a
+        cycle, e.g. by the user editing memory or registers. The next snapshot
+        is then recorded in full rather than relying on replaying the cycle.
         """
-        global _snapshots
+        self._edited = True
 
-        if self._snapshot_index < len(_snapshots) - 1:
-            # The snapshot index is not pointing to the last snapshot in the list.
+    def _take_snapshot(self, ticked: bool = False) -> None:
+        """
+        This function records a snapshot of the current CPU instance in its
+        snapshot store. See snapshot.py for how the different stores record
+        snapshots.
+
+        Parameters:
+            ticked (bool) -- whether the snapshot is taken right after executing
+                a cycle.
+        """
+        if not self._snapshots.keeps_history:
+            return
+
+        if self._snapshot_index < len(self._snapshots) - 1:
+            # The snapshot index is not pointing to the last snapshot in the journal.
             # This means a snapshot was restored recently. After doing so, it would
             # still have been possible to go forward to newer snapshots again.
             # But, now we create a new snapshot. Rather than keeping multiple lists
             # of snapshots that allow users to switch between different execution
             # paths, we forget about the snapshots that were taken after the point
             # to which we restored.
-            # It is important that we copy the cpu instance stored in the snapshot
-            # list, rather than using "self.deepcopy()" here. In case this class
-            # instance (self) was changed before taking this snapshot, we would
-            # be altering the snapshot list at the index pointed to by snapshot_index.
-            current_cpu = copy.deepcopy(_snapshots[self._snapshot_index])
-
-            # Now we strip the snapshot list of all more recent invalid snapshots.
-            _snapshots = _snapshots[: self._snapshot_index]
-            _snapshots.append(current_cpu)
-
-            # Finally, we can add the potentially modified version of this instance
-            # to the snapshot list (as the most recent snapshot).
+            self._snapshots.truncate(self._snapshot_index + 1)
 
         self._snapshot_index += 1
-        cpu_copy = copy.deepcopy(self)
-
-        _snapshots.append(cpu_copy)
+        self._snapshots.append(self, ticked and not self._edited)
+        self._edited = False
 
-    def get_snapshots(self) -> list[CPU]:
+    def get_snapshots(self) -> SnapshotStore:
         """ Returns the current snapshots. """
-        global _snapshots
-        return _snapshots
+        return self._snapshots
 
     @staticmethod
     def restore_snapshot(cpu: CPU, steps: int) -> CPU:
@@ -257,16 +348,21 @@ class CPU:
             steps (int) -- How many time steps away the desired snapshot is.
 
         Returns:
-            CPU: A deepcopy of the corresponding CPU instance from the snapshot list.
+            CPU: A new CPU instance reconstructed from the snapshot store.
         """
-        global _snapshots
-        if cpu._snapshot_index + steps < 1 or cpu._snapshot_index + steps >= len(_snapshots):
+        snapshots = cpu._snapshots
+        if cpu._snapshot_index + steps < 1 or cpu._snapshot_index + steps >= len(snapshots):
             return None
 
-        # Returning copies is important, as otherwise a manipulation
-        # of the returned cpu instance (for example, calling tick),
-        # changes the class that is stored in the snapshot list.
-        return copy.deepcopy(_snapshots[cpu._snapshot_index + steps])
+        # The instructions in flight are left behind, so the outcome of their
+        # traced accesses is never seen
+        if cpu._mem.tracer is not None:
+            cpu._mem.tracer.abandon()
+
+        # The store always reconstructs a new instance, so manipulating the
+        # returned cpu instance (for example, calling tick) does not change
+        # the recorded history.
+        return snapshots[cpu._snapshot_index + steps]
 
     def _pick_microprogram(self, instr_type: InstructionKind) -> tuple(str, list):
         """
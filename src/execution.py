@@ -379,11 +379,15 @@ class _SlotLoad(_SlotMem):
     def _perform_access(self) -> Optional[MemResult]:
         assert self.address is not None
 
+        # Wait until there are MSHRs for the lines the load misses
+        if not self.memory.request_mshrs(self.address, self.instr_ty.width):
+            return None
+
         # Perform the load operation
         if self.instr_ty.width_byte:
-            return self.memory.read_byte(self.address)
+            return self.memory.read_byte(self.address, pc=self.pc)
         else:
-            return self.memory.read_word(self.address)
+            return self.memory.read_word(self.address, pc=self.pc)
 
 
 class _SlotStore(_SlotMem):
@@ -406,9 +410,9 @@ class _SlotStore(_SlotMem):
 
         # Perform the store operation
         if self.instr_ty.width_byte:
-            return self.memory.write_byte(self.address, Byte(value.value))
+            return self.memory.write_byte(self.address, Byte(value.value), pc=self.pc)
         else:
-            return self.memory.write_word(self.address, value)
+            return self.memory.write_word(self.address, value, pc=self.pc)
 
 
 class _SlotFlush(_SlotMem):
@@ -420,7 +424,7 @@ class _SlotFlush(_SlotMem):
         assert self.address is not None
 
         # Perform the flush operation
-        return self.memory.flush_line(self.address)
+        return self.memory.flush_line(self.address, pc=self.pc)
 
 
 class _SlotFlushAll(_Slot):
@@ -695,6 +699,8 @@ class ExecutionEngine:
         """
         # Increment cycle counter
         self._cyclecount += 1
+        if self._memory.tracer is not None:
+            self._memory.tracer.cycle = self._cyclecount
 
         # Iterate over all slots
         for i, slot in enumerate(self._slots):
@@ -720,12 +726,17 @@ class ExecutionEngine:
                     if state is None:
                         # No fault, notify other slots
                         self._notify_retired(_SlotID(i))
+                        # The access of a memory instruction was not transient
+                        if self._memory.tracer is not None and isinstance(slot, _SlotMem):
+                            self._memory.tracer.retire(slot.result.trace)
                         # Free retired slot
                         self._slots[i] = None
                         # Only one instruction is allowed to retire each tick
                         return None
                     else:
                         # Fault occurred, roll back to given architectural state and notify frontend
+                        if self._memory.tracer is not None and isinstance(slot, _SlotMem):
+                            self._memory.tracer.fault(slot.result.trace)
                         self._rollback(state)
                         return state.info
 
@@ -763,6 +774,9 @@ class ExecutionEngine:
 
     def _rollback(self, state: _FaultState):
         """Roll back to the given state."""
+        # All other instructions in flight are squashed, so their accesses were transient
+        if self._memory.tracer is not None:
+            self._memory.tracer.squash()
         self._registers = cast(List[_WordOrSlot], state.registers)
         self._slots = [None for _ in range(len(self._slots))]
         self._faulting_inflight = set()
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+from typing import Iterator, Union
+
+
+class PagedMemory:
+    """
+    Main memory, made up of fixed-size pages that are shared between copies.
+
+    Copying a memory only copies the list of its pages. A page is shared
+    until one of the memories holding it writes to it, at which point that
+    memory gets a private copy of the page (copy-on-write). Snapshots and
+    restored CPUs therefore only cost as much memory as the pages written
+    since they were taken.
+
+    Addresses are indexed like a list of byte values.
+    """
+
+    PAGE_BITS = 8
+    PAGE_SIZE = 1 << PAGE_BITS
+    _OFFSET_MASK = PAGE_SIZE - 1
+
+    size: int
+
+    _pages: list[bytearray]
+    # Whether each page is referenced by this memory only, and may be written in place
+    _owned: bytearray
+
+    def __init__(self, size: int, fill: int = 0):
+        """
+        Parameters:
+            size (int) -- the number of bytes, a multiple of the page size.
+            fill (int) -- the initial value of every byte (default = 0).
+        """
+        if size % self.PAGE_SIZE != 0:
+            raise ValueError(f"Memory size must be a multiple of {self.PAGE_SIZE}")
+
+        self.size = size
+        self._pages = [bytearray([fill]) * self.PAGE_SIZE] * (size >> self.PAGE_BITS)
+        self._owned = bytearray(len(self._pages))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> PagedMemory:
+        """Creates a memory holding a copy of 'data'."""
+        memory = cls(len(data))
+        for i in range(len(memory._pages)):
+            start = i << cls.PAGE_BITS
+            memory._pages[i] = bytearray(data[start:start + cls.PAGE_SIZE])
+        memory._owned = bytearray([1]) * len(memory._pages)
+        return memory
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, key: Union[int, slice]) -> Union[int, bytes]:
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.size)
+            if step != 1:
+                return bytes(self[i] for i in range(start, stop, step))
+            return self._read(start, max(stop - start, 0))
+        return self._pages[key >> self.PAGE_BITS][key & self._OFFSET_MASK]
+
+    def __setitem__(self, address: int, value: int) -> None:
+        self._writable_page(address >> self.PAGE_BITS)[address & self._OFFSET_MASK] = value
+
+    def __iter__(self) -> Iterator[int]:
+        for page in self._pages:
+            yield from page
+
+    def __bytes__(self) -> bytes:
+        return b"".join(self._pages)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, PagedMemory):
+            return NotImplemented
+        return self._pages == other._pages
+
+    def copy(self) -> PagedMemory:
+        """Returns a copy of the memory that shares all pages with this one."""
+        clone = PagedMemory.__new__(PagedMemory)
+        clone.size = self.size
+        clone._pages = list(self._pages)
+        # Neither memory may write to the now shared pages in place
+        clone._owned = bytearray(len(self._pages))
+        self._owned = bytearray(len(self._pages))
+        return clone
+
+    def shared_size(self, other: PagedMemory) -> int:
+        """Returns the number of bytes in pages that this memory shares with 'other'."""
+        return sum(page is other_page for page, other_page in zip(self._pages, other._pages)) << self.PAGE_BITS
+
+    def __copy__(self) -> PagedMemory:
+        return self.copy()
+
+    def __deepcopy__(self, memo: dict) -> PagedMemory:
+        return self.copy()
+
+    def read(self, start: int, length: int) -> memoryview:
+        """
+        Returns a read-only view of 'length' bytes starting at address
+        'start'. Ranges within a single page are not copied, so the view is
+        only meant to be used until the memory is written to next.
+        """
+        self._check_range(start, length)
+        offset = start & self._OFFSET_MASK
+        if offset + length <= self.PAGE_SIZE:
+            page = self._pages[start >> self.PAGE_BITS]
+            return memoryview(page)[offset:offset + length].toreadonly()
+        return memoryview(self._read(start, length)).toreadonly()
+
+    def write(self, start: int, data: bytes) -> None:
+        """Writes the bytes of 'data' starting at address 'start'."""
+        data = memoryview(data).cast("B")
+        self._check_range(start, len(data))
+        position = 0
+        while position < len(data):
+            address = start + position
+            offset = address & self._OFFSET_MASK
+            chunk = min(len(data) - position, self.PAGE_SIZE - offset)
+            index = address >> self.PAGE_BITS
+            if chunk == self.PAGE_SIZE:
+                # The whole page is replaced, so there is no need to copy it first
+                self._pages[index] = bytearray(data[position:position + chunk])
+                self._owned[index] = 1
+            else:
+                self._writable_page(index)[offset:offset + chunk] = data[position:position + chunk]
+            position += chunk
+
+    def fill(self, start: int, stop: int, value: int) -> None:
+        """
+        Sets every byte from address 'start' up to (excluding) 'stop' to
+        'value'. Whole pages in that range share a single page.
+        """
+        first_page = -(-start >> self.PAGE_BITS)
+        last_page = stop >> self.PAGE_BITS
+        if first_page >= last_page:
+            for address in range(start, stop):
+                self[address] = value
+            return
+
+        for address in range(start, first_page << self.PAGE_BITS):
+            self[address] = value
+        page = bytearray([value]) * self.PAGE_SIZE
+        for i in range(first_page, last_page):
+            self._pages[i] = page
+            self._owned[i] = 0
+        for address in range(last_page << self.PAGE_BITS, stop):
+            self[address] = value
+
+    def _read(self, start: int, length: int) -> bytes:
+        """Returns 'length' bytes starting at address 'start'."""
+        chunks = []
+        while length > 0:
+            offset = start & self._OFFSET_MASK
+            chunk = min(length, self.PAGE_SIZE - offset)
+            chunks.append(self._pages[start >> self.PAGE_BITS][offset:offset + chunk])
+            start += chunk
+            length -= chunk
+        return b"".join(chunks)
+
+    def _check_range(self, start: int, length: int) -> None:
+        if start < 0 or length < 0 or start + length > self.size:
+            raise IndexError(f"Range of {length} bytes at {start:#x} is out of bounds")
+
+    def _writable_page(self, index: int) -> bytearray:
+        """Returns the page at 'index', copying it first if it is shared."""
+        if not self._owned[index]:
+            self._pages[index] = bytearray(self._pages[index])
+            self._owned[index] = 1
+        return self._pages[index]
@@ -1,11 +1,17 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Union
+from typing import Callable, Optional, Union
 
 from .word import Word
 from .byte import Byte
-from .cache import Cache, CacheFIFO, CacheLRU, CacheRR
+from .arraycache import ArrayCache
+from .cache import Cache, CacheStats, EvictedLine, PolicyCache
+from .mainmemory import PagedMemory
+from .prefetcher import Prefetcher, create_prefetcher
+from .stackdistance import AccessStream
+from .tracer import MemoryTracer
+from .profiler import AccessProfiler
 
 
 @dataclass
@@ -20,6 +26,73 @@ class MemResult:
     cycles_value: int
     # Number of cycles we wait before signaling whether we fault, after we returned the value
     cycles_fault: int
+    # Number of the trace record of the operation, see MemoryTracer.record(), or None if it is not
+    # traced
+    trace: Optional[int] = None
+
+
+@dataclass
+class CacheLevel:
+    """A level of the cache hierarchy."""
+
+    cache: Cache
+    # Number of cycles it takes to read data that is cached in this level
+    hit_cycles: int
+    # How the contents of this level relate to those of the levels above it: "inclusive" (holds
+    # everything they hold), "exclusive" (holds only lines evicted from them) or "nine" (neither)
+    inclusion: str
+
+
+def _create_cache(
+    level_conf: dict,
+    line_size: int,
+    decode_table: bool,
+    backing: Optional[PagedMemory],
+    layout: str,
+    seed: Optional[int],
+) -> Cache:
+    """Creates the cache of one level of the hierarchy, see MemorySubsystem.__init__()."""
+    cache_config = (level_conf["sets"], level_conf["ways"], line_size)
+    policy = level_conf["replacement_policy"]
+
+    if layout == "arrays":
+        return ArrayCache(*cache_config, policy, decode_table, backing, seed)
+    if layout != "objects":
+        raise Exception("Unknown cache layout. Check the config.yml file.")
+    return PolicyCache(*cache_config, policy, decode_table, backing, seed)
+
+
+@dataclass
+class MSHRStats:
+    """Counters of the miss status holding registers (MSHRs) of a MemorySubsystem."""
+
+    # Loads that missed a line without an MSHR, and allocated one
+    primary_misses: int = 0
+    # Loads that missed a line with an MSHR, and waited for its fill
+    merged_misses: int = 0
+    # Number of times a load could not start in a cycle because all MSHRs were in use
+    stalls: int = 0
+    # Cycles in which at least one miss was outstanding
+    busy_cycles: int = 0
+    # Number of outstanding misses, summed over all cycles
+    outstanding_cycles: int = 0
+
+    @property
+    def mlp(self) -> float:
+        """Memory-level parallelism: the average number of outstanding misses while busy."""
+        return self.outstanding_cycles / self.busy_cycles if self.busy_cycles else 0.0
+
+
+@dataclass
+class MemoryStats:
+    """Statistics of a memory subsystem, see MemorySubsystem.get_stats()."""
+
+    # Counters of each cache level, starting with the first one, or None if they are disabled
+    levels: list[Optional[CacheStats]]
+    # Counters of the MSHRs, if there are any
+    mshrs: Optional[MSHRStats]
+    # Prefetchers, with their counters
+    prefetchers: list[Prefetcher]
 
 
 class MemorySubsystem:
@@ -28,10 +101,11 @@ class MemorySubsystem:
 
     In our model, the MS includes the main memory and
     cache. Contrary  to the Skylake architecture, our
-    MS does not contain load- and store-buffers, and
-    for the sake of simplicity, there is one cache only.
-    Therefore, whether our cache is an L3 or L1 cache
-    does not matter.
+    MS does not contain load- and store-buffers. By
+    default, there is one cache only, so whether our
+    cache is an L3 or L1 cache does not matter. More
+    levels can be added below it in the config, each
+    with its own geometry, policies and latency.
     """
 
     cache_hit_cycles: int
@@ -39,13 +113,38 @@ class MemorySubsystem:
     num_write_cycles: int
     num_fault_cycles: int
 
-    memory: list
+    memory: PagedMemory
     mem_size: int
     cache: Cache
     cache_replacement_policy: str
+    # All levels of the cache hierarchy, starting with the first one, whose cache is `cache`
+    levels: list[CacheLevel]
+
+    # Number of miss status holding registers, or 0 if misses are not tracked
+    num_mshrs: int
+    # Base addresses of the lines with an outstanding miss, mapped to the number of cycles until
+    # the line is filled
+    _mshrs: dict[int, int]
+    mshr_stats: MSHRStats
+
+    prefetchers: list[Prefetcher]
+    # Base addresses of the prefetched lines that were not accessed yet, mapped to the prefetcher
+    # that fetched them
+    _prefetched: dict[int, Prefetcher]
+
+    # Lines accessed and flushed by the program, or None if they are not recorded
+    access_stream: Optional[AccessStream]
+    # Tracer writing the accesses of instructions to a file, or None if they are not traced
+    tracer: Optional[MemoryTracer]
+    # Profile of the accesses to lines and sets, or None if they are not profiled
+    profiler: Optional[AccessProfiler]
 
     _config: dict
 
+    # Bytes written to main memory since the journal was last taken, as (address, old value, new
+    # value) tuples, or `None` if writes are not journaled
+    _journal: Optional[list[tuple[int, int, int]]]
+
     def __init__(self, config: dict):
         """
         A class representing the memory management unit of a CPU.
@@ -65,19 +164,61 @@ class MemorySubsystem:
                 (default = (4, 4, 4))
             replacement_policy (str) -- the replacement policy to be used
                 by the cache. Options are: RR (random replacement), LRU (least
-                recently used), and FIFO (first-in-first-out). (default = "RR")
+                recently used), FIFO (first-in-first-out), PLRU (tree
+                pseudo-LRU), SRRIP and BRRIP (re-reference interval
+                prediction), LFU (least frequently used), and any other
+                policy registered in replacement.py. (default = "RR")
+            decode_table (bool) -- whether the cache decodes addresses using
+                a precomputed table (default = False).
+            tag_only (bool) -- whether the cache only keeps tags, and reads
+                its data from main memory (default = False).
+            layout (str) -- how the cache stores its lines: "objects" (one
+                object per line) or "arrays" (flat arrays for all lines,
+                see `ArrayCache`). (default = "objects")
+            levels (list) -- further cache levels below the first one, in
+                order. Each has its own sets, ways, replacement_policy,
+                hit_cycles and inclusion ("inclusive", "exclusive" or
+                "nine"). All levels share the line size of the first one,
+                and cache_miss_cycles is the latency of main memory.
+                (default = no further levels)
+            mshrs (int) -- the number of misses of loads that can be
+                outstanding at once, see request_mshrs(). Loads that miss a
+                line which is still being filled wait for that fill. 0 for
+                no limit and no merging (default = 0).
+            prefetchers (list) -- the prefetchers that fill lines ahead of
+                the accesses of instructions, each a dict with the 'type'
+                ("next_line", "stride" or "stream") and any further
+                parameters of its class, see prefetcher.py. Prefetched
+                lines are filled at once. (default = no prefetchers)
+            seed (int) -- the seed of the random numbers of replacement
+                policies that use any, like RR, so that runs can be
+                reproduced. None for a seed that differs on every run
+                (default = None).
+            stats (bool) -- whether all cache levels count their hits,
+                misses, fills, evictions and flushes, see get_stats()
+                (default = False).
+            record_accesses (bool) -- whether the lines accessed and
+                flushed are recorded in `access_stream`, to compute the
+                miss ratios of other cache geometries, see stackdistance.py
+                (default = False).
+            profile (bool) -- whether the accesses and misses of each line
+                and set, and the reuse distances of the accesses, are
+                counted in `profiler`, see profiler.py (default = False).
+            trace (str) -- in the Memory section, a file to write a record
+                of every access of an instruction to, see tracer.py. None
+                to not trace accesses (default = None).
         """
         self._config = config
+        self._journal = None
 
         cache_conf = config["Cache"]
         mem_conf = config["Memory"]
 
-        self.memory = [0] * (1 << Word.WIDTH)
         self.mem_size = 1 << Word.WIDTH
+        self.memory = PagedMemory(self.mem_size)
 
         # We assume the upper half of the address space is inaccessible
-        for i in range(self.mem_size // 2, self.mem_size):
-            self.memory[i] = 0x42
+        self.memory.fill(self.mem_size // 2, self.mem_size, 0x42)
 
         self.cache_hit_cycles = cache_conf["cache_hit_cycles"]
         self.cache_miss_cycles = cache_conf["cache_miss_cycles"]
@@ -87,40 +228,254 @@ class MemorySubsystem:
 
         self.cache_replacement_policy = cache_conf["replacement_policy"]
 
-        cache_config = (cache_conf["sets"], cache_conf["ways"], cache_conf["line_size"])
+        line_size = cache_conf["line_size"]
+        cache_options = (
+            cache_conf.get("decode_table", False),
+            self.memory if cache_conf.get("tag_only", False) else None,
+            cache_conf.get("layout", "objects"),
+        )
+
+        # Each level draws different random numbers from the same seed
+        seed = cache_conf.get("seed", None)
+        self.cache = _create_cache(cache_conf, line_size, *cache_options, seed)
+        self.levels = [CacheLevel(self.cache, self.cache_hit_cycles, "nine")]
+        for level_conf in cache_conf.get("levels", None) or []:
+            if level_conf.get("line_size", line_size) != line_size:
+                raise Exception("All cache levels must have the same line size.")
+            inclusion = level_conf.get("inclusion", "nine")
+            if inclusion not in ("inclusive", "exclusive", "nine"):
+                raise Exception("Unknown cache inclusion policy. Check the config.yml file.")
+            self.levels.append(CacheLevel(
+                _create_cache(
+                    level_conf,
+                    line_size,
+                    *cache_options,
+                    None if seed is None else seed + len(self.levels),
+                ),
+                level_conf["hit_cycles"],
+                inclusion,
+            ))
+
+        self.num_mshrs = cache_conf.get("mshrs", 0)
+        self._mshrs = {}
+        self.mshr_stats = MSHRStats()
+
+        self.prefetchers = [
+            create_prefetcher(prefetcher_conf, line_size)
+            for prefetcher_conf in cache_conf.get("prefetchers", None) or []
+        ]
+        self._prefetched = {}
+
+        if cache_conf.get("stats", False):
+            for level in self.levels:
+                level.cache.enable_stats()
+
+        self.access_stream = None
+        if cache_conf.get("record_accesses", False):
+            self.access_stream = AccessStream(line_size)
+
+        self.profiler = None
+        if cache_conf.get("profile", False):
+            self.profiler = AccessProfiler(self.mem_size, line_size, self.cache.num_sets)
+
+        self.tracer = None
+        if mem_conf.get("trace", None) is not None:
+            self.tracer = MemoryTracer(mem_conf["trace"])
+
+    def read_byte(
+        self, address: Word, cache_side_effects: bool = True, pc: Optional[int] = None
+    ) -> MemResult:
+        """
+        Reads one byte from memory and returns it along with
+        the number of cycles it takes to load it.
 
-        if self.cache_replacement_policy == "RR":
-            self.cache = CacheRR(*cache_config)
-        elif self.cache_replacement_policy == "LRU":
-            self.cache = CacheLRU(*cache_config)
-        elif self.cache_replacement_policy == "FIFO":
-            self.cache = CacheFIFO(*cache_config)
-        else:
-            raise Exception("Unknown cache replacement policy. Check the config.yml file.")
+        Parameters:
+            address (Word) -- the memory address from which to read
+            cache_side_effects (bool) -- whether this operation should
+                have side effects on the cache. True by default
+            pc (int) -- the address of the instruction performing the
+                access, see _access() (default = None).
 
-    def read_byte(self, address: Word, cache_side_effects: bool = True) -> MemResult:
+        Returns:
+            MemResult: Class containing the results of the memory
+                operation.
         """
-        Reads one byte from memory and returns it along with
+        return self._access(
+            MemoryTracer.READ, address, 1, cache_side_effects, pc,
+            lambda: self._read_byte(address, cache_side_effects, set()),
+        )
+
+    def write_byte(
+        self,
+        address: Word,
+        data: Byte,
+        cache_side_effects: bool = True,
+        pc: Optional[int] = None,
+    ) -> MemResult:
+        """
+        Writes a byte to memory.
+
+        Parameters:
+            address (Word) -- the memory address to which to write
+            data (Byte) -- the Byte to write to this address
+            cache_side_effects (bool) -- whether this operation should
+                have side effects on the cache. True by default
+            pc (int) -- the address of the instruction performing the
+                access, see _access() (default = None).
+
+        Returns:
+            This function does not have a return value.
+        """
+        return self._access(
+            MemoryTracer.WRITE, address, 1, cache_side_effects, pc,
+            lambda: self._write_byte(address, data, cache_side_effects),
+        )
+
+    def read_word(
+        self, address: Word, cache_side_effects: bool = True, pc: Optional[int] = None
+    ) -> MemResult:
+        """
+        Reads one word from memory and returns it along with
         the number of cycles it takes to load it.
+        The architecture is assumed to be little-endian.
 
         Parameters:
             address (Word) -- the memory address from which to read
             cache_side_effects (bool) -- whether this operation should
                 have side effects on the cache. True by default
+            pc (int) -- the address of the instruction performing the
+                access, see _access() (default = None).
 
         Returns:
             MemResult: Class containing the results of the memory
                 operation.
         """
+        return self._access(
+            MemoryTracer.READ, address, Word.WIDTH_BYTES, cache_side_effects, pc,
+            lambda: self._read_word(address, cache_side_effects),
+        )
+
+    def write_word(
+        self,
+        address: Word,
+        data: Word,
+        cache_side_effects: bool = True,
+        pc: Optional[int] = None,
+    ) -> MemResult:
+        """
+        Writes a word to memory. The architecture is assumed to be little-endian.
+
+        Parameters:
+            address (Word) -- the memory address to which to write
+            data (Word) -- the Word to write to this address
+            cache_side_effects (bool) -- whether this operation should
+                have side effects on the cache. True by default
+            pc (int) -- the address of the instruction performing the
+                access, see _access() (default = None).
+
+        Returns:
+            This function does not have a return value.
+        """
+        return self._access(
+            MemoryTracer.WRITE, address, Word.WIDTH_BYTES, cache_side_effects, pc,
+            lambda: self._write_word(address, data, cache_side_effects),
+        )
+
+    def _access(
+        self,
+        kind: int,
+        address: Word,
+        width: int,
+        cache_side_effects: bool,
+        pc: Optional[int],
+        access: Callable[[], MemResult],
+    ) -> MemResult:
+        """
+        Performs an access and shows it to the prefetchers and the trace.
+
+        Parameters:
+            kind (int) -- `MemoryTracer.READ` or `MemoryTracer.WRITE`
+            address (Word) -- the memory address accessed
+            width (int) -- the number of bytes accessed
+            cache_side_effects (bool) -- whether the access has side
+                effects on the cache. Only those are prefetched from.
+            pc (int) -- the address of the instruction performing the
+                access, shown to the prefetchers and traced. None if no
+                instruction performs it.
+            access (Callable) -- performs the access itself
+
+        Returns:
+            MemResult: The result of 'access', along with its trace record.
+        """
+        # The prefetchers and the trace see whether the line was cached before the access
+        prefetch = pc is not None and cache_side_effects and bool(self.prefetchers)
+        traced = pc is not None and self.tracer is not None
+        hit = (prefetch or traced) and self.is_addr_cached(address)
+
+        result = access()
+
+        if prefetch:
+            self._prefetch(address, pc, hit)
+        if traced:
+            result.trace = self.tracer.record(kind, pc, address.value, width, hit, result.fault)
+        return result
+
+    def _read_byte(self, address: Word, cache_side_effects: bool, fills: set[int]) -> MemResult:
+        """
+        Reads one byte as part of an access, without showing it to the
+        prefetchers or tracing it.
+
+        Parameters:
+            address (Word) -- the memory address from which to read
+            cache_side_effects (bool) -- whether this operation should
+                have side effects on the cache
+            fills (set) -- the base addresses of the lines whose fill an
+                earlier byte of the same access started. Bytes of these
+                lines are part of that miss rather than merged misses.
+                The line of this byte is added if it starts a fill.
 
+        Returns:
+            MemResult: Class containing the results of the memory
+                operation.
+        """
         data = None
         if cache_side_effects:
             data = self.cache.read(address.value)
+            if self.access_stream is not None:
+                self.access_stream.access(address.value)
+            if self.profiler is not None:
+                self.profiler.access(address.value, data is not None)
         cycles = self.cache_hit_cycles
 
-        if data is None:
+        base_addr = address.value - address.value % self.cache.line_size
+        remaining = None
+        if cache_side_effects and self._mshrs and base_addr not in fills:
+            remaining = self._mshrs.get(base_addr)
+
+        if remaining is not None:
+            # The line is still being filled after an earlier miss, so instead of missing again,
+            # we wait for that fill
+            self.mshr_stats.merged_misses += 1
+            data = self.memory[address.value]
+            cycles = max(cycles, remaining)
+        elif data is None:
             data = self.memory[address.value]
             cycles = self.cache_miss_cycles
+            if cache_side_effects:
+                # The latency is that of the first level below the first one that holds the data
+                for level in self.levels[1:]:
+                    cached = level.cache.read(address.value, side_effects=False) is not None
+                    if level.cache.stats is not None:
+                        tag, index, offset = level.cache.parse_addr(address.value)
+                        level.cache.stats.record_access(index, cached)
+                    if cached:
+                        cycles = level.hit_cycles
+                        break
+
+                if self.num_mshrs:
+                    self._mshrs[base_addr] = cycles
+                    self.mshr_stats.primary_misses += 1
+                    fills.add(base_addr)
 
             if cache_side_effects or self.is_addr_cached(address):
                 self._load_line(address)
@@ -140,55 +495,38 @@ class MemorySubsystem:
 
         return MemResult(Byte(data), fault, cycles, self.num_fault_cycles)
 
-    def write_byte(self, address: Word, data: Byte, cache_side_effects: bool = True) -> MemResult:
-        """
-        Writes a byte to memory.
-
-        Parameters:
-            address (Word) -- the memory address to which to write
-            data (Byte) -- the Byte to write to this address
-            cache_side_effects (bool) -- whether this operation should
-                have side effects on the cache. True by default
-
-        Returns:
-            This function does not have a return value.
-        """
-
-        # See self.read_byte() for comments on this check.
+    def _write_byte(self, address: Word, data: Byte, cache_side_effects: bool) -> MemResult:
+        """Writes one byte as part of an access, see write_byte()."""
+        # See self._read_byte() for comments on this check.
         fault = self.is_illegal_access(address)
 
         if not fault:
             value = data.value
+            if self._journal is not None:
+                self._journal.append((address.value, self.memory[address.value], value))
             self.memory[address.value] = value
 
+            if cache_side_effects and self.access_stream is not None:
+                self.access_stream.access(address.value)
+            if cache_side_effects and self.profiler is not None:
+                self.profiler.access(address.value, self.is_addr_cached(address))
             if cache_side_effects or self.is_addr_cached(address):
                 self._load_line(address)
+            else:
+                self._refresh_line(address)
 
         return MemResult(Byte(0), fault, self.num_write_cycles, self.num_fault_cycles)
 
-    def read_word(self, address: Word, cache_side_effects: bool = True) -> MemResult:
-        """
-        Reads one word from memory and returns it along with
-        the number of cycles it takes to load it.
-        The architecture is assumed to be little-endian.
-
-        Parameters:
-            address (Word) -- the memory address from which to read
-            cache_side_effects (bool) -- whether this operation should
-                have side effects on the cache. True by default
-
-        Returns:
-            MemResult: Class containing the results of the memory
-                operation.
-        """
-
+    def _read_word(self, address: Word, cache_side_effects: bool) -> MemResult:
+        """Reads one word as part of an access, see read_word()."""
         # Read individual bytes
         bytes_read = []
         fault = False
         cycles_value = 0
         cycles_fault = 0
+        fills = set()
         for i in range(Word.WIDTH_BYTES):
-            byte = self.read_byte(address + Word(i), cache_side_effects)
+            byte = self._read_byte(address + Word(i), cache_side_effects, fills)
             assert isinstance(byte.value, Byte)
 
             bytes_read.append(byte.value)
@@ -199,26 +537,14 @@ class MemorySubsystem:
 
         return MemResult(Word.from_bytes(bytes_read), fault, cycles_value, cycles_fault)
 
-    def write_word(self, address: Word, data: Word, cache_side_effects: bool = True) -> MemResult:
-        """
-        Writes a word to memory. The architecture is assumed to be little-endian.
-
-        Parameters:
-            address (Word) -- the memory address to which to write
-            data (Word) -- the Word to write to this address
-            cache_side_effects (bool) -- whether this operation should
-                have side effects on the cache. True by default
-
-        Returns:
-            This function does not have a return value.
-        """
-
+    def _write_word(self, address: Word, data: Word, cache_side_effects: bool) -> MemResult:
+        """Writes one word as part of an access, see write_word()."""
         # Write individual bytes
         fault = False
         cycles_value = 0
         cycles_fault = 0
         for i, byte in enumerate(data.as_bytes()):
-            result = self.write_byte(address + Word(i), byte, cache_side_effects)
+            result = self._write_byte(address + Word(i), byte, cache_side_effects)
 
             if result.fault:
                 fault = True
@@ -227,6 +553,102 @@ class MemorySubsystem:
 
         return MemResult(Word(0), fault, cycles_value, cycles_fault)
 
+    def read_range(self, address: int, length: int) -> memoryview:
+        """
+        Reads a range of bytes directly from main memory, as the debugger
+        sees it: neither the cache nor access rights are involved.
+
+        Parameters:
+            address (int) -- the address of the first byte
+            length (int) -- the number of bytes to read
+
+        Returns:
+            memoryview: A read-only view of the bytes. It is only valid
+                until memory is written to next; copy it to keep it.
+        """
+        return self.memory.read(address, length)
+
+    def write_range(self, address: int, data: bytes) -> None:
+        """
+        Writes a range of bytes directly to main memory, as the debugger
+        sees it: access rights are not checked and the replacement state of
+        the cache is not changed, but cached lines are updated to hold the
+        new data.
+
+        Parameters:
+            address (int) -- the address of the first byte
+            data (bytes) -- the bytes to write, any bytes-like object
+
+        Returns:
+            This function does not have a return value.
+        """
+        data = memoryview(data).cast("B")
+        if self._journal is not None:
+            old = self.memory[address:address + len(data)]
+            self._journal.extend(
+                (address + i, old[i], new) for i, new in enumerate(data) if old[i] != new
+            )
+        self.memory.write(address, data)
+
+        line_size = self.cache.line_size
+        for base_addr in range(address - address % line_size, address + len(data), line_size):
+            self._refresh_line(Word(base_addr))
+
+    def load_image(self, image: bytes, base: int = 0) -> None:
+        """
+        Copies a memory image into main memory, see write_range().
+
+        Parameters:
+            image (bytes) -- the contents to load, any bytes-like object
+            base (int) -- the address at which the image starts (default = 0)
+
+        Returns:
+            This function does not have a return value.
+        """
+        if base < 0 or base + len(image) > self.mem_size:
+            raise ValueError(
+                f"An image of {len(image)} bytes at {base:#06x} does not fit into memory"
+            )
+        self.write_range(base, image)
+
+    def dump_image(self, start: int = 0, end: Optional[int] = None) -> bytes:
+        """
+        Returns a copy of the contents of main memory, see read_range().
+
+        Parameters:
+            start (int) -- the first address to dump (default = 0)
+            end (int) -- the address after the last one to dump
+                (default = the end of memory)
+
+        Returns:
+            bytes: The contents of memory from 'start' to 'end'.
+        """
+        if end is None:
+            end = self.mem_size
+        if not 0 <= start <= end <= self.mem_size:
+            raise ValueError(f"Invalid memory range {start:#06x}-{end:#06x}")
+        return bytes(self.read_range(start, end - start))
+
+    def start_journal(self) -> None:
+        """
+        Starts recording every byte written to main memory, so that the
+        writes can be collected with take_journal().
+        """
+        self._journal = []
+
+    def take_journal(self) -> list[tuple[int, int, int]]:
+        """
+        Returns the bytes written to main memory since the journal was
+        started or last taken, and starts a new, empty journal.
+
+        Returns:
+            list[tuple[int, int, int]]: (address, old value, new value)
+                for every write, in the order they happened.
+        """
+        journal = self._journal if self._journal is not None else []
+        self._journal = []
+        return journal
+
     def _load_line(self, address: Word, side_effects: bool = True) -> None:
         """
         Loads the entire cache line corresponding to 'addr'
@@ -240,8 +662,8 @@ class MemorySubsystem:
                 the cache line should have an effect on
                 caches taht use access times as their
                 replacement policies. If false, the data
-                is simply loaded into the cache, but variables
-                like lru_timestamp remain unchanged.
+                is simply loaded into the cache, but the order
+                in which lines are replaced remains unchanged.
 
         Returns:
             This function does not have a return value.
@@ -250,38 +672,112 @@ class MemorySubsystem:
         tag, index, offset = self.cache.parse_addr(addr)
         base_addr = addr - offset
 
-        for i in range(self.cache.line_size):
-            current_addr = base_addr + i
-            self.cache.write(current_addr, self.memory[current_addr], side_effects)
+        data = None
+        if not self.cache.tag_only:
+            data = self.memory[base_addr:base_addr + self.cache.line_size]
+
+        # Fill the lowest level first, so that the lines it evicts are invalidated in the levels
+        # above before these are filled
+        for i in range(len(self.levels) - 1, -1, -1):
+            level = self.levels[i]
+            if i > 0 and level.inclusion == "exclusive":
+                # The line moves up to the levels above
+                level.cache.flush(base_addr)
+                continue
+            evicted = level.cache.fill_line(base_addr, data, side_effects)
+            if evicted is not None:
+                self._handle_eviction(i, evicted)
+
+    def _handle_eviction(self, i: int, evicted: EvictedLine) -> None:
+        """
+        Keeps the levels of the hierarchy consistent after the level at
+        index 'i' evicted a line: an inclusive level invalidates the line in
+        the levels above it, and an exclusive level below takes the line in.
+
+        Parameters:
+            i (int) -- the index of the level in `levels`
+            evicted (EvictedLine) -- the line that was evicted
+
+        Returns:
+            This function does not have a return value.
+        """
+        if i > 0 and self.levels[i].inclusion == "inclusive":
+            for level in self.levels[:i]:
+                level.cache.flush(evicted.address)
+
+        if i + 1 < len(self.levels) and self.levels[i + 1].inclusion == "exclusive":
+            data = None if self.cache.tag_only else evicted.data
+            evicted = self.levels[i + 1].cache.fill_line(evicted.address, data)
+            if evicted is not None:
+                self._handle_eviction(i + 1, evicted)
 
-    def flush_line(self, address: Word) -> MemResult:
+    def _refresh_line(self, address: Word) -> None:
         """
-        Flushes an address from the cache.
+        Updates the data of the line corresponding to 'address' in every
+        level that holds it, without any effect on the replacement policies.
+
+        Parameters:
+            address (Word) -- any address within the line
+
+        Returns:
+            This function does not have a return value.
+        """
+        addr = address.value
+        tag, index, offset = self.cache.parse_addr(addr)
+        base_addr = addr - offset
+
+        for level in self.levels:
+            if level.cache.read(addr, side_effects=False) is None or level.cache.tag_only:
+                continue
+            level.cache.fill_line(
+                base_addr, self.memory[base_addr:base_addr + self.cache.line_size], False
+            )
+
+    def flush_line(self, address: Word, pc: Optional[int] = None) -> MemResult:
+        """
+        Flushes an address from all levels of the cache.
 
         Parameters:
             address (Word) -- the memory address to which to write
+            pc (int) -- the address of the instruction performing the
+                flush, which is traced. None if no instruction performs it
+                (default = None).
 
         Returns:
             This function does not have a return value.
         """
-        self.cache.flush(address.value)
-        return MemResult(Word(0), False, self.num_write_cycles, self.num_fault_cycles)
+        traced = pc is not None and self.tracer is not None
+        hit = traced and self.is_addr_cached(address)
+
+        for level in self.levels:
+            level.cache.flush(address.value)
+        # A fill that is still outstanding would otherwise serve later loads without caching the line
+        self._mshrs.pop(address.value - address.value % self.cache.line_size, None)
+        if self.access_stream is not None:
+            self.access_stream.flush(address.value)
+        result = MemResult(Word(0), False, self.num_write_cycles, self.num_fault_cycles)
+        if traced:
+            result.trace = self.tracer.record(
+                MemoryTracer.FLUSH, pc, address.value, 1, hit, False
+            )
+        return result
 
     def flush_all(self) -> None:
         """
-        Flushes the entire cache.
+        Flushes all levels of the cache entirely.
 
         Returns:
             This function does not have a return value.
         """
-        i = 0
-        while i < self.mem_size:
-            self.flush_line(Word(i))
-            i += self.cache.line_size
+        for level in self.levels:
+            level.cache.flush_all()
+        self._mshrs = {}
+        if self.access_stream is not None:
+            self.access_stream.flush()
 
     def is_addr_cached(self, address: Word) -> bool:
         """
-        Returns whether the data at an address is cached.
+        Returns whether the data at an address is cached in the first level.
 
         Parameters:
             address (Word) -- the memory address of the data
@@ -291,6 +787,106 @@ class MemorySubsystem:
         """
         return self.cache.read(address.value, side_effects=False) is not None
 
+    def _prefetch(self, address: Word, pc: int, hit: bool) -> None:
+        """
+        Shows an access to the prefetchers, and fills the lines they
+        predict that are accessible and not cached yet.
+
+        Parameters:
+            address (Word) -- the address accessed
+            pc (int) -- the address of the instruction that accessed it
+            hit (bool) -- whether the line was cached before the access
+
+        Returns:
+            This function does not have a return value.
+        """
+        line_size = self.cache.line_size
+        base_addr = address.value - address.value % line_size
+
+        # The first access to a prefetched line would have missed without prefetching
+        prefetched_by = self._prefetched.pop(base_addr, None)
+        if prefetched_by is not None and hit:
+            prefetched_by.useful += 1
+        elif not hit:
+            for prefetcher in self.prefetchers:
+                prefetcher.misses += 1
+        miss = not hit or prefetched_by is not None
+
+        for prefetcher in self.prefetchers:
+            for addr in prefetcher.observe(address.value, pc, miss):
+                line = addr - addr % line_size
+                if (
+                    line == base_addr
+                    or not 0 <= line < self.mem_size
+                    or self.is_illegal_access(Word(line))
+                    or line in self._prefetched
+                    or self.is_addr_cached(Word(line))
+                ):
+                    continue
+                self._load_line(Word(line))
+                self._prefetched[line] = prefetcher
+                prefetcher.issued += 1
+
+    def request_mshrs(self, address: Word, width: int) -> bool:
+        """
+        Returns whether a load can start now, i.e. whether there is a free
+        MSHR for every line it misses. If not, the load has to wait, which
+        is counted as a stall. A load that misses more lines than there are
+        MSHRs can start once no MSHR is in use.
+
+        Parameters:
+            address (Word) -- the address of the load
+            width (int) -- the number of bytes loaded
+
+        Returns:
+            bool: True if the load can start
+        """
+        if not self.num_mshrs:
+            return True
+
+        line_size = self.cache.line_size
+        missing = set()
+        for i in range(width):
+            addr = (address + Word(i)).value
+            base_addr = addr - addr % line_size
+            if base_addr not in self._mshrs and not self.is_addr_cached(Word(addr)):
+                missing.add(base_addr)
+
+        if not self._mshrs or len(self._mshrs) + len(missing) <= self.num_mshrs:
+            return True
+        self.mshr_stats.stalls += 1
+        return False
+
+    def tick(self) -> None:
+        """
+        Advances all outstanding misses by one cycle, freeing the MSHRs of
+        lines that are filled.
+
+        Returns:
+            This function does not have a return value.
+        """
+        if not self._mshrs:
+            return
+
+        self.mshr_stats.busy_cycles += 1
+        self.mshr_stats.outstanding_cycles += len(self._mshrs)
+        self._mshrs = {
+            base_addr: remaining - 1
+            for base_addr, remaining in self._mshrs.items()
+            if remaining > 1
+        }
+
+    def get_stats(self) -> MemoryStats:
+        """
+        Returns the statistics of the cache levels, the MSHRs and the
+        prefetchers. The counters are live, not copies.
+        """
+        return MemoryStats(
+            [level.cache.stats for level in self.levels],
+            self.mshr_stats if self.num_mshrs else None,
+            self.prefetchers,
+        )
+
     def write_cycles(self) -> int:
         """
         Returns the number of cycles needed to write to memory.
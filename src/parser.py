@@ -15,13 +15,40 @@ Example:
 ...     Instruction(all_instructions["addi"], [1, 0, 100]),
 ...     Instruction(all_instructions["beq"],  [0, 0, 0]),
 ... ]
+
+Besides instructions, programs may contain data directives that set the initial contents of memory.
+They are written at the data address, which starts at 0 and advances with every byte written:
+
+- `.org <address>` moves the data address.
+- `.byte <value>, ...` writes bytes.
+- `.word <value>, ...` writes words, in the byte order used by memory.
+- `.fill <count>[, <value>]` writes 'count' copies of a byte (default 0).
+
+>>> program = p.parse_program('''
+...     .org 0x1000
+...     .fill 2
+...     .byte 0x41
+...     addi r1, r0, 100
+... ''')
+>>> assert program.data == [(0x1000, bytes([0, 0, 0x41]))]
 """
 
 from __future__ import annotations
 
+from dataclasses import dataclass
 from typing import Iterable
 
 from .instructions import Instruction, InstructionKind, OperandKind, all_instructions
+from .word import Byte, Word
+
+
+@dataclass
+class Program:
+    """A parsed program."""
+
+    instructions: list[Instruction]
+    # Initial memory contents set by data directives, as (start address, bytes) in program order
+    data: list[tuple[int, bytes]]
 
 
 class Parser:
@@ -100,8 +127,50 @@ class Parser:
         # Create instruction object
         return Instruction(ty, ops_parsed)
 
-    def parse(self, src: str) -> list[Instruction]:
-        """Parse assembly code into a list of instructions."""
+    @staticmethod
+    def _parse_directive(directive: str, address: int) -> tuple[int, bytes]:
+        """Parse a single data directive, returning the new data address and the bytes written."""
+        split = directive.split(maxsplit=1)
+        name = split[0]
+        ops = [int(x.strip(), 0) for x in split[1].split(",")] if len(split) > 1 else []
+
+        if name == ".org":
+            if len(ops) != 1:
+                raise ValueError(
+                    f"Wrong number of operands for '.org' directive: 1 expected, {len(ops)} given"
+                )
+            return ops[0], b""
+
+        # Byte() and Word() would silently truncate values that fit neither as unsigned nor as
+        # signed value
+        values = ops if name in (".byte", ".word") else ops[1:] if name == ".fill" else []
+        width, unit = (Word.WIDTH, "word") if name == ".word" else (Byte.WIDTH, "byte")
+        for value in values:
+            if not -(1 << (width - 1)) <= value < 1 << width:
+                raise ValueError(f"Value {value} of {name!r} directive does not fit into a {unit}")
+
+        if name == ".byte":
+            data = bytes(Byte(op).value for op in ops)
+        elif name == ".word":
+            data = bytes(b.value for op in ops for b in Word(op).as_bytes())
+        elif name == ".fill":
+            if len(ops) not in (1, 2):
+                raise ValueError(
+                    "Wrong number of operands for '.fill' directive: "
+                    + f"1 or 2 expected, {len(ops)} given"
+                )
+            if ops[0] < 0:
+                raise ValueError(f"Negative count {ops[0]} for '.fill' directive")
+            data = bytes([Byte(ops[1] if len(ops) == 2 else 0).value]) * ops[0]
+        else:
+            raise ValueError(f"Unknown directive {name!r}")
+
+        if address < 0 or address + len(data) > 1 << Word.WIDTH:
+            raise ValueError(f"Data of {directive!r} does not fit into memory")
+        return address + len(data), data
+
+    def parse_program(self, src: str) -> Program:
+        """Parse assembly code into a list of instructions and the data set by directives."""
         # Split by instructions
         split = list(self._split_instructions(src))
 
@@ -111,17 +180,35 @@ class Parser:
         for label in split:
             if label.endswith(":"):
                 labels[label[:-1]] = i
-            else:
+            elif not label.startswith("."):
                 i += 1
 
-        # Second pass to actually parse instructions
+        # Second pass to actually parse instructions and directives
         instrs = []
+        data: list[tuple[int, bytes]] = []
+        address = 0
         for instr in split:
             if instr.endswith(":"):
                 continue
 
+            if instr.startswith("."):
+                start = address
+                address, written = self._parse_directive(instr, address)
+                if not written:
+                    continue
+                # Extend the previous block of data if this one directly follows it
+                if data and data[-1][0] + len(data[-1][1]) == start:
+                    data[-1] = (data[-1][0], data[-1][1] + written)
+                else:
+                    data.append((start, written))
+                continue
+
             instrs.append(self._parse_instruction(instr, labels))
-        return instrs
+        return Program(instrs, data)
+
+    def parse(self, src: str) -> list[Instruction]:
+        """Parse assembly code into a list of instructions, ignoring any data directives."""
+        return self.parse_program(src).instructions
 
     def add_instruction(self, instr: InstructionKind):
         """Add an instruction type to this parser."""
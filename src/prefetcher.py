@@ -0,0 +1,210 @@
+"""
+Hardware prefetchers, which fill cache lines ahead of the accesses that need them.
+
+The memory subsystem shows every access of a load or store instruction to its prefetchers, see
+`Prefetcher.observe()`, and fills the lines they return that are not cached yet.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Optional
+
+
+class Prefetcher:
+    """
+    An abstract class implementing a prefetcher. Using this class directly
+    is not possible, as it does not predict any accesses.
+
+    Besides predicting accesses, a prefetcher counts how well its
+    predictions work, see `accuracy` and `coverage`.
+    """
+
+    # Name of the prefetcher in the config
+    name = ""
+
+    line_size: int
+    # Number of lines prefetched for each prediction
+    degree: int
+
+    # Number of lines prefetched
+    issued: int
+    # Number of prefetched lines that were accessed before they were evicted
+    useful: int
+    # Number of accesses that missed the cache although prefetching was enabled
+    misses: int
+
+    def __init__(self, line_size: int, degree: int = 1):
+        """
+        Parameters:
+            line_size (int) -- the line size of the cache
+            degree (int) -- the number of lines to prefetch for each
+                prediction (default = 1).
+        """
+        if degree <= 0:
+            raise Exception("Invalid prefetch degree.")
+
+        self.line_size = line_size
+        self.degree = degree
+        self.issued = 0
+        self.useful = 0
+        self.misses = 0
+
+    @property
+    def accuracy(self) -> float:
+        """The share of prefetched lines that were used."""
+        return self.useful / self.issued if self.issued else 0.0
+
+    @property
+    def coverage(self) -> float:
+        """The share of misses without prefetching that this prefetcher avoided."""
+        return self.useful / (self.useful + self.misses) if self.useful + self.misses else 0.0
+
+    def observe(self, address: int, pc: Optional[int], miss: bool) -> list[int]:
+        """
+        Observes an access and predicts the next ones.
+
+        Parameters:
+            address (int) -- the address accessed
+            pc (int) -- the address of the instruction that accessed it
+            miss (bool) -- whether the access would have missed the cache
+                without prefetching: true for misses, and for the first
+                access to a prefetched line.
+
+        Returns:
+            list[int]: The addresses whose lines to prefetch.
+        """
+        raise Exception("Prefetcher not implemented.")
+
+
+class NextLinePrefetcher(Prefetcher):
+    """A prefetcher that fetches the lines following a line that misses."""
+
+    name = "next_line"
+
+    def observe(self, address: int, pc: Optional[int], miss: bool) -> list[int]:
+        if not miss:
+            return []
+        return [address + i * self.line_size for i in range(1, self.degree + 1)]
+
+
+class StridePrefetcher(Prefetcher):
+    """
+    A prefetcher that detects instructions accessing addresses with a
+    constant distance (stride), and fetches the lines of their next
+    accesses.
+
+    For each instruction, it remembers the last address and stride, and
+    how many times in a row the stride repeated. Once it repeated
+    `threshold` times, the next `degree` strides are prefetched.
+    """
+
+    name = "stride"
+
+    # Number of instructions to remember
+    table_size: int
+    # Number of times a stride has to repeat before it is prefetched
+    threshold: int
+    # Last address, stride and number of repetitions of the stride of the most recent
+    # instructions, by their address, least recent first
+    _table: OrderedDict[Optional[int], tuple[int, int, int]]
+
+    def __init__(self, line_size: int, degree: int = 1, table_size: int = 16, threshold: int = 2):
+        """
+        Parameters:
+            table_size (int) -- the number of instructions to remember
+                (default = 16).
+            threshold (int) -- the number of times a stride has to repeat
+                before it is prefetched (default = 2).
+
+        See `Prefetcher` for the other parameters.
+        """
+        super().__init__(line_size, degree)
+        self.table_size = table_size
+        self.threshold = threshold
+        self._table = OrderedDict()
+
+    def observe(self, address: int, pc: Optional[int], miss: bool) -> list[int]:
+        entry = self._table.pop(pc, None)
+        if entry is None:
+            if len(self._table) == self.table_size:
+                self._table.popitem(last=False)
+            self._table[pc] = (address, 0, 0)
+            return []
+
+        last, stride, count = entry
+        if address - last == stride and stride != 0:
+            count = min(count + 1, self.threshold)
+        else:
+            stride, count = address - last, 0
+        self._table[pc] = (address, stride, count)
+
+        if count < self.threshold:
+            return []
+        return [address + i * stride for i in range(1, self.degree + 1)]
+
+
+class StreamPrefetcher(Prefetcher):
+    """
+    A prefetcher that detects streams of misses to consecutive lines, in
+    either direction, and fetches the lines further ahead in the stream.
+
+    A stream is detected once two misses go to neighbouring lines. After
+    that, every miss that continues the stream prefetches the next
+    `degree` lines in its direction.
+    """
+
+    name = "stream"
+
+    # Number of streams to track
+    num_streams: int
+    # Last line of the most recent streams, mapped to their direction (1 or -1, or 0 if not known
+    # yet), least recent first
+    _streams: OrderedDict[int, int]
+
+    def __init__(self, line_size: int, degree: int = 1, num_streams: int = 8):
+        """
+        Parameters:
+            num_streams (int) -- the number of streams to track (default = 8).
+
+        See `Prefetcher` for the other parameters.
+        """
+        super().__init__(line_size, degree)
+        self.num_streams = num_streams
+        self._streams = OrderedDict()
+
+    def observe(self, address: int, pc: Optional[int], miss: bool) -> list[int]:
+        if not miss:
+            return []
+
+        line = address // self.line_size
+        for direction in (1, -1):
+            known = self._streams.pop(line - direction, None)
+            if known is not None and known in (0, direction):
+                self._streams[line] = direction
+                return [(line + i * direction) * self.line_size for i in range(1, self.degree + 1)]
+            if known is not None:
+                self._streams[line - direction] = known
+
+        # Start a new stream at this line
+        if len(self._streams) == self.num_streams:
+            self._streams.popitem(last=False)
+        self._streams[line] = 0
+        return []
+
+
+prefetchers: dict[str, type] = {
+    cls.name: cls for cls in (NextLinePrefetcher, StridePrefetcher, StreamPrefetcher)
+}
+
+
+def create_prefetcher(conf: dict, line_size: int) -> Prefetcher:
+    """
+    Creates a prefetcher from its config, a dict with its 'type' and any
+    further parameters of its class.
+    """
+    params = dict(conf)
+    kind = params.pop("type", None)
+    if kind not in prefetchers:
+        raise Exception("Unknown prefetcher. Check the config.yml file.")
+    return prefetchers[kind](line_size, **params)
@@ -0,0 +1,153 @@
+"""
+Profiles of the memory accesses of a program: how often each line and each cache set is accessed
+and missed, and how far apart accesses to the same line are.
+
+The profile is aggregated while the program runs, in structures whose size only depends on the
+size of memory and the cache geometry, so it costs the same for any length of run. It shows which
+lines compete for which sets, e.g. the lines of a probe array that thrash a set.
+"""
+
+from __future__ import annotations
+
+import json
+from array import array
+from collections import OrderedDict
+from typing import Any, Optional
+
+from .recorder import Recorder
+
+
+class AccessProfiler(Recorder):
+    """
+    Counts the accesses and misses of every line of memory and of every
+    set of the first cache level, and the reuse distances of the accesses.
+
+    The reuse distance of an access is the number of other lines
+    accessed since the previous access to its line. Distances are
+    counted in buckets of powers of two, and only the `max_distance`
+    most recently used lines are remembered, so accesses to lines that
+    were not accessed before or that are further away are counted as
+    beyond `max_distance`.
+    """
+
+    line_size: int
+    num_sets: int
+    max_distance: int
+
+    # Accesses and misses of each line of memory
+    line_accesses: array
+    line_misses: array
+    # Accesses and misses of each set
+    set_accesses: list[int]
+    set_misses: list[int]
+    # Number of accesses with a reuse distance of 0, 1, 2-3, 4-7, ... below `max_distance`, followed
+    # by the number of accesses beyond it
+    reuse: list[int]
+
+    # Most recently accessed lines, least recent first
+    _recent: OrderedDict[int, None]
+
+    def __init__(self, mem_size: int, line_size: int, num_sets: int, max_distance: int = 256):
+        """
+        Parameters:
+            mem_size (int) -- the size of memory
+            line_size (int) -- the line size of the cache
+            num_sets (int) -- the number of sets of the first cache level
+            max_distance (int) -- the number of most recently used lines
+                whose reuse distance is measured, a power of two
+                (default = 256).
+        """
+        if max_distance <= 0 or max_distance & (max_distance - 1) != 0:
+            raise ValueError("The maximum reuse distance must be a power of two.")
+
+        self.line_size = line_size
+        self.num_sets = num_sets
+        self.max_distance = max_distance
+        self.line_accesses = array("L", [0]) * (mem_size // line_size)
+        self.line_misses = array("L", [0]) * (mem_size // line_size)
+        self.set_accesses = [0] * num_sets
+        self.set_misses = [0] * num_sets
+        self.reuse = [0] * (max_distance.bit_length() + 1)
+        self._recent = OrderedDict()
+
+    def access(self, address: int, hit: bool) -> None:
+        """
+        Counts an access to 'address'.
+
+        Parameters:
+            address (int) -- the address accessed
+            hit (bool) -- whether the first cache level held its line
+        """
+        line = address // self.line_size
+        index = line % self.num_sets
+        self.line_accesses[line] += 1
+        self.set_accesses[index] += 1
+        if not hit:
+            self.line_misses[line] += 1
+            self.set_misses[index] += 1
+
+        if line in self._recent:
+            distance = 0
+            for recent in reversed(self._recent):
+                if recent == line:
+                    break
+                distance += 1
+            self.reuse[distance.bit_length()] += 1
+            self._recent.move_to_end(line)
+        else:
+            self.reuse[-1] += 1
+            if len(self._recent) == self.max_distance:
+                self._recent.popitem(last=False)
+            self._recent[line] = None
+
+    def reuse_buckets(self) -> list[tuple[int, Optional[int]]]:
+        """
+        Returns the range of reuse distances of each bucket of `reuse`, as
+        (smallest, largest) distance. The last bucket has no largest one.
+        """
+        buckets = [(0, 0)]
+        for i in range(1, len(self.reuse) - 1):
+            buckets.append((1 << (i - 1), (1 << i) - 1))
+        buckets.append((self.max_distance, None))
+        return buckets
+
+    def hot_lines(self, count: int) -> list[tuple[int, int, int]]:
+        """
+        Returns the 'count' lines with the most misses, and then the most
+        accesses, as (address, accesses, misses).
+        """
+        lines = [line for line, accesses in enumerate(self.line_accesses) if accesses]
+        lines.sort(key=lambda line: (self.line_misses[line], self.line_accesses[line]), reverse=True)
+        return [
+            (line * self.line_size, self.line_accesses[line], self.line_misses[line])
+            for line in lines[:count]
+        ]
+
+    def to_dict(self) -> dict[str, Any]:
+        """Returns the profile as a dict of plain values, only listing lines that were accessed."""
+        return {
+            "line_size": self.line_size,
+            "sets": [
+                {"index": index, "accesses": accesses, "misses": misses}
+                for index, (accesses, misses) in enumerate(zip(self.set_accesses, self.set_misses))
+            ],
+            "lines": [
+                {
+                    "address": line * self.line_size,
+                    "set": line % self.num_sets,
+                    "accesses": accesses,
+                    "misses": self.line_misses[line],
+                }
+                for line, accesses in enumerate(self.line_accesses)
+                if accesses
+            ],
+            "reuse_distances": [
+                {"min": smallest, "max": largest, "accesses": accesses}
+                for (smallest, largest), accesses in zip(self.reuse_buckets(), self.reuse)
+            ],
+        }
+
+    def export_json(self, path: str) -> None:
+        """Writes the profile to a JSON file, see to_dict()."""
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
@@ -0,0 +1,19 @@
+"""
+Recorders of the memory accesses of a program over a whole session.
+"""
+
+from __future__ import annotations
+
+
+class Recorder:
+    """
+    Base class of the recorders of the memory subsystem, see
+    `AccessStream`, `MemoryTracer` and `AccessProfiler`.
+
+    A recorder covers a whole session. It is not part of the state of the
+    CPU, so it is shared with the snapshots of the CPU rather than rolled
+    back along with them: copying it returns the recorder itself.
+    """
+
+    def __deepcopy__(self, memo: dict) -> Recorder:
+        return self
@@ -0,0 +1,316 @@
+"""
+Replacement policies of caches, which choose the line to evict when a set is full.
+
+A policy keeps its state for all sets of a cache, and is told about every access with side effects
+through `ReplacementPolicy.touch()`. Policies are registered by name with `register_policy`, so any
+registered policy can be selected as `replacement_policy` in the config:
+
+>>> @register_policy
+... class MRUPolicy(ReplacementPolicy):
+...     name = "MRU"
+...     ...
+"""
+
+from __future__ import annotations
+
+import random
+from collections import OrderedDict
+from typing import Optional
+
+
+class ReplacementPolicy:
+    """
+    An abstract class implementing a replacement policy. Using this class
+    directly is not possible, as it does not choose any lines.
+    """
+
+    # Name of the policy in the config
+    name = ""
+
+    num_sets: int
+    num_lines: int
+
+    def __init__(self, num_sets: int, num_lines: int, seed: Optional[int] = None):
+        """
+        Parameters:
+            num_sets (int) -- the number of sets of the cache
+            num_lines (int) -- the number of lines (ways) per set
+            seed (int) -- the seed of the random numbers used by the
+                policy, if it uses any. None for a seed that differs on
+                every run (default = None).
+        """
+        self.num_sets = num_sets
+        self.num_lines = num_lines
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Resets the state of all sets, as if the cache had just been
+        created. Policies without state do not need to overwrite this.
+        """
+
+    def touch(self, index: int, way: int, filled: bool) -> None:
+        """
+        Updates the state after an access with side effects. Policies that
+        do not depend on the accesses do not need to overwrite this.
+
+        Parameters:
+            index (int) -- the index of the accessed set
+            way (int) -- the way of the accessed line within the set
+            filled (bool) -- whether the access filled the line with a
+                new tag, rather than accessing a line already in use.
+        """
+
+    def victim(self, index: int) -> int:
+        """
+        Chooses the line to be replaced in set 'index'. When called, all
+        lines of the set are in use, and the chosen one is filled next.
+
+        Parameters:
+            index (int) -- the index of the set
+
+        Returns:
+            int: The way of the line to be replaced.
+        """
+        raise Exception("Cache Replacement Policy not implemented.")
+
+
+# Replacement policies by name, see register_policy()
+policies: dict[str, type] = {}
+
+
+def register_policy(cls: type) -> type:
+    """Class decorator that makes a replacement policy available by its name."""
+    policies[cls.name] = cls
+    return cls
+
+
+def create_policy(
+    name: str, num_sets: int, num_lines: int, seed: Optional[int] = None
+) -> ReplacementPolicy:
+    """Creates the state of the replacement policy called 'name' for a cache."""
+    if name not in policies:
+        raise Exception("Unknown cache replacement policy. Check the config.yml file.")
+    return policies[name](num_sets, num_lines, seed)
+
+
+@register_policy
+class RandomPolicy(ReplacementPolicy):
+    """
+    Random replacement (RR).
+
+    The victims are drawn from a random number generator owned by the
+    policy, so a cache started with the same seed always makes the same
+    choices, and the state of the generator is part of snapshots.
+    """
+
+    name = "RR"
+
+    _rng: random.Random
+
+    def __init__(self, num_sets: int, num_lines: int, seed: Optional[int] = None):
+        super().__init__(num_sets, num_lines, seed)
+        self._rng = random.Random(seed)
+
+    def victim(self, index: int) -> int:
+        return self._rng.randrange(self.num_lines)
+
+
+class _OrderedPolicy(ReplacementPolicy):
+    """
+    A policy that evicts the line that comes first in an order kept for
+    each set.
+
+    The order is an `OrderedDict` of the ways of the set, so moving a line to
+    the end and picking the victim both take constant time. As it only
+    depends on the sequence of accesses, replacement is fully deterministic.
+    """
+
+    # Ways of each set, in the order in which they are to be replaced
+    _order: list[OrderedDict[int, None]]
+
+    def reset(self) -> None:
+        self._order = [OrderedDict.fromkeys(range(self.num_lines)) for _ in range(self.num_sets)]
+
+    def victim(self, index: int) -> int:
+        return next(iter(self._order[index]))
+
+
+@register_policy
+class LRUPolicy(_OrderedPolicy):
+    """
+    Least recently used (LRU).
+
+    Every access moves the line to the end of the order of its set, so the
+    least recently used line comes first.
+    """
+
+    name = "LRU"
+
+    def touch(self, index: int, way: int, filled: bool) -> None:
+        self._order[index].move_to_end(way)
+
+
+@register_policy
+class FIFOPolicy(_OrderedPolicy):
+    """
+    First in, first out (FIFO).
+
+    Only filling a line moves it to the end of the order of its set, so the
+    line that was filled first comes first.
+    """
+
+    name = "FIFO"
+
+    def touch(self, index: int, way: int, filled: bool) -> None:
+        if filled:
+            self._order[index].move_to_end(way)
+
+
+@register_policy
+class TreePLRUPolicy(ReplacementPolicy):
+    """
+    Tree pseudo-LRU (PLRU), for a power of two ways.
+
+    The ways of a set are the leaves of a binary tree, with one bit per
+    inner node that points to the half holding the next victim. An access
+    points the bits on its path away from the accessed line, and the victim
+    is found by following the bits from the root. The bits of each set are
+    kept in a single integer, with node i (the root being 1, the children
+    of node n being 2n and 2n + 1) at bit i.
+    """
+
+    name = "PLRU"
+
+    # Number of levels of inner nodes
+    _depth: int
+    # Tree bits of each set
+    _bits: list[int]
+
+    def __init__(self, num_sets: int, num_lines: int, seed: Optional[int] = None):
+        if num_lines & (num_lines - 1) != 0:
+            raise Exception("Tree-PLRU needs a power of two ways.")
+        self._depth = num_lines.bit_length() - 1
+        super().__init__(num_sets, num_lines, seed)
+
+    def reset(self) -> None:
+        self._bits = [0] * self.num_sets
+
+    def touch(self, index: int, way: int, filled: bool) -> None:
+        bits = self._bits[index]
+        node = 1
+        for level in reversed(range(self._depth)):
+            half = (way >> level) & 1
+            # Point to the other half
+            if half:
+                bits &= ~(1 << node)
+            else:
+                bits |= 1 << node
+            node = 2 * node + half
+        self._bits[index] = bits
+
+    def victim(self, index: int) -> int:
+        bits = self._bits[index]
+        node = 1
+        for _ in range(self._depth):
+            node = 2 * node + ((bits >> node) & 1)
+        return node - self.num_lines
+
+
+@register_policy
+class SRRIPPolicy(ReplacementPolicy):
+    """
+    Static re-reference interval prediction (SRRIP), with hit priority.
+
+    Every line has a re-reference prediction value (RRPV) of `RRPV_BITS`
+    bits, which predicts how soon it is accessed again (0 soon, the maximum
+    distant). Filled lines are predicted to be accessed again in a long
+    interval (the maximum - 1), and hits predict a near one (0). The victim
+    is the first line with a distant prediction; if there is none, all lines
+    of the set age until there is one.
+    """
+
+    name = "SRRIP"
+
+    RRPV_BITS = 2
+    RRPV_MAX = (1 << RRPV_BITS) - 1
+
+    # RRPV of every line, `num_lines` per set
+    _rrpv: bytearray
+
+    def reset(self) -> None:
+        self._rrpv = bytearray([self.RRPV_MAX]) * (self.num_sets * self.num_lines)
+
+    def _insertion_rrpv(self) -> int:
+        """Returns the RRPV of a line that was just filled."""
+        return self.RRPV_MAX - 1
+
+    def touch(self, index: int, way: int, filled: bool) -> None:
+        self._rrpv[index * self.num_lines + way] = self._insertion_rrpv() if filled else 0
+
+    def victim(self, index: int) -> int:
+        start = index * self.num_lines
+        rrpv = self._rrpv[start:start + self.num_lines]
+        age = self.RRPV_MAX - max(rrpv)
+        if age:
+            rrpv = bytearray(value + age for value in rrpv)
+            self._rrpv[start:start + self.num_lines] = rrpv
+        return rrpv.index(self.RRPV_MAX)
+
+
+@register_policy
+class BRRIPPolicy(SRRIPPolicy):
+    """
+    Bimodal re-reference interval prediction (BRRIP).
+
+    Like SRRIP, but filled lines are predicted to be accessed again in a
+    distant interval, except for every `LONG_INTERVAL`-th fill, which gets a
+    long one. This keeps the cache from thrashing when the working set does
+    not fit. The fills are counted rather than chosen at random, so
+    replacement stays deterministic.
+    """
+
+    name = "BRRIP"
+
+    LONG_INTERVAL = 32
+
+    # Number of fills, modulo `LONG_INTERVAL`
+    _fills: int
+
+    def reset(self) -> None:
+        super().reset()
+        self._fills = 0
+
+    def _insertion_rrpv(self) -> int:
+        self._fills = (self._fills + 1) % self.LONG_INTERVAL
+        return self.RRPV_MAX - 1 if self._fills == 0 else self.RRPV_MAX
+
+
+@register_policy
+class LFUPolicy(ReplacementPolicy):
+    """
+    Least frequently used (LFU).
+
+    Every line counts its accesses since it was filled, in a counter that
+    saturates at 255. The victim is the first line with the lowest count.
+    """
+
+    name = "LFU"
+
+    # Access count of every line, `num_lines` per set
+    _counts: bytearray
+
+    def reset(self) -> None:
+        self._counts = bytearray(self.num_sets * self.num_lines)
+
+    def touch(self, index: int, way: int, filled: bool) -> None:
+        slot = index * self.num_lines + way
+        if filled:
+            self._counts[slot] = 1
+        elif self._counts[slot] < 255:
+            self._counts[slot] += 1
+
+    def victim(self, index: int) -> int:
+        start = index * self.num_lines
+        counts = self._counts[start:start + self.num_lines]
+        return counts.index(min(counts))
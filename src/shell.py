@@ -7,6 +7,7 @@ from prompt_toolkit import __version__ as prompt_toolkit_version
 from benedict import __version__ as benedict_version
 from os import system
 from math import ceil
+import argparse
 import sys
 from benedict import benedict
 import platform
@@ -18,6 +19,7 @@ from .word import Word
 from .byte import Byte
 from . import ui
 from .cpu import CPU, CPUStatus
+from .snapshot import FileSnapshotStore, NullSnapshotStore
 
 PROMPT = ui.BOW_ARROW_FILLED + " "
 
@@ -67,7 +69,7 @@ def __not_found(input: list[str], cpu: CPU):
 @func
 def __show(input: list[str], cpu: CPU):
     '''
-    {"mem": None, "cache": None, "regs": None, "queue": None, "rs": None, "prog": None, "bpu": None}
+    {"mem": None, "cache": None, "regs": None, "queue": None, "rs": None, "prog": None, "bpu": None, "stats": None, "mrc": None, "heatmap": None}
     '''
     if len(input) < 1:
         __not_found(input, cpu)
@@ -109,6 +111,28 @@ def __show(input: list[str], cpu: CPU):
         ui.print_prog(cpu.get_frontend(), cpu.get_exec_engine(), breakpoints, reg_capitalisation=cpu._config["UX"]["reg_capitalisation"])
     elif subcmd == 'bpu':
         ui.print_bpu(cpu.get_bpu())
+    elif subcmd == 'stats':
+        ui.print_stats(cpu.get_memory_subsystem(), cpu._config["UX"]["show_empty_sets"])
+    elif subcmd == 'mrc':
+        cache = cpu.get_memory_subsystem().cache
+        try:
+            max_sets = int(input[1]) if len(input) > 1 else 4 * cache.num_sets
+            max_ways = int(input[2]) if len(input) > 2 else 2 * cache.num_lines
+            ui.print_miss_ratio_curves(cpu.get_memory_subsystem(), max_sets, max_ways)
+        except ValueError:
+            print("Usage: show mrc <max sets, a power of two> <max ways>")
+    elif subcmd == 'heatmap':
+        profiler = cpu.get_memory_subsystem().profiler
+        if len(input) == 2 and profiler is not None:
+            try:
+                profiler.export_json(input[1])
+                print(f"Wrote the profile to {input[1]}")
+            except OSError as e:
+                print(f"Could not write {input[1]}: {e.strerror}")
+        elif len(input) > 2:
+            print("Usage: show heatmap <JSON file to export to>")
+        else:
+            ui.print_heatmap(cpu.get_memory_subsystem(), cpu._config["UX"]["show_empty_sets"])
     else:
         __not_found(input, cpu)
 
@@ -121,6 +145,7 @@ def __edit(input: list[str], cpu: CPU) -> CPU:
     if len(input) < 1:
         __not_found(input, cpu)
         return cpu
+    cpu.notify_edit()
     subcmd = input[0]
     if subcmd == 'word':
         if len(input) == 3:
@@ -268,9 +293,12 @@ def exec(cpu: CPU, steps=-1, break_at_retire=False) -> CPU:
 
 @func
 def __restart(input: list[str], cpu: CPU) -> CPU:
-    cpu = cpu.restore_snapshot(cpu, cpu._snapshot_index * -1 + 1)
-    ui.all_headers(cpu, breakpoints)
-    return cpu
+    restored = cpu.restore_snapshot(cpu, cpu._snapshot_index * -1 + 1)
+    if restored is None:
+        print("Can't restore snapshot")
+        return cpu
+    ui.all_headers(restored, breakpoints)
+    return restored
 
 
 @func
@@ -355,26 +383,78 @@ def __(input: list[str], cpu: CPU):
 completer = NestedCompleter.from_nested_dict(completions)
 
 
+def _image_arg(arg: str) -> tuple[int, str]:
+    """Parses the ADDR:FILE argument of --load."""
+    try:
+        base, path = arg.split(":", 1)
+        return int(base, base=16), path
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected ADDR:FILE with ADDR in hex, got {arg!r}")
+
+
+def _dump_arg(arg: str) -> tuple[int, int, str]:
+    """Parses the START:END:FILE argument of --dump."""
+    try:
+        start, end, path = arg.split(":", 2)
+        return int(start, base=16), int(end, base=16), path
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected START:END:FILE with START and END in hex, got {arg!r}")
+
+
 def main():
     # grab arguments
-    args = sys.argv[1:]
+    arg_parser = argparse.ArgumentParser(prog="main.py")
+    arg_parser.add_argument("program", nargs="?", help="the program to execute")
+    arg_parser.add_argument("--history", metavar="FILE", help="record the history of this session in FILE")
+    arg_parser.add_argument("--resume", metavar="FILE", help="continue the history recorded in FILE")
+    arg_parser.add_argument("--load", metavar="ADDR:FILE", action="append", default=[],
+                            type=_image_arg, help="map FILE into memory at ADDR (in hex) before the program starts")
+    arg_parser.add_argument("--dump", metavar="START:END:FILE", action="append", default=[],
+                            type=_dump_arg, help="write memory from START to END (in hex) to FILE when quitting")
+    arg_parser.add_argument("--seed", type=int, help="seed of random cache replacement, to reproduce a run")
+    arg_parser.add_argument("--trace", metavar="FILE", help="write a binary trace of all memory accesses to FILE")
+    args = arg_parser.parse_args()
+    if args.resume is not None and (args.program is not None or args.load):
+        arg_parser.error("--resume continues the recorded program, it cannot be combined with a program or --load")
 
     # grab config file
     path = 'config.yml'
     config = benedict.from_yaml(path)
 
-    # Create CPU
-    cpu = CPU(config)
+    if args.seed is not None:
+        config["Cache"]["seed"] = args.seed
+
+    if args.trace is not None:
+        config["Memory"]["trace"] = args.trace
+
+    if args.history is not None:
+        config["History"]["store"] = "file"
+        config["History"]["file"] = args.history
+
+    # Create CPU. When resuming, this CPU only provides the parser and microprograms,
+    # the history is kept by the store that was opened.
+    cpu = CPU(config, NullSnapshotStore() if args.resume is not None else None)
 
     # Add `mul` instruction for test programme
     mul = InstrReg("mul", lambda a, b: Word(a.value * b.value), cycles=10)
     cpu._parser.add_instruction(mul)
 
-    # Load program
-    try:
-        # Load program
-        cpu.load_program_from_file(args[0])
-    except IndexError:
+    if args.resume is not None:
+        # Continue where the recorded history left off
+        try:
+            cpu = FileSnapshotStore.open(args.resume).resume(cpu)
+        except OSError as e:
+            print(f"{ui.RED + ui.BOLD}Could not open {args.resume}: {e.strerror}{ui.ENDC}")
+            exit(1)
+        except ValueError as e:
+            print(f"{ui.RED + ui.BOLD}Could not resume {args.resume}: {e}{ui.ENDC}")
+            exit(1)
+    elif args.program is not None:
+        # Load memory images and the program
+        for base, image in args.load:
+            cpu.load_image_from_file(image, base)
+        cpu.load_program_from_file(args.program)
+    else:
         print_version()
         ui.get_terminal_size()
         ui.print_div()
@@ -386,23 +466,29 @@ def main():
     print(f"{ui.BLUE + ui.BOLD}  Press tab for a list of available commands.{ui.ENDC}")
 
     # enter main loop for shell
-    while True:
-        try:
-            text = session.prompt(
-                PROMPT, auto_suggest=AutoSuggestFromHistory(), completer=completer, complete_while_typing=True)
-        except KeyboardInterrupt:
-            break
-        except EOFError:
-            break
-        else:
-            text = '__' + text
-            cmd = text.split()[0]
-            params = text.split()[1:]
-            ui.get_terminal_size()
-            fn = funcs.get(cmd, __not_found)
-            n_cpu = fn(params, cpu)
-            if n_cpu is not None:
-                cpu = n_cpu
+    try:
+        while True:
+            try:
+                text = session.prompt(
+                    PROMPT, auto_suggest=AutoSuggestFromHistory(), completer=completer, complete_while_typing=True)
+            except KeyboardInterrupt:
+                break
+            except EOFError:
+                break
+            else:
+                text = '__' + text
+                cmd = text.split()[0]
+                params = text.split()[1:]
+                ui.get_terminal_size()
+                fn = funcs.get(cmd, __not_found)
+                n_cpu = fn(params, cpu)
+                if n_cpu is not None:
+                    cpu = n_cpu
+    finally:
+        for start, end, image in args.dump:
+            cpu.dump_image_to_file(image, start, end)
+        if cpu.get_memory_subsystem().tracer is not None:
+            cpu.get_memory_subsystem().tracer.close()
 
 
 if __name__ == "__main__":
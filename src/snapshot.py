@@ -0,0 +1,747 @@
+"""
+Snapshot history of a CPU, used to step backwards and forwards through the cycles of a program.
+
+Every CPU owns a `SnapshotStore`, selected by the `History.store` setting in the config file:
+
+- `none` (`NullSnapshotStore`) keeps no snapshots at all, for running programs at full speed.
+- `memory` (`MemorySnapshotStore`) keeps a deep copy of the CPU for every snapshot. This is simple,
+  but expensive. Main memory is cheap to copy, as its pages are shared until they are written.
+- `journal` (`JournalSnapshotStore`) only records what changed from one snapshot to the next: the
+  bytes written to main memory, and the components of the CPU (memory subsystem, BPU, execution
+  engine, frontend) whose state differs from the previous snapshot.
+- `file` (`FileSnapshotStore`) writes the same journal to a file instead of keeping it in memory.
+- `keyframe` (`KeyframeSnapshotStore`) only keeps a full snapshot (keyframe) every few cycles, and
+  rebuilds the cycles in between by replaying them from the nearest keyframe. Its memory use can be
+  bounded by a budget, in which case keyframes are thinned out as the history grows.
+"""
+
+from __future__ import annotations
+
+import bisect
+import copy
+import io
+import mmap
+import os
+import pickle
+import struct
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, BinaryIO, Optional
+
+from .instructions import Instruction, InstructionKind
+from .mainmemory import PagedMemory
+
+if TYPE_CHECKING:
+    from .cpu import CPU
+
+# Attributes of the CPU that make up its state, in the order in which they are restored. A component
+# may only reference components that precede it.
+_COMPONENTS = ("_mem", "_bpu", "_exec_engine", "_frontend")
+# Attributes of the memory subsystem that record the whole session rather than being part of the
+# state of the CPU. All snapshots reference the recorders of the CPU the store was started with.
+_RECORDERS = ("access_stream", "tracer", "profiler")
+
+
+@dataclass
+class _Entry:
+    """A single snapshot in the journal."""
+
+    # Pickled state of each component in `_COMPONENTS`. A component that did not change since the
+    # previous entry shares the previous entry's `bytes` object.
+    components: tuple[bytes, ...]
+    # Bytes written to main memory since the previous entry, as (address, old value, new value)
+    memory_writes: list[tuple[int, int, int]]
+
+
+class _Pickler(pickle.Pickler):
+    """Pickles one component of a CPU, referencing other components and shared objects by ID."""
+
+    def __init__(self, file: io.BytesIO, store: SnapshotStore, cpu: Optional[CPU], root: Any):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+
+        self._store = store
+        self._root = root
+        self._refs = {}
+        self._static = set()
+
+        if cpu is None:
+            return
+
+        for name in _COMPONENTS:
+            obj = getattr(cpu, name)
+            if obj is not None:
+                self._refs[id(obj)] = ("component", name)
+        # Main memory is not part of any component, it is stored separately
+        self._refs[id(cpu._mem.memory)] = ("memory",)
+
+        # The configuration and the list of program instructions never change
+        self._static.add(id(cpu._config))
+        if cpu._frontend is not None:
+            self._static.add(id(cpu._frontend.instr_list))
+        for name in _RECORDERS:
+            recorder = getattr(cpu._mem, name)
+            if recorder is not None:
+                self._refs[id(recorder)] = ("recorder", name)
+
+    def persistent_id(self, obj: Any) -> Optional[tuple]:
+        if obj is self._root:
+            return None
+
+        ref = self._refs.get(id(obj))
+        if ref is not None:
+            return ref
+
+        return self._store._persistent_id(obj, id(obj) in self._static)
+
+
+class _Unpickler(pickle.Unpickler):
+    """Unpickles one component of a CPU, resolving the references made by `_Pickler`."""
+
+    def __init__(
+        self, data: bytes, store: SnapshotStore, components: dict, memory: Optional[PagedMemory]
+    ):
+        super().__init__(io.BytesIO(data))
+
+        self._store = store
+        self._components = components
+        self._memory = memory
+
+    def persistent_load(self, pid: tuple) -> Any:
+        if pid[0] == "component":
+            return self._components[pid[1]]
+        if pid[0] == "memory":
+            return self._memory
+        if pid[0] == "recorder":
+            return self._store._recorders.get(pid[1])
+        return self._store._persistent_load(pid)
+
+
+class SnapshotStore:
+    """
+    Base class of the snapshot histories of a CPU.
+
+    Snapshots are indexed from 0 (the oldest) to `len(store) - 1` (the newest). Indexing a store
+    returns a new CPU instance with the state of that snapshot, so manipulating it does not change
+    the recorded history. The returned CPU uses the same store, which is never copied along with
+    its CPU.
+    """
+
+    # Whether the store keeps any snapshots. If not, the CPU does not take snapshots at all.
+    keeps_history: bool = True
+
+    # Shallow copy of the first CPU, providing everything that is not part of a component
+    _template: Optional[CPU]
+    # Objects that are referenced rather than pickled, see `_Pickler.persistent_id`
+    _shared: list
+    _shared_ids: dict[int, int]
+    # Recorders of the memory subsystem of the first CPU, by their name in `_RECORDERS`
+    _recorders: dict[str, Any]
+
+    def __init__(self):
+        self._template = None
+        self._shared = []
+        self._shared_ids = {}
+        self._recorders = {}
+
+    @classmethod
+    def from_config(cls, history_conf: dict) -> SnapshotStore:
+        """Creates a store given the `History` section of the config file."""
+        return cls()
+
+    def __deepcopy__(self, memo: dict) -> SnapshotStore:
+        return self
+
+    def __len__(self) -> int:
+        raise NotImplementedError("Must be overwritten by a concrete snapshot store")
+
+    def __getitem__(self, index: int) -> CPU:
+        """Returns a new CPU instance with the state of the snapshot at 'index'."""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("snapshot index out of range")
+        return self._restore(index)
+
+    def append(self, cpu: CPU, ticked: bool = False) -> None:
+        """
+        Adds the current state of 'cpu' as the newest snapshot.
+
+        The CPU must either be the one the store was started with, or one
+        restored from its newest snapshot.
+
+        Parameters:
+            cpu (CPU) -- the CPU whose state to record.
+            ticked (bool) -- whether the CPU reached this state by executing
+                exactly one cycle from the newest snapshot, without any other
+                changes to its state.
+        """
+        raise NotImplementedError("Must be overwritten by a concrete snapshot store")
+
+    def truncate(self, length: int) -> None:
+        """Forgets about all snapshots from index 'length' onwards."""
+        raise NotImplementedError("Must be overwritten by a concrete snapshot store")
+
+    def _restore(self, index: int) -> CPU:
+        raise NotImplementedError("Must be overwritten by a concrete snapshot store")
+
+    def _set_template(self, cpu: CPU) -> None:
+        """Remembers everything about 'cpu' that is not part of a component."""
+        self._template = copy.copy(cpu)
+        for name in _COMPONENTS:
+            setattr(self._template, name, None)
+        self._recorders = {name: getattr(cpu._mem, name) for name in _RECORDERS}
+
+    def _dump(self, cpu: CPU, component: str, previous: Optional[bytes] = None) -> bytes:
+        """Pickles a component, reusing the previous pickle if its state did not change."""
+        f = io.BytesIO()
+        root = getattr(cpu, component)
+        _Pickler(f, self, cpu, root).dump(root)
+        data = f.getvalue()
+        return previous if data == previous else data
+
+    def _load(self, components: tuple[bytes, ...], memory: PagedMemory, index: int) -> CPU:
+        """Creates a CPU from pickled components and the contents of main memory."""
+        cpu = copy.copy(self._template)
+        loaded: dict[str, Any] = {}
+        for name, data in zip(_COMPONENTS, components):
+            loaded[name] = _Unpickler(data, self, loaded, memory).load()
+            setattr(cpu, name, loaded[name])
+        cpu._snapshot_index = index
+        return cpu
+
+    def _persistent_id(self, obj: Any, static: bool) -> Optional[tuple]:
+        """
+        Returns the ID by which pickled components reference 'obj', or None if
+        'obj' is pickled along with them. 'static' tells whether 'obj' is one
+        of the objects that never change, like the configuration.
+        """
+        # Instructions never change once parsed, and may hold lambdas that can't be pickled
+        if static or isinstance(obj, (Instruction, InstructionKind)):
+            key = id(obj)
+            if key not in self._shared_ids:
+                self._shared_ids[key] = len(self._shared)
+                self._shared.append(obj)
+            return ("shared", self._shared_ids[key])
+        return None
+
+    def _persistent_load(self, pid: tuple) -> Any:
+        """Returns the object referenced by an ID returned by _persistent_id()."""
+        if pid[0] == "shared":
+            return self._shared[pid[1]]
+        raise pickle.UnpicklingError(f"Unknown persistent ID {pid!r}")
+
+
+class NullSnapshotStore(SnapshotStore):
+    """A snapshot store that does not keep any snapshots."""
+
+    keeps_history = False
+
+    def __len__(self) -> int:
+        return 0
+
+    def append(self, cpu: CPU, ticked: bool = False) -> None:
+        pass
+
+    def truncate(self, length: int) -> None:
+        pass
+
+
+class MemorySnapshotStore(SnapshotStore):
+    """A snapshot store that keeps a deep copy of the CPU for every snapshot."""
+
+    _snapshots: list[CPU]
+
+    def __init__(self):
+        super().__init__()
+        self._snapshots = []
+
+    def __len__(self) -> int:
+        return len(self._snapshots)
+
+    def append(self, cpu: CPU, ticked: bool = False) -> None:
+        self._snapshots.append(self._copy(cpu))
+
+    def truncate(self, length: int) -> None:
+        del self._snapshots[length:]
+
+    def _restore(self, index: int) -> CPU:
+        return self._copy(self._snapshots[index])
+
+    @staticmethod
+    def _copy(cpu: CPU) -> CPU:
+        """Deep-copies a CPU, except for its configuration and parser that never change."""
+        memo = {id(cpu._config): cpu._config, id(cpu._parser): cpu._parser}
+        return copy.deepcopy(cpu, memo)
+
+
+class JournalSnapshotStore(SnapshotStore):
+    """
+    History of CPU snapshots that only records the state that changed between snapshots.
+
+    The contents of main memory are only kept for the newest snapshot; older ones are reconstructed
+    by undoing the journaled memory writes in reverse order. Everything else is stored pickled, one
+    pickle per component, so a component that did not change is shared with the previous snapshot.
+    """
+
+    _entries: list[_Entry]
+    # Main memory contents as of the newest snapshot
+    _memory: Optional[PagedMemory]
+
+    def __init__(self):
+        super().__init__()
+        self._entries = []
+        self._memory = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def append(self, cpu: CPU, ticked: bool = False) -> None:
+        mem = cpu._mem
+
+        if len(self) == 0:
+            # The first snapshot holds the full main memory, everything after is journaled
+            self._set_template(cpu)
+            self._memory = mem.memory.copy()
+            self._store_memory(self._memory)
+            mem.start_journal()
+            memory_writes = []
+            previous = (None,) * len(_COMPONENTS)
+        else:
+            memory_writes = mem.take_journal()
+            for address, _, new in memory_writes:
+                self._memory[address] = new
+            previous = self._components(len(self) - 1)
+
+        components = tuple(
+            self._dump(cpu, name, prev) for name, prev in zip(_COMPONENTS, previous)
+        )
+        self._add_entry(_Entry(components, memory_writes))
+
+    def truncate(self, length: int) -> None:
+        for index in reversed(range(length, len(self))):
+            self._undo_writes(self._memory, self._memory_writes(index))
+        self._remove_entries(length)
+
+    def _restore(self, index: int) -> CPU:
+        memory = self._memory.copy()
+        for i in reversed(range(index + 1, len(self))):
+            self._undo_writes(memory, self._memory_writes(i))
+
+        return self._load(self._components(index), memory, index)
+
+    @staticmethod
+    def _undo_writes(memory: PagedMemory, memory_writes: list[tuple[int, int, int]]) -> None:
+        """Reverts the given memory writes."""
+        for address, old, _ in reversed(memory_writes):
+            memory[address] = old
+
+    # The following functions store the entries of the journal, and may be overwritten to store
+    # them elsewhere.
+
+    def _store_memory(self, memory: PagedMemory) -> None:
+        """Stores the contents of main memory at the first snapshot."""
+
+    def _add_entry(self, entry: _Entry) -> None:
+        """Stores the entry of the newest snapshot."""
+        self._entries.append(entry)
+
+    def _remove_entries(self, length: int) -> None:
+        """Removes all entries from index 'length' onwards."""
+        del self._entries[length:]
+
+    def _components(self, index: int) -> tuple[bytes, ...]:
+        """Returns the pickled components of the entry at 'index'."""
+        return self._entries[index].components
+
+    def _memory_writes(self, index: int) -> list[tuple[int, int, int]]:
+        """Returns the memory writes of the entry at 'index'."""
+        return self._entries[index].memory_writes
+
+
+class FileSnapshotStore(JournalSnapshotStore):
+    """
+    Journal of CPU snapshots that is written to a file instead of being kept in memory.
+
+    Entries are appended to the data file at 'path', and an index of fixed-size records pointing
+    into the data file is kept in 'path' + ".idx", which is mapped into memory. Only the contents
+    of main memory of the newest snapshot are kept in memory; everything else is loaded from the
+    files when a snapshot is restored. A history recorded in one session can be continued in a
+    later one, see open() and resume().
+    """
+
+    # Magic, number of entries, offset and length of the main memory contents at the first snapshot
+    _HEADER = struct.Struct("<8sQQQ")
+    _MAGIC = b"CPUHIST1"
+    # Offset and length of each component and of the memory writes, and end of the entry's data
+    _RECORD = struct.Struct("<" + "QI" * (len(_COMPONENTS) + 1) + "Q")
+    # Address, old value and new value of a memory write
+    _WRITE = struct.Struct("<IBB")
+    # Number of records the index grows by when it is full
+    _INDEX_GROWTH = 4096
+
+    path: str
+
+    _data: BinaryIO
+    _index_file: BinaryIO
+    _index: mmap.mmap
+    _length: int
+    # Data locations of the components of the newest entry, so unchanged ones are not written again
+    _last: Optional[tuple[bytes, ...]]
+    _last_locations: tuple[tuple[int, int], ...]
+    # Objects written to the data file once and referenced by location, both by ID and location
+    _stored: dict[int, tuple]
+    _loaded: dict[tuple, Any]
+
+    def __init__(self, path: str, resume: bool = False):
+        """
+        Parameters:
+            path (str) -- the path of the data file.
+            resume (bool) -- whether to open a history recorded earlier rather
+                than starting a new one. Use open() instead of passing this.
+        """
+        super().__init__()
+
+        self.path = path
+        mode = "r+b" if resume else "w+b"
+        self._data = open(path, mode)
+        self._index_file = open(path + ".idx", mode)
+        self._last = None
+        self._last_locations = ()
+        self._stored = {}
+        self._loaded = {}
+
+        if not resume:
+            self._index_file.truncate(self._HEADER.size + self._INDEX_GROWTH * self._RECORD.size)
+        elif os.fstat(self._index_file.fileno()).st_size < self._HEADER.size:
+            self._data.close()
+            self._index_file.close()
+            raise ValueError(f"{path!r} does not contain a snapshot history")
+        self._index = mmap.mmap(self._index_file.fileno(), 0)
+
+        if not resume:
+            self._length = 0
+            self._write_header(0, 0)
+            return
+
+        magic, self._length, memory_offset, memory_length = self._HEADER.unpack_from(self._index)
+        if magic != self._MAGIC:
+            raise ValueError(f"{path!r} does not contain a snapshot history")
+
+        # Rebuild the contents of main memory at the newest snapshot
+        self._memory = PagedMemory.from_bytes(self._read(memory_offset, memory_length))
+        for index in range(self._length):
+            for address, _, new in self._memory_writes(index):
+                self._memory[address] = new
+
+    @classmethod
+    def from_config(cls, history_conf: dict) -> SnapshotStore:
+        return cls(history_conf["file"])
+
+    @classmethod
+    def open(cls, path: str) -> FileSnapshotStore:
+        """Opens a history recorded earlier, to be continued with resume()."""
+        return cls(path, resume=True)
+
+    def resume(self, cpu: CPU) -> CPU:
+        """
+        Continues a history recorded earlier.
+
+        Parameters:
+            cpu (CPU) -- a CPU providing everything that is not recorded in
+                snapshots: the configuration, and a parser and microprograms
+                that know all instructions used by the recorded program.
+
+        Returns:
+            CPU: The CPU as of the newest snapshot, recording further
+                snapshots in this store.
+        """
+        if not self._length:
+            raise ValueError(f"{self.path!r} does not contain any snapshots")
+        self._set_template(cpu)
+        self._template._snapshots = self
+        return self[len(self) - 1]
+
+    def close(self) -> None:
+        """Closes the files of the store."""
+        self._index.close()
+        self._index_file.close()
+        self._data.close()
+
+    def __len__(self) -> int:
+        return self._length
+
+    def _persistent_id(self, obj: Any, static: bool) -> Optional[tuple]:
+        # Everything written to the file must be resolvable in a later session, so instruction
+        # kinds are referenced by name and the list of program instructions is written once
+        if isinstance(obj, InstructionKind):
+            return ("kind", obj.name)
+        if obj is self._template._config:
+            return ("config",)
+        if static:
+            pid = self._stored.get(id(obj))
+            if pid is None:
+                f = io.BytesIO()
+                _Pickler(f, self, None, obj).dump(obj)
+                pid = ("stored",) + self._write(f.getvalue())
+                self._stored[id(obj)] = pid
+                self._loaded[pid] = obj
+            return pid
+        return None
+
+    def _persistent_load(self, pid: tuple) -> Any:
+        if pid[0] == "kind":
+            return self._template._parser._instr_types[pid[1]]
+        if pid[0] == "config":
+            return self._template._config
+        if pid[0] == "stored":
+            if pid not in self._loaded:
+                data = self._read(pid[1], pid[2])
+                self._loaded[pid] = _Unpickler(data, self, {}, None).load()
+                self._stored[id(self._loaded[pid])] = pid
+            return self._loaded[pid]
+        return super()._persistent_load(pid)
+
+    def _store_memory(self, memory: PagedMemory) -> None:
+        self._write_header(*self._write(bytes(memory)))
+
+    def _add_entry(self, entry: _Entry) -> None:
+        locations = []
+        for i, data in enumerate(entry.components):
+            if self._last is not None and data is self._last[i]:
+                locations.append(self._last_locations[i])
+            else:
+                locations.append(self._write(data))
+        writes = b"".join(self._WRITE.pack(*write) for write in entry.memory_writes)
+        locations.append(self._write(writes))
+        self._data.flush()
+
+        # Grow the index if it is full
+        offset = self._record_offset(self._length)
+        if offset + self._RECORD.size > len(self._index):
+            self._index.resize(len(self._index) + self._INDEX_GROWTH * self._RECORD.size)
+
+        fields = [field for location in locations for field in location]
+        self._RECORD.pack_into(self._index, offset, *fields, self._data.tell())
+        self._length += 1
+        self._write_count()
+
+        self._last = entry.components
+        self._last_locations = tuple(locations[:-1])
+
+    def _remove_entries(self, length: int) -> None:
+        if length == 0:
+            # Start over, the next snapshot will be the first one again
+            self._length = 0
+            self._write_header(0, 0)
+            self._data.truncate(0)
+            self._stored = {}
+            self._loaded = {}
+            self._last = None
+            return
+
+        self._length = length
+        self._write_count()
+
+        # Everything written after the last remaining entry is no longer needed
+        end = self._RECORD.unpack_from(self._index, self._record_offset(length - 1))[-1]
+        self._data.truncate(end)
+        self._stored = {key: pid for key, pid in self._stored.items() if pid[1] < end}
+        self._loaded = {pid: obj for pid, obj in self._loaded.items() if pid[1] < end}
+
+        self._last = None
+        self._last = self._components(length - 1)
+        self._last_locations = self._locations(length - 1)[:-1]
+
+    def _components(self, index: int) -> tuple[bytes, ...]:
+        if index == self._length - 1 and self._last is not None:
+            return self._last
+        locations = self._locations(index)[:-1]
+        return tuple(self._read(offset, length) for offset, length in locations)
+
+    def _memory_writes(self, index: int) -> list[tuple[int, int, int]]:
+        offset, length = self._locations(index)[-1]
+        return list(self._WRITE.iter_unpack(self._read(offset, length)))
+
+    def _locations(self, index: int) -> tuple[tuple[int, int], ...]:
+        """Returns the data locations of the components and memory writes of an entry."""
+        fields = self._RECORD.unpack_from(self._index, self._record_offset(index))
+        return tuple(zip(fields[0:-1:2], fields[1:-1:2]))
+
+    def _record_offset(self, index: int) -> int:
+        return self._HEADER.size + index * self._RECORD.size
+
+    def _write_header(self, memory_offset: int, memory_length: int) -> None:
+        self._HEADER.pack_into(
+            self._index, 0, self._MAGIC, self._length, memory_offset, memory_length
+        )
+
+    def _write_count(self) -> None:
+        struct.pack_into("<Q", self._index, len(self._MAGIC), self._length)
+
+    def _write(self, data: bytes) -> tuple[int, int]:
+        """Appends data to the data file and returns its offset and length."""
+        offset = self._data.seek(0, io.SEEK_END)
+        self._data.write(data)
+        return offset, len(data)
+
+    def _read(self, offset: int, length: int) -> bytes:
+        """Reads data from the data file."""
+        self._data.seek(offset)
+        return self._data.read(length)
+
+
+@dataclass
+class _Keyframe:
+    """A full snapshot in a `KeyframeSnapshotStore`."""
+
+    # Pickled state of each component in `_COMPONENTS`
+    components: tuple[bytes, ...]
+    # Contents of main memory, sharing unchanged pages with the CPU and other keyframes
+    memory: PagedMemory
+    # Whether the keyframe must be kept, because the snapshot can't be reached by replaying cycles
+    pinned: bool
+
+    def size(self, previous: Optional[_Keyframe]) -> int:
+        """
+        Returns the approximate number of bytes used by this keyframe. Pages of
+        memory shared with the previous keyframe 'previous' are counted for that
+        one only.
+        """
+        size = len(self.memory) + sum(len(data) for data in self.components)
+        if previous is not None:
+            size -= self.memory.shared_size(previous.memory)
+        return size
+
+
+class KeyframeSnapshotStore(SnapshotStore):
+    """
+    History of CPU snapshots that keeps a full snapshot every 'interval' cycles and replays the
+    cycles in between.
+
+    Snapshots that were not reached by executing a cycle (e.g. after the user edited memory) are
+    always kept as keyframes. If a memory budget is set and the keyframes exceed it, the interval is
+    doubled and every other keyframe is dropped, so the history can grow to any number of cycles at
+    a bounded memory cost, while restoring a snapshot takes at most 'interval' cycles of replay.
+
+    Replaying is exact as long as executing a cycle is deterministic. This holds for all
+    replacement policies, as random replacement draws from a generator that is part of the
+    snapshot.
+    """
+
+    # Number of cycles between two keyframes
+    interval: int
+    # Maximum number of bytes used by keyframes, or 0 for no limit
+    budget: int
+
+    _length: int
+    _keyframes: dict[int, _Keyframe]
+    # Indices of all keyframes, sorted
+    _indices: list[int]
+    # Number of bytes used by keyframes
+    _size: int
+
+    def __init__(self, interval: int, budget: int = 0):
+        """
+        Parameters:
+            interval (int) -- the number of cycles between two keyframes.
+            budget (int) -- the maximum number of bytes used by keyframes,
+                or 0 for no limit.
+        """
+        super().__init__()
+
+        if interval <= 0:
+            raise ValueError("Keyframe interval must be positive")
+
+        self.interval = interval
+        self.budget = budget
+        self._length = 0
+        self._keyframes = {}
+        self._indices = []
+        self._size = 0
+
+    @classmethod
+    def from_config(cls, history_conf: dict) -> SnapshotStore:
+        return cls(history_conf["keyframe_interval"], int(history_conf["keyframe_budget_mib"] * (1 << 20)))
+
+    def __len__(self) -> int:
+        return self._length
+
+    def append(self, cpu: CPU, ticked: bool = False) -> None:
+        if not self._keyframes:
+            self._set_template(cpu)
+
+        index = self._length
+        self._length += 1
+
+        if ticked and index % self.interval != 0:
+            # This snapshot can be rebuilt by replaying from the previous keyframe
+            return
+
+        keyframe = _Keyframe(
+            tuple(self._dump(cpu, name) for name in _COMPONENTS),
+            cpu._mem.memory.copy(),
+            not ticked,
+        )
+        self._keyframes[index] = keyframe
+        self._indices.append(index)
+        self._size += self._keyframe_size(len(self._indices) - 1)
+
+        while self.budget and self._size > self.budget:
+            if not self._thin():
+                break
+
+    def truncate(self, length: int) -> None:
+        while self._indices and self._indices[-1] >= length:
+            self._size -= self._keyframe_size(len(self._indices) - 1)
+            del self._keyframes[self._indices.pop()]
+        self._length = min(self._length, length)
+
+    def _restore(self, index: int) -> CPU:
+        # Start at the closest keyframe at or before the snapshot
+        start = self._indices[bisect.bisect_right(self._indices, index) - 1]
+        keyframe = self._keyframes[start]
+
+        cpu = self._load(keyframe.components, keyframe.memory.copy(), start)
+
+        # Replay the cycles up to the snapshot. Their accesses were recorded when they first happened.
+        recorders = {name: getattr(cpu._mem, name) for name in _RECORDERS}
+        for name in _RECORDERS:
+            setattr(cpu._mem, name, None)
+        for _ in range(index - start):
+            cpu._tick()
+        for name, recorder in recorders.items():
+            setattr(cpu._mem, name, recorder)
+        cpu._snapshot_index = index
+        return cpu
+
+    def _thin(self) -> bool:
+        """Doubles the keyframe interval and drops the keyframes that are no longer needed."""
+        self.interval *= 2
+
+        kept = []
+        for index in self._indices:
+            keyframe = self._keyframes[index]
+            if keyframe.pinned or index % self.interval == 0:
+                kept.append(index)
+            else:
+                del self._keyframes[index]
+
+        dropped = len(kept) != len(self._indices)
+        self._indices = kept
+        # The kept keyframes may share pages with other keyframes than before
+        self._size = sum(self._keyframe_size(position) for position in range(len(kept)))
+        return dropped
+
+    def _keyframe_size(self, position: int) -> int:
+        """Returns the number of bytes used by the keyframe at 'position' in `_indices`."""
+        previous = self._keyframes[self._indices[position - 1]] if position else None
+        return self._keyframes[self._indices[position]].size(previous)
+
+
+# Snapshot stores by the name used in the config file
+snapshot_stores: dict[str, type[SnapshotStore]] = {
+    "none": NullSnapshotStore,
+    "memory": MemorySnapshotStore,
+    "journal": JournalSnapshotStore,
+    "keyframe": KeyframeSnapshotStore,
+    "file": FileSnapshotStore,
+}
@@ -0,0 +1,167 @@
+"""
+Miss-ratio curves of LRU caches of all geometries, computed from a single recorded access stream.
+
+Sweeping the number of sets and ways of the cache would otherwise take one run of the program per
+configuration. Instead, the memory subsystem records the lines accessed by the program once, see
+`AccessStream`, and `miss_ratio_curves()` computes the misses of every configuration from it.
+
+This uses stack-distance analysis (Mattson et al., 1970): in each set, LRU orders the lines from the
+most to the least recently used, and an access hits a cache with `ways` ways exactly when fewer
+than `ways` other lines of its set were used since the previous access to the line. Counting the
+accesses for each of these stack distances therefore gives the misses of all associativities at
+once, and keeping one stack per set for each number of sets gives those of all set counts. Flushed
+lines leave a free position in the stack, which the next line to be moved down takes, so flushes
+are accounted for exactly.
+"""
+
+from __future__ import annotations
+
+from array import array
+from typing import Optional
+
+from .recorder import Recorder
+
+
+class AccessStream(Recorder):
+    """
+    The lines accessed by a program, along with the lines it flushed,
+    in the order it did so.
+
+    Each event takes a single 64 bit integer, holding the line and its
+    kind, so long runs can be recorded.
+    """
+
+    # Kinds of events
+    ACCESS = 0
+    FLUSH = 1
+    FLUSH_ALL = 2
+
+    line_size: int
+    # Events as `line << 2 | kind`, in the order they happened
+    _events: array
+
+    def __init__(self, line_size: int):
+        """
+        Parameters:
+            line_size (int) -- the line size of the cache, which all
+                analysed geometries share.
+        """
+        self.line_size = line_size
+        self._events = array("q")
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def access(self, address: int) -> None:
+        """Records an access to the line of 'address'."""
+        self._events.append((address // self.line_size) << 2 | self.ACCESS)
+
+    def flush(self, address: Optional[int] = None) -> None:
+        """Records a flush of the line of 'address', or of all lines if it is None."""
+        if address is None:
+            self._events.append(self.FLUSH_ALL)
+        else:
+            self._events.append((address // self.line_size) << 2 | self.FLUSH)
+
+    def clear(self) -> None:
+        """Forgets about all recorded events."""
+        self._events = array("q")
+
+
+class MissRatioCurves:
+    """
+    The hits and misses of LRU caches with any number of sets and ways up
+    to a maximum, see `miss_ratio_curves()`.
+    """
+
+    # Numbers of sets analysed, all powers of two
+    set_counts: list[int]
+    max_ways: int
+    # Number of accesses
+    accesses: int
+    # For each number of sets, the number of accesses at each stack distance below `max_ways`
+    _hits: dict[int, list[int]]
+
+    def __init__(self, set_counts: list[int], max_ways: int):
+        self.set_counts = set_counts
+        self.max_ways = max_ways
+        self.accesses = 0
+        self._hits = {sets: [0] * max_ways for sets in set_counts}
+
+    def hits(self, sets: int, ways: int) -> int:
+        """Returns the number of accesses that hit a cache of 'sets' sets and 'ways' ways."""
+        if sets not in self._hits or not 0 < ways <= self.max_ways:
+            raise ValueError(f"No miss-ratio curve for {sets} sets and {ways} ways")
+        return sum(self._hits[sets][:ways])
+
+    def misses(self, sets: int, ways: int) -> int:
+        """Returns the number of accesses that miss a cache of 'sets' sets and 'ways' ways."""
+        return self.accesses - self.hits(sets, ways)
+
+    def miss_ratio(self, sets: int, ways: int) -> float:
+        """Returns the share of accesses that miss a cache of 'sets' sets and 'ways' ways."""
+        misses = self.misses(sets, ways)
+        return misses / self.accesses if self.accesses else 0.0
+
+    def curve(self, sets: int) -> list[float]:
+        """Returns the miss ratios of a cache of 'sets' sets, for 1 to `max_ways` ways."""
+        return [self.miss_ratio(sets, ways) for ways in range(1, self.max_ways + 1)]
+
+
+def miss_ratio_curves(stream: AccessStream, max_sets: int, max_ways: int) -> MissRatioCurves:
+    """
+    Computes the misses of LRU caches with every power of two sets up to
+    'max_sets', and every number of ways up to 'max_ways', in a single
+    pass over the stream.
+
+    Parameters:
+        stream (AccessStream) -- the recorded accesses
+        max_sets (int) -- the largest number of sets, a power of two
+        max_ways (int) -- the largest number of ways
+
+    Returns:
+        MissRatioCurves: The hits and misses of all these caches.
+    """
+    if max_sets <= 0 or max_sets & (max_sets - 1) != 0:
+        raise ValueError("The number of sets must be a power of two.")
+    if max_ways <= 0:
+        raise ValueError("The number of ways must be positive.")
+
+    set_counts = [1 << i for i in range(max_sets.bit_length())]
+    curves = MissRatioCurves(set_counts, max_ways)
+    # For each number of sets, the lines of each set from the most to the least recently used,
+    # with None for the ways freed by flushes. Positions beyond the end are free as well. Lines
+    # beyond `max_ways` miss in all analysed caches, so they are dropped.
+    stacks = [[[] for _ in range(sets)] for sets in set_counts]
+    hits = [curves._hits[sets] for sets in set_counts]
+
+    for event in stream._events:
+        kind = event & 3
+        line = event >> 2
+        if kind == AccessStream.FLUSH_ALL:
+            stacks = [[[] for _ in range(sets)] for sets in set_counts]
+            continue
+
+        if kind == AccessStream.ACCESS:
+            curves.accesses += 1
+        for sets, set_stacks, set_hits in zip(set_counts, stacks, hits):
+            stack = set_stacks[line & (sets - 1)]
+            if line in stack:
+                distance = stack.index(line)
+                stack[distance] = None
+                if kind == AccessStream.FLUSH:
+                    continue
+                set_hits[distance] += 1
+            elif kind == AccessStream.FLUSH:
+                continue
+
+            # Caches that miss fill their first free way, or evict their least recently used line.
+            # Moving the line to the top of the stack, and the lines above the first free way down
+            # by one, does exactly that for all numbers of ways at once.
+            if None in stack:
+                del stack[stack.index(None)]
+            elif len(stack) == max_ways:
+                stack.pop()
+            stack.insert(0, line)
+
+    return curves
@@ -0,0 +1,250 @@
+"""
+Traces of the memory accesses of a program, streamed to a binary file.
+
+Every load, store and flush of an instruction becomes one fixed-width record, see `MemoryTracer`.
+Whether an access was transient is only known once its instruction retires or is squashed, so the
+records of instructions in flight are held back until then. Records are written in large chunks,
+and `TraceReader` maps a trace into memory, so traces of millions of accesses can be written and
+read without keeping them in memory.
+"""
+
+from __future__ import annotations
+
+import mmap
+import struct
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import BinaryIO, Iterator, Optional
+
+from .recorder import Recorder
+
+
+_MAGIC = b"TRCE"
+# Magic and size of a record
+_HEADER = struct.Struct("<4sI")
+# Cycle, PC, address, width, kind, flags (bit 0: hit, bit 1: fault) and outcome of an access
+_RECORD = struct.Struct("<QIIBBBB")
+
+
+@dataclass
+class TraceRecord:
+    """An access in a trace."""
+
+    # Cycle of the execution engine in which the access was made
+    cycle: int
+    # Address of the instruction that made the access
+    pc: int
+    address: int
+    # Number of bytes accessed
+    width: int
+    # MemoryTracer.READ, WRITE or FLUSH
+    kind: int
+    # Whether the line of the address was cached before the access
+    hit: bool
+    fault: bool
+    # MemoryTracer.TRANSIENT, RETIRED, UNKNOWN or FAULT
+    outcome: int
+
+    @classmethod
+    def unpack(cls, cycle: int, pc: int, address: int, width: int, kind: int, flags: int,
+               outcome: int) -> TraceRecord:
+        """Creates a record from the fields of its binary format."""
+        return cls(cycle, pc, address, width, kind, bool(flags & 1), bool(flags & 2), outcome)
+
+
+class MemoryTracer(Recorder):
+    """
+    Writes a record for every access of an instruction to a trace file.
+
+    The file starts with a header, followed by the records in the order
+    the accesses were made. Records are held back until the instruction
+    that made them retires (see retire()), faults (see fault()) or is
+    squashed (see squash()), and are then added to a buffer that is
+    written once it holds `BUFFER_SIZE` bytes.
+    """
+
+    # Kinds of accesses
+    READ = 0
+    WRITE = 1
+    FLUSH = 2
+
+    # Outcomes of the instruction that made an access
+    TRANSIENT = 0
+    RETIRED = 1
+    # The instruction was still in flight when the trace was closed, or was abandoned by going back
+    # in history
+    UNKNOWN = 2
+    # The instruction faulted, so its access was attempted architecturally rather than transiently
+    FAULT = 3
+
+    # Number of bytes of records to collect before writing them
+    BUFFER_SIZE = 1 << 20
+    # Number of records held back at most. Once there are more, the oldest is written with an
+    # UNKNOWN outcome, so records of instructions that never retire do not pile up.
+    MAX_PENDING = 1024
+
+    path: str
+    # Cycle of the execution engine, set by the engine on every tick
+    cycle: int
+    # Number of records written, including those in the buffer
+    written: int
+
+    _file: BinaryIO
+    _buffer: bytearray
+    # Fields of the records that are held back, by their number, oldest first. The outcome is None
+    # while the instruction is in flight.
+    _pending: OrderedDict[int, list]
+    # Number of the next record
+    _next: int
+
+    def __init__(self, path: str):
+        """
+        Parameters:
+            path (str) -- the file to write the trace to. An existing
+                file is overwritten.
+        """
+        self.path = path
+        self.cycle = 0
+        self.written = 0
+        self._file = open(path, "wb")
+        self._file.write(_HEADER.pack(_MAGIC, _RECORD.size))
+        self._buffer = bytearray()
+        self._pending = OrderedDict()
+        self._next = 0
+
+    def record(
+        self, kind: int, pc: int, address: int, width: int, hit: bool, fault: bool
+    ) -> int:
+        """
+        Records an access, to be written once its instruction retires,
+        faults or is squashed.
+
+        Parameters:
+            kind (int) -- `READ`, `WRITE` or `FLUSH`
+            pc (int) -- the address of the instruction making the access
+            address (int) -- the address accessed
+            width (int) -- the number of bytes accessed
+            hit (bool) -- whether the line of the address was cached
+            fault (bool) -- whether the access faults
+
+        Returns:
+            int: The number of the record, to be passed to retire() or
+                fault().
+        """
+        number = self._next
+        self._next += 1
+        flags = int(hit) | int(fault) << 1
+        self._pending[number] = [self.cycle, pc, address, width, kind, flags, None]
+        self._write_resolved()
+        return number
+
+    def retire(self, number: Optional[int]) -> None:
+        """
+        Marks the access with record 'number' as retired. Unknown numbers
+        and None are ignored.
+        """
+        self._resolve(number, self.RETIRED)
+
+    def fault(self, number: Optional[int]) -> None:
+        """
+        Marks the access with record 'number' as made by an instruction
+        that faulted. Unknown numbers and None are ignored.
+        """
+        self._resolve(number, self.FAULT)
+
+    def squash(self) -> None:
+        """Marks the accesses of all other instructions in flight as transient."""
+        self._resolve_pending(self.TRANSIENT)
+
+    def abandon(self) -> None:
+        """
+        Marks the accesses of all instructions in flight as UNKNOWN, as
+        their outcome is never seen when going back in history.
+        """
+        self._resolve_pending(self.UNKNOWN)
+
+    def _resolve(self, number: Optional[int], outcome: int) -> None:
+        """Sets the outcome of record 'number' if it is held back."""
+        fields = self._pending.get(number)
+        if fields is not None:
+            fields[6] = outcome
+            self._write_resolved()
+
+    def _resolve_pending(self, outcome: int) -> None:
+        """Sets the outcome of all held back records whose outcome is not known yet."""
+        for fields in self._pending.values():
+            if fields[6] is None:
+                fields[6] = outcome
+        self._write_resolved()
+
+    def _write_resolved(self) -> None:
+        """Moves the oldest records whose outcome is known to the buffer."""
+        while self._pending:
+            number, fields = next(iter(self._pending.items()))
+            if fields[6] is None:
+                if len(self._pending) <= self.MAX_PENDING:
+                    break
+                fields[6] = self.UNKNOWN
+            del self._pending[number]
+            self._buffer += _RECORD.pack(*fields)
+            self.written += 1
+
+        if len(self._buffer) >= self.BUFFER_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes the buffered records to the file."""
+        self._file.write(self._buffer)
+        self._file.flush()
+        self._buffer = bytearray()
+
+    def close(self) -> None:
+        """Writes all records, with an UNKNOWN outcome if it is not known yet, and closes the file."""
+        self.abandon()
+        self.flush()
+        self._file.close()
+
+
+class TraceReader:
+    """
+    A trace written by `MemoryTracer`, mapped into memory. Indexing and
+    iterating it returns `TraceRecord`s.
+    """
+
+    path: str
+
+    _file: BinaryIO
+    _map: mmap.mmap
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{path} is not a memory trace")
+
+        if len(self._map) < _HEADER.size or _HEADER.unpack_from(self._map) != (_MAGIC, _RECORD.size):
+            self.close()
+            raise ValueError(f"{path} is not a memory trace")
+
+    def __len__(self) -> int:
+        return (len(self._map) - _HEADER.size) // _RECORD.size
+
+    def __getitem__(self, index: int) -> TraceRecord:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("trace record index out of range")
+        return TraceRecord.unpack(*_RECORD.unpack_from(self._map, _HEADER.size + index * _RECORD.size))
+
+    def __iter__(self) -> Iterator[TraceRecord]:
+        end = _HEADER.size + len(self) * _RECORD.size
+        for offset in range(_HEADER.size, end, _RECORD.size):
+            yield TraceRecord.unpack(*_RECORD.unpack_from(self._map, offset))
+
+    def close(self) -> None:
+        """Closes the file of the trace."""
+        self._map.close()
+        self._file.close()
@@ -6,6 +6,7 @@ from math import ceil, floor
 from .bpu import BPU
 from .frontend import Frontend
 from .memory import MemorySubsystem
+from .stackdistance import miss_ratio_curves
 from .execution import ExecutionEngine
 from .word import Word
 from .cpu import CPU
@@ -114,15 +115,16 @@ def print_memory(memory: MemorySubsystem, lines=8, base=0x0000):
         if i >= memory.mem_size:
             return
         print_hex(i, p_end=": ", base_style=BOLD + YELLOW, style=BOLD + YELLOW)
-        for _ in range(fits):
-            if i >= memory.mem_size:
-                return
+        row = memory.read_range(i, min(2 * fits, memory.mem_size - i))
+        for j in range(0, len(row) - 1, 2):
+            value = row[j + 1] * 256 + row[j]
             if(memory.is_addr_cached(Word(i))):
-                print_hex(memory.memory[i + 1] * 256 + memory.memory[i],
-                          base_style=FAINT + RED, style=RED, base=False)
+                print_hex(value, base_style=FAINT + RED, style=RED, base=False)
             else:
-                print_hex(memory.memory[i + 1] * 256 + memory.memory[i], base=False)
+                print_hex(value, base=False)
             i += 2
+        if i >= memory.mem_size:
+            return
         print()
 
 
@@ -165,9 +167,11 @@ def print_cache(mem: MemorySubsystem, show_empty_sets: bool, show_empty_ways: bo
     data_header = ('─' * floor((data_length - 4) / 2)) + "Data" + ('─' * ceil((data_length - 4) / 2))
     print(f"╭─Index─┬──Tag──┬{data_header}╮")
 
-    for i, set in enumerate(mem.cache.sets):
+    cache = mem.cache
+    for i in range(cache.num_sets):
+        tags = [cache.line_tag(i, way) for way in range(cache.num_lines)]
 
-        if len([entry for entry in set if entry.is_in_use()]) == 0 and show_empty_sets is False:
+        if all(tag is None for tag in tags) and show_empty_sets is False:
             print(f"├{'─' * 7}┼{'─'*7}┼{'─' * data_length}┤")
             print(f"│ {FAINT}0x{ENDC}{'{:03x}'.format(i)} │ empty │{' ' * (data_length-0)}│")
             continue
@@ -175,35 +179,129 @@ def print_cache(mem: MemorySubsystem, show_empty_sets: bool, show_empty_ways: bo
         if i != 0:
             print(f"├{'─'*7}┼{'─'*7}┼{'─' * data_length}┤")
 
+        ways = list(range(cache.num_lines))
         if show_empty_ways is False:
-            set = [entry for entry in set if entry.is_in_use()]
+            ways = [way for way in ways if tags[way] is not None]
 
-        for j, entry in enumerate(set):
+        for j, way in enumerate(ways):
 
-            if (j + 1) == ceil(len(set) / 2) and len(set) % 2 == 1:
+            if (j + 1) == ceil(len(ways) / 2) and len(ways) % 2 == 1:
                 index_gap = f" {FAINT}0x{ENDC}{'{:03x}'.format(i)} "
             else:
                 index_gap = f"{' '*7}"
 
-            if entry.is_in_use():
-                print(f"│{index_gap}│ {FAINT}0x{ENDC}{'{:03x}'.format(entry.tag)} │ ", end="")
-                for a, val in enumerate(entry.data):
+            if tags[way] is not None:
+                print(f"│{index_gap}│ {FAINT}0x{ENDC}{'{:03x}'.format(tags[way])} │ ", end="")
+                for a, val in enumerate(cache.line_data(i, way)):
                     print(f"{hex_str(val, p_end=' ')}", end='')
                 print("│")
             else:
                 print(f"│{index_gap}│{' '*7}│{' '*data_length}│")
 
-            if (j + 1) == ceil(len(set) / 2) and len(set) % 2 == 0:
+            if (j + 1) == ceil(len(ways) / 2) and len(ways) % 2 == 0:
                 index_gap = f" {FAINT}0x{ENDC}{'{:03x}'.format(i)} "
             else:
                 index_gap = f"{' '*7}"
 
-            if j != len(set) - 1:
+            if j != len(ways) - 1:
                 print(f"│{index_gap}├{'─'*7}┼{'─' * data_length}┤")
 
     print(f"╰{'─'*7}┴{'─'*7}┴{'─' * data_length}╯")
 
 
+def print_stats(mem: MemorySubsystem, show_empty_sets: bool) -> None:
+    stats = mem.get_stats()
+    if all(level is None for level in stats.levels):
+        print("Cache statistics are disabled, set 'stats' in the 'Cache' section of the config to enable them.")
+    for number, level in enumerate(stats.levels, 1):
+        if level is None:
+            continue
+        totals = level.totals()
+        print(f"{BOLD}L{number}{ENDC}: {totals['hits']} hits, {totals['misses']} misses "
+              f"({level.hit_rate:.1%} hit rate), {totals['fills']} fills, "
+              f"{totals['evictions']} evictions, {totals['flushes']} flushes")
+        print("╭─Index─┬───Hits─┬─Misses─┬─Evictions─┬─Flushes─╮")
+        for i in range(len(level.hits)):
+            counts = (level.hits[i], level.misses[i], level.evictions[i], level.flushes[i])
+            if not show_empty_sets and not any(counts):
+                continue
+            print(f"│ {FAINT}0x{ENDC}{'{:03x}'.format(i)} │ {counts[0]:6} │ {counts[1]:6} │ "
+                  f"{counts[2]:9} │ {counts[3]:7} │")
+        print("╰───────┴────────┴────────┴───────────┴─────────╯")
+    if stats.mshrs is not None:
+        print(f"{BOLD}MSHRs{ENDC}: {stats.mshrs.primary_misses} misses, "
+              f"{stats.mshrs.merged_misses} merged, {stats.mshrs.stalls} stalls, "
+              f"{stats.mshrs.mlp:.2f} memory-level parallelism")
+    for prefetcher in stats.prefetchers:
+        print(f"{BOLD}Prefetcher {prefetcher.name}{ENDC}: {prefetcher.issued} issued, "
+              f"{prefetcher.useful} useful ({prefetcher.accuracy:.1%} accuracy, "
+              f"{prefetcher.coverage:.1%} coverage)")
+
+
+def print_miss_ratio_curves(mem: MemorySubsystem, max_sets: int, max_ways: int) -> None:
+    if mem.access_stream is None:
+        print("Accesses are not recorded, set 'record_accesses' in the 'Cache' section of the config to record them.")
+        return
+    curves = miss_ratio_curves(mem.access_stream, max_sets, max_ways)
+    print(f"{BOLD}Miss ratios of LRU caches{ENDC} ({curves.accesses} accesses, "
+          f"{mem.access_stream.line_size} byte lines, current cache highlighted)")
+    labels = (f"{ways} way{'s' if ways > 1 else ''}" for ways in range(1, max_ways + 1))
+    print("╭──Sets─┬" + "┬".join(f"{label:─>7}─" for label in labels) + "╮")
+    for sets in curves.set_counts:
+        cells = []
+        for ways in range(1, max_ways + 1):
+            cell = f"{curves.miss_ratio(sets, ways):7.1%} "
+            if (sets, ways) == (mem.cache.num_sets, mem.cache.num_lines):
+                cell = f"{BOLD}{cell}{ENDC}"
+            cells.append(cell)
+        print(f"│ {sets:5} │" + "│".join(cells) + "│")
+    print("╰───────┴" + "┴".join("─" * 8 for _ in range(max_ways)) + "╯")
+
+
+def print_heatmap(mem: MemorySubsystem, show_empty_sets: bool, lines_per_set: int = 3) -> None:
+    profiler = mem.profiler
+    if profiler is None:
+        print("Accesses are not profiled, set 'profile' in the 'Cache' section of the config to profile them.")
+        return
+
+    # The lines with the most misses in each set
+    hot_lines: list[list[tuple[int, int, int]]] = [[] for _ in range(profiler.num_sets)]
+    for line in profiler.hot_lines(len(profiler.line_accesses)):
+        set_lines = hot_lines[(line[0] // profiler.line_size) % profiler.num_sets]
+        if len(set_lines) < lines_per_set:
+            set_lines.append(line)
+
+    shades = " ░▒▓█"
+    width = 20
+    most_misses = max(profiler.set_misses) or 1
+    print(f"{BOLD}Misses per set{ENDC} (hottest lines as address: misses/accesses)")
+    print(f"╭─Index─┬─Accesses─┬─Misses─┬{'─' * width}┬{'─' * 7}")
+    for i in range(profiler.num_sets):
+        accesses, misses = profiler.set_accesses[i], profiler.set_misses[i]
+        if not show_empty_sets and not accesses:
+            continue
+        filled = misses * width / most_misses
+        bar = shades[-1] * int(filled)
+        if len(bar) < width:
+            bar += shades[round((filled - int(filled)) * (len(shades) - 1))]
+        lines = "  ".join(f"{hex_str(address, p_end='', fixed_width=False)}: {line_misses}/{line_accesses}"
+                          for address, line_accesses, line_misses in hot_lines[i])
+        print(f"│ {FAINT}0x{ENDC}{'{:03x}'.format(i)} │ {accesses:8} │ {misses:6} │{RED}{bar:{width}}{ENDC}│ {lines}")
+    print(f"╰───────┴──────────┴────────┴{'─' * width}┴{'─' * 7}")
+
+    buckets = []
+    for (smallest, largest), accesses in zip(profiler.reuse_buckets(), profiler.reuse):
+        if largest is None:
+            label = f"≥{smallest}"
+        elif smallest == largest:
+            label = f"{smallest}"
+        else:
+            label = f"{smallest}-{largest}"
+        if accesses:
+            buckets.append(f"{label}: {accesses}")
+    print(f"{BOLD}Reuse distances{ENDC} (other lines accessed in between): {', '.join(buckets) or 'none'}")
+
+
 def instruction_str(instr: Instruction, reg_capitalisation: bool = False) -> tuple[str, int]:
     instr_str = f"{YELLOW}{instr.ty.name}{ENDC}{' ' * (6 - len(instr.ty.name))}"
     length = 6 if len(instr.ty.name) <= 6 else len(instr.ty.name)
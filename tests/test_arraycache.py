@@ -0,0 +1,79 @@
+import copy
+import pickle
+import random
+import unittest
+
+from src import cache
+from src.arraycache import ArrayCache
+from src.mainmemory import PagedMemory
+
+
+class ArrayCacheTests(unittest.TestCase):
+    def _compare(self, policy, backing=None):
+        """Runs the same random accesses on an `ArrayCache` and on a `PolicyCache`."""
+        # Both caches have to pick the same random victims
+        reference = cache.PolicyCache(4, 2, 4, policy, backing=backing, seed=7)
+        arrays = ArrayCache(4, 2, 4, policy, backing=backing, seed=7)
+        reference.enable_stats()
+        arrays.enable_stats()
+
+        ops = random.Random(1)
+        for _ in range(2000):
+            addr = ops.randrange(128)
+            kind = ops.randrange(100)
+            side_effects = ops.random() < 0.8
+            results = []
+            for c in (reference, arrays):
+                if kind < 30:
+                    results.append(c.read(addr, side_effects))
+                elif kind < 60:
+                    results.append(c.write(addr, addr, side_effects))
+                elif kind < 80:
+                    base = addr & ~3
+                    results.append(c.fill_line(base, list(range(base, base + 4)), side_effects))
+                elif kind < 95:
+                    results.append(c.flush(addr))
+                elif kind < 96:
+                    results.append(c.flush_all())
+                else:
+                    results.append(c.read(addr))
+            self.assertEqual(results[0], results[1])
+            self.assertEqual(reference.get_cache_dump(), arrays.get_cache_dump())
+        self.assertEqual(vars(reference.stats), vars(arrays.stats))
+
+    def test_policies(self):
+        for policy in ("RR", "LRU", "FIFO", "PLRU", "SRRIP", "BRRIP", "LFU"):
+            with self.subTest(policy=policy):
+                self._compare(policy)
+
+    def test_tag_only(self):
+        memory = PagedMemory(256)
+        memory.write(0, bytes(range(128)))
+        self._compare("LRU", memory)
+
+    def test_residency(self):
+        c = ArrayCache(4, 2, 4)
+        c.write(0, 1)
+        c.write(0x24, 2)
+        self.assertEqual(c.residency(), bytes([1, 0, 1, 0, 0, 0, 0, 0]))
+        self.assertEqual(c.occupied_sets(), [0, 1])
+
+        c.flush(0)
+        self.assertEqual(c.occupied_sets(), [1])
+
+    def test_copy(self):
+        c = ArrayCache(4, 2, 4, "FIFO", decode_table=True)
+        c.write(0, 1)
+        for clone in (copy.deepcopy(c), pickle.loads(pickle.dumps(c))):
+            clone.write(0x40, 2)
+            clone.write(0x80, 3)
+            self.assertEqual(clone.read(0), None)
+            self.assertEqual(c.read(0), 1)
+            self.assertEqual(c.read(0x40), None)
+
+        with self.assertRaises(Exception):
+            ArrayCache(4, 2, 4, "MRU")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -7,17 +7,19 @@ from src.cpu import CPU
 class AttacksTest(TestCase):
     """Test Meltdown and Spectre demo attacks."""
 
+    def setUp(self):
+        # The attacks are only executed to the end, so don't keep any history
+        self.config = bd.from_yaml("config.yml")
+        self.config["History"]["store"] = "none"
+
     def test_meltdown(self):
         """Test a simple Meltdown attack."""
         # Create CPU and load program
-        cpu = CPU(bd.from_yaml("config.yml"))
+        cpu = CPU(self.config)
         cpu.load_program_from_file("demo/meltdown.tea")
 
         # Execute program to the end
-        while True:
-            info = cpu.tick()
-            if not info.executing_program:
-                break
+        cpu.run()
 
         # Check that the secret value was leaked successfully
         secret = 0x42
@@ -27,14 +29,11 @@ class AttacksTest(TestCase):
     def test_spectre(self):
         """Test a simple Spectre attack."""
         # Create CPU and load program
-        cpu = CPU(bd.from_yaml("config.yml"))
+        cpu = CPU(self.config)
         cpu.load_program_from_file("demo/spectre.tea")
 
         # Execute program to the end
-        while True:
-            info = cpu.tick()
-            if not info.executing_program:
-                break
+        cpu.run()
 
         # Check that the secret value was leaked successfully
         secret = 0x41
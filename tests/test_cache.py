@@ -1,5 +1,6 @@
 import unittest
 from src import cache
+from src.mainmemory import PagedMemory
 
 
 class CacheTests(unittest.TestCase):
@@ -70,3 +71,142 @@ class CacheTests(unittest.TestCase):
             cache.CacheRR(0, 10, 10)
             cache.CacheRR(10, 0, 10)
             cache.cacheRR(10, 10, 0)
+
+    def test_parse_addr(self):
+        """Addresses are split into tag, index and offset, with or without a decode table."""
+        for decode_table in (False, True):
+            c = cache.CacheRR(4, 2, 8, decode_table)
+            self.assertEqual(c.parse_addr(0b1011_01_101), (0b1011, 0b01, 0b101))
+            self.assertEqual(c.parse_addr(0xffff), (0xffff >> 5, 3, 7))
+
+            c = cache.CacheRR(1, 2, 1, decode_table)
+            self.assertEqual(c.parse_addr(0x1234), (0x1234, 0, 0))
+
+        # Only powers of two are supported for the number of sets and the line size
+        with self.assertRaises(Exception):
+            cache.CacheRR(3, 2, 4)
+        with self.assertRaises(Exception):
+            cache.CacheRR(4, 2, 6)
+        # At least one bit must be left for the tag
+        with self.assertRaises(Exception):
+            cache.CacheRR(1 << 8, 2, 1 << 8)
+
+    def test_replacement_order(self):
+        """
+        LRU and FIFO replacement only depend on the order of accesses, so
+        evictions are the same no matter how fast the accesses happen.
+        """
+        # 1 set with 4 lines, each address maps to its own line
+        lru = cache.CacheLRU(1, 4, 1)
+        fifo = cache.CacheFIFO(1, 4, 1)
+        for c in (lru, fifo):
+            for addr in range(4):
+                c.write(addr, addr)
+            c.read(0)
+            c.read(1, side_effects=False)
+            c.write(4, 4)
+
+        # LRU evicts 1, as reading it without side effects does not count as a use
+        self.assertIsNone(lru.read(1))
+        self.assertEqual([lru.read(addr) for addr in (0, 2, 3, 4)], [0, 2, 3, 4])
+        # FIFO evicts 0, the line filled first
+        self.assertIsNone(fifo.read(0))
+        self.assertEqual([fifo.read(addr) for addr in (1, 2, 3, 4)], [1, 2, 3, 4])
+
+        # Flushed lines are refilled before anything is evicted
+        lru.flush(3)
+        lru.write(5, 5)
+        self.assertEqual([lru.read(addr) for addr in (0, 2, 4, 5)], [0, 2, 4, 5])
+
+    def test_tag_index(self):
+        """The tag index of each set matches the tags of its lines at all times."""
+        for policy in (cache.CacheRR, cache.CacheLRU, cache.CacheFIFO):
+            c = policy(2, 64, 2)
+            for i in range(1000):
+                addr = (i * 37) % 512
+                if i % 7 == 0:
+                    c.flush(addr)
+                else:
+                    c.write(addr, i % 256)
+                    self.assertEqual(c.read(addr), i % 256)
+
+            for index, lines in enumerate(c.sets):
+                tags = {line.tag: way for way, line in enumerate(lines) if line.is_in_use()}
+                self.assertEqual(c._ways[index], tags)
+
+    def test_fill_line(self):
+        """Whole lines are filled at once, reporting the line they evicted."""
+        c = cache.CacheLRU(2, 2, 4)
+        self.assertIsNone(c.fill_line(0x00, [1, 2, 3, 4]))
+        self.assertIsNone(c.fill_line(0x08, [5, 6, 7, 8]))
+        self.assertEqual([c.read(addr) for addr in range(4)], [1, 2, 3, 4])
+
+        # Set 0 is full, so the least recently used line at 0x08 is evicted
+        evicted = c.fill_line(0x12, [9, 10, 11, 12])
+        self.assertEqual(evicted, cache.EvictedLine(0x08, [5, 6, 7, 8]))
+        self.assertIsNone(c.read(0x08))
+        self.assertEqual(c.read(0x13), 12)
+
+        # Refilling a cached line only replaces its data
+        self.assertIsNone(c.fill_line(0x10, [0, 0, 0, 0]))
+        self.assertEqual(c.read(0x12), 0)
+
+    def test_tag_only(self):
+        """In tag-only mode, lines keep no data and cached data is read from main memory."""
+        memory = PagedMemory(1 << 16)
+        memory.write(0x10, bytes([1, 2, 3, 4]))
+        c = cache.CacheLRU(4, 2, 4, backing=memory)
+        self.assertTrue(c.tag_only)
+
+        c.fill_line(0x10, None)
+        self.assertEqual(c.sets[0][0].data, [])
+        self.assertEqual(c.read(0x12), 3)
+        self.assertIsNone(c.read(0x22))
+
+        # Data is always the current contents of memory
+        memory[0x12] = 0x17
+        self.assertEqual(c.get_cache_dump()["sets"][0][0]["data"], [1, 2, 0x17, 4])
+
+        c.fill_line(0x50, None)
+        evicted = c.fill_line(0x90, None)
+        self.assertEqual(evicted, cache.EvictedLine(0x10, [1, 2, 0x17, 4]))
+
+    def test_flush_all(self):
+        """Flushing the whole cache empties every line and resets the replacement order."""
+        c = cache.CacheLRU(2, 2, 2)
+        for addr in range(8):
+            c.write(addr, addr)
+        c.read(0)
+        c.flush_all()
+
+        dump = c.get_cache_dump()
+        self.assertTrue(all(line["tag"] is None for s in dump["sets"] for line in s))
+        self.assertEqual(c._ways, [{}, {}])
+        self.assertEqual([list(order) for order in c.policy._order], [[0, 1], [0, 1]])
+
+        # The cache behaves like a new one afterwards
+        for addr in (0, 4, 8):
+            c.write(addr, addr)
+        self.assertEqual([c.read(addr) for addr in (0, 4, 8)], [None, 4, 8])
+
+    def test_stats(self):
+        c = cache.CacheLRU(2, 1, 2)
+        self.assertIsNone(c.stats)
+        stats = c.enable_stats()
+
+        c.write(0, 0)
+        c.read(0)
+        c.read(1, side_effects=False)
+        c.fill_line(4, [4, 5])
+        c.read(0)
+        c.fill_line(2, [2, 3])
+        c.flush(2)
+        c.flush_all()
+
+        self.assertEqual(stats.hits, [1, 0])
+        self.assertEqual(stats.misses, [1, 0])
+        self.assertEqual(stats.fills, [2, 1])
+        self.assertEqual(stats.evictions, [1, 0])
+        self.assertEqual(stats.flushes, [1, 1])
+        self.assertEqual(stats.totals()["fills"], 3)
+        self.assertEqual(stats.hit_rate, 0.5)
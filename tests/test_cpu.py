@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import os
+import tempfile
 import unittest
 
 from src.cpu import CPU
@@ -125,6 +127,76 @@ class CPUTests(unittest.TestCase):
 
         self.assertEqual(cpu._exec_engine._registers[: len(target)], [Word(x) for x in target])
 
+    def test_run(self):
+        """Test running a program without history."""
+        config = bd.from_yaml('config.yml')
+        config["History"]["store"] = "none"
+        cpu = CPU(config)
+        cpu.load_program_from_file("demo/spectre.tea")
+
+        # Running no cycles leaves the program loaded
+        self.assertTrue(cpu.run(0).executing_program)
+        self.assertEqual(cpu.get_exec_engine()._cyclecount, 0)
+
+        # Stop after a number of cycles
+        info = cpu.run(20)
+        self.assertTrue(info.executing_program)
+        self.assertEqual(cpu.get_exec_engine()._cyclecount, 20)
+
+        # Continue until the end, which is the same as ticking until the end
+        self.assertFalse(cpu.run(-5).executing_program)
+        reference = CPU(bd.from_yaml('config.yml'))
+        reference.load_program_from_file("demo/spectre.tea")
+        while reference.tick().executing_program:
+            pass
+        self.assertEqual(cpu.get_exec_engine()._registers, reference.get_exec_engine()._registers)
+        self.assertEqual(cpu.get_exec_engine()._cyclecount, reference.get_exec_engine()._cyclecount)
+
+        self.assertFalse(cpu.run(0).executing_program)
+
+        # Nothing can be restored
+        self.assertIsNone(CPU.restore_snapshot(cpu, -1))
+
+    def test_mshrs(self):
+        """Loads that miss different lines overlap up to the number of MSHRs."""
+        program = "\n".join(f"lb r{i + 1}, r0, {addr:#x}" for i, addr in
+                            enumerate([0x100, 0x101, 0x200, 0x300, 0x400]))
+        cycles = []
+        for mshrs in (1, 2):
+            config = bd.from_yaml('config.yml')
+            config["Cache"]["mshrs"] = mshrs
+            cpu = CPU(config)
+            cpu.load_program(program)
+            cpu.run()
+            cycles.append(cpu.get_exec_engine()._cyclecount)
+
+            stats = cpu.get_memory_subsystem().mshr_stats
+            self.assertEqual((stats.primary_misses, stats.merged_misses), (4, 1))
+            self.assertEqual(stats.mlp, mshrs)
+        self.assertLess(cycles[1], cycles[0])
+
+    def test_images(self):
+        """Test loading and dumping memory images."""
+        with tempfile.TemporaryDirectory() as directory:
+            image = os.path.join(directory, "image.bin")
+            with open(image, "wb") as f:
+                f.write(bytes([0x34, 0x12, 0x78, 0x56]))
+
+            cpu = CPU(bd.from_yaml('config.yml'))
+            cpu.load_image_from_file(image, 0x1000)
+            cpu.load_program("lw r1, r0, 0x1000\nlw r2, r0, 0x1002\nsw r2, r0, 0x1000")
+            cpu.run()
+            self.assertEqual(cpu.get_exec_engine()._registers[1:3], [Word(0x1234), Word(0x5678)])
+
+            # Restarting the program keeps the image
+            restarted = CPU.restore_snapshot(cpu, -cpu._snapshot_index + 1)
+            self.assertEqual(restarted.get_memory_subsystem().read_range(0x1000, 2), b"\x34\x12")
+
+            dump = os.path.join(directory, "dump.bin")
+            cpu.dump_image_to_file(dump, 0x1000, 0x1004)
+            with open(dump, "rb") as f:
+                self.assertEqual(f.read(), bytes([0x78, 0x56, 0x78, 0x56]))
+
     def test_immediate_snaprestore(self):
         """Test immediate snapshot/restore."""
         cpu = CPU(bd.from_yaml('config.yml'))
@@ -0,0 +1,64 @@
+import copy
+import unittest
+
+from src.mainmemory import PagedMemory
+
+
+class PagedMemoryTests(unittest.TestCase):
+    def test_read_write(self):
+        memory = PagedMemory(1024)
+        memory.fill(300, 1024, 0x42)
+
+        self.assertEqual(len(memory), 1024)
+        self.assertEqual(memory[299], 0)
+        self.assertEqual(memory[300], 0x42)
+        self.assertEqual(memory[-1], 0x42)
+
+        memory[0x100] = 0x17
+        self.assertEqual(memory[0x100], 0x17)
+        self.assertEqual(memory[0xfe:0x102], bytes([0, 0, 0x17, 0]))
+        self.assertEqual(list(memory)[0x100], 0x17)
+        self.assertEqual(bytes(memory)[0x100], 0x17)
+
+    def test_copy_on_write(self):
+        memory = PagedMemory(1024)
+        memory[0] = 1
+        clone = copy.deepcopy(memory)
+        self.assertEqual(clone, memory)
+
+        # Writes to either memory are not visible in the other one
+        clone[0] = 2
+        memory[0x200] = 3
+        self.assertEqual((memory[0], memory[0x200]), (1, 3))
+        self.assertEqual((clone[0], clone[0x200]), (2, 0))
+
+        # Pages that neither memory wrote to are still shared
+        self.assertIs(memory._pages[1], clone._pages[1])
+        self.assertIsNot(memory._pages[0], clone._pages[0])
+        self.assertEqual(memory.shared_size(clone), 1024 - 2 * PagedMemory.PAGE_SIZE)
+
+    def test_ranges(self):
+        memory = PagedMemory(1024)
+        memory.write(0xf0, bytes(range(0x20)))
+        self.assertEqual(bytes(memory.read(0xf0, 0x20)), bytes(range(0x20)))
+        self.assertEqual(bytes(memory.read(0x100, 4)), bytes(range(0x10, 0x14)))
+        self.assertTrue(memory.read(0, 4).readonly)
+
+        # Writing whole pages does not touch the pages of copies
+        clone = memory.copy()
+        memory.write(0x100, b"\xff" * 256)
+        self.assertEqual(clone[0x100], 0x10)
+        self.assertEqual(memory[0x1ff], 0xff)
+
+        with self.assertRaises(IndexError):
+            memory.read(1000, 100)
+        with self.assertRaises(IndexError):
+            memory.write(-1, b"\x00")
+
+    def test_from_bytes(self):
+        data = bytes(range(256)) * 2
+        memory = PagedMemory.from_bytes(data)
+        self.assertEqual(bytes(memory), data)
+
+        with self.assertRaises(ValueError):
+            PagedMemory(1000)
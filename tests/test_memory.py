@@ -1,45 +1,50 @@
 import unittest
 
 from src.memory import MemorySubsystem
+from src.stackdistance import miss_ratio_curves
 from src.word import Word
 from src.byte import Byte
 
 
+def _config() -> dict:
+    return {
+        "Cache":
+        {
+            "cache_hit_cycles": 2,
+            "cache_miss_cycles": 5,
+            "line_size": 4,
+            "ways": 4,
+            "sets": 4,
+            "replacement_policy": "LRU"
+        },
+        "Memory":
+        {
+            "layout":
+            [
+                {
+                    "access": True,
+                    "end": 32767,
+                    "start": 0
+                },
+                {
+                    "access": True,
+                    "end": 65535,
+                    "start": 32768
+                }
+            ],
+            "num_fault_cycles": 8,
+            "num_write_cycles": 5
+        },
+        "Mitigations":
+        {
+            "illegal_read_return_zero": False
+        }
+    }
+
+
 class MemoryTests(unittest.TestCase):
     def test_memory(self):
-        conf = {
-            "Cache":
-            {
-                "cache_hit_cycles": 2,
-                "cache_miss_cycles": 5,
-                "line_size": 4,
-                "ways": 4,
-                "sets": 4,
-                "replacement_policy": "LRU"
-            },
-            "Memory":
-            {
-                "layout":
-                [
-                    {
-                        "access": True,
-                        "end": 32767,
-                        "start": 0
-                    },
-                    {
-                        "access": True,
-                        "end": 65535,
-                        "start": 32768
-                    }
-                ],
-                "num_fault_cycles": 8,
-                "num_write_cycles": 5
-            },
-            "Mitigations":
-            {
-                "illegal_read_return_zero": False
-            }
-        }
+        conf = _config()
         memory = MemorySubsystem(conf)
         import random
 
@@ -95,3 +100,189 @@ class MemoryTests(unittest.TestCase):
         memory = MemorySubsystem(conf)
         mem_result = memory.read_byte(Word(2 ** (Word.WIDTH - 1)))
         self.assertIs(mem_result.value.value, 0)
+
+    def test_ranges(self):
+        memory = MemorySubsystem(_config())
+        memory.start_journal()
+
+        # Ranges are read and written around the cache, but cached lines stay up to date
+        memory.read_byte(Word(0x1002))
+        memory.write_range(0x0ffe, b"\x01\x02\x03\x04\x05\x06")
+        self.assertEqual(bytes(memory.read_range(0x0ffe, 6)), b"\x01\x02\x03\x04\x05\x06")
+        self.assertEqual(memory.read_byte(Word(0x1002)).value.value, 5)
+        self.assertIs(memory.is_addr_cached(Word(0x0ffe)), False)
+        self.assertEqual(len(memory.take_journal()), 6)
+
+        # Images can be loaded anywhere, including the inaccessible upper half
+        image = bytes(range(256)) * 4
+        memory.load_image(image, 0xf000)
+        self.assertEqual(memory.dump_image(0xf000, 0xf400), image)
+        self.assertEqual(memory.dump_image()[0xf000:0xf400], image)
+        with self.assertRaises(ValueError):
+            memory.load_image(image, 0xff00)
+
+    def test_levels(self):
+        def hierarchy(inclusion: str, ways: int = 1) -> MemorySubsystem:
+            conf = _config()
+            conf["Cache"].update(sets=4, ways=ways)
+            conf["Cache"]["levels"] = [
+                {"sets": 4, "ways": 1, "replacement_policy": "LRU", "hit_cycles": 3,
+                 "inclusion": inclusion},
+            ]
+            return MemorySubsystem(conf)
+
+        def l2_cached(memory: MemorySubsystem, address: int) -> bool:
+            return memory.levels[1].cache.read(address, side_effects=False) is not None
+
+        # The latency depends on the level that holds the data
+        memory = hierarchy("nine")
+        self.assertEqual(memory.read_byte(Word(0x00)).cycles_value, 5)
+        self.assertEqual(memory.read_byte(Word(0x00)).cycles_value, 2)
+        memory.levels[0].cache.flush(0x00)
+        self.assertEqual(memory.read_byte(Word(0x00)).cycles_value, 3)
+        self.assertIs(memory.levels[0].cache, memory.cache)
+
+        # An inclusive level invalidates the lines it evicts in the levels above
+        memory = hierarchy("inclusive", ways=2)
+        memory.read_byte(Word(0x00))
+        memory.read_byte(Word(0x10))
+        self.assertFalse(memory.is_addr_cached(Word(0x00)))
+        self.assertTrue(memory.is_addr_cached(Word(0x10)))
+
+        memory = hierarchy("nine", ways=2)
+        memory.read_byte(Word(0x00))
+        memory.read_byte(Word(0x10))
+        self.assertTrue(memory.is_addr_cached(Word(0x00)))
+
+        # An exclusive level only holds the lines evicted from the levels above
+        memory = hierarchy("exclusive")
+        memory.read_byte(Word(0x00))
+        self.assertFalse(l2_cached(memory, 0x00))
+        memory.read_byte(Word(0x10))
+        self.assertTrue(l2_cached(memory, 0x00))
+        self.assertEqual(memory.read_byte(Word(0x00)).cycles_value, 3)
+        self.assertTrue(l2_cached(memory, 0x10))
+        self.assertFalse(l2_cached(memory, 0x00))
+
+        # Flushing removes the line from all levels
+        memory.flush_line(Word(0x10))
+        self.assertFalse(l2_cached(memory, 0x10))
+
+        with self.assertRaises(Exception):
+            conf = _config()
+            conf["Cache"]["levels"] = [
+                {"sets": 4, "ways": 1, "line_size": 8, "replacement_policy": "LRU",
+                 "hit_cycles": 3},
+            ]
+            MemorySubsystem(conf)
+
+    def test_mshrs(self):
+        conf = _config()
+        conf["Cache"]["mshrs"] = 1
+        memory = MemorySubsystem(conf)
+
+        # A load that misses a line which is still being filled waits for that fill
+        self.assertTrue(memory.request_mshrs(Word(0x100), 1))
+        self.assertEqual(memory.read_byte(Word(0x100)).cycles_value, 5)
+        memory.tick()
+        self.assertEqual(memory.read_byte(Word(0x101)).cycles_value, 4)
+
+        # Other lines have to wait for a free MSHR, but hits do not
+        self.assertFalse(memory.request_mshrs(Word(0x1fe), 2))
+        self.assertTrue(memory.request_mshrs(Word(0x102), 2))
+        for _ in range(4):
+            memory.tick()
+        self.assertTrue(memory.request_mshrs(Word(0x1ff), 2))
+        self.assertEqual(memory.read_byte(Word(0x101)).cycles_value, 2)
+
+        stats = memory.mshr_stats
+        self.assertEqual((stats.primary_misses, stats.merged_misses, stats.stalls), (1, 1, 1))
+        self.assertEqual((stats.busy_cycles, stats.mlp), (5, 1.0))
+
+        # The bytes of a word in one line are a single miss
+        memory = MemorySubsystem(conf)
+        self.assertEqual(memory.read_word(Word(0x200)).cycles_value, 5)
+        stats = memory.mshr_stats
+        self.assertEqual((stats.primary_misses, stats.merged_misses), (1, 0))
+
+        # Flushing a line drops its fill, so the next load misses and caches it again
+        memory.flush_line(Word(0x200))
+        self.assertEqual(memory.read_byte(Word(0x200)).cycles_value, 5)
+        self.assertTrue(memory.is_addr_cached(Word(0x200)))
+        memory.flush_all()
+        self.assertEqual(memory.read_byte(Word(0x200)).cycles_value, 5)
+        self.assertTrue(memory.is_addr_cached(Word(0x200)))
+        self.assertEqual((stats.primary_misses, stats.merged_misses), (3, 0))
+
+    def test_prefetchers(self):
+        conf = _config()
+        conf["Cache"]["prefetchers"] = [{"type": "next_line"}]
+        memory = MemorySubsystem(conf)
+        prefetcher = memory.prefetchers[0]
+
+        # Accesses of instructions prefetch the next line
+        self.assertEqual(memory.read_byte(Word(0x100), pc=0).cycles_value, 5)
+        self.assertTrue(memory.is_addr_cached(Word(0x104)))
+        self.assertEqual(memory.read_word(Word(0x104), pc=0).cycles_value, 2)
+        memory.write_byte(Word(0x108), Byte(1), pc=0)
+        self.assertEqual((prefetcher.issued, prefetcher.useful, prefetcher.misses), (3, 2, 1))
+        self.assertAlmostEqual(prefetcher.accuracy, 2 / 3)
+        self.assertAlmostEqual(prefetcher.coverage, 2 / 3)
+
+        # Other accesses, and lines that are not accessible, are never prefetched
+        memory.read_byte(Word(0x200))
+        self.assertFalse(memory.is_addr_cached(Word(0x204)))
+        memory.read_byte(Word(0x7ffc), pc=0)
+        self.assertFalse(memory.is_addr_cached(Word(0x8000)))
+
+    def test_stats(self):
+        memory = MemorySubsystem(_config())
+        self.assertEqual(memory.get_stats().levels, [None])
+
+        conf = _config()
+        conf["Cache"]["stats"] = True
+        conf["Cache"]["levels"] = [{"sets": 8, "ways": 1, "replacement_policy": "LRU", "hit_cycles": 3}]
+        memory = MemorySubsystem(conf)
+        memory.read_byte(Word(0x00))
+        memory.read_byte(Word(0x01))
+        memory.read_byte(Word(0x01), cache_side_effects=False)
+        memory.flush_line(Word(0x00))
+
+        l1, l2 = memory.get_stats().levels
+        self.assertEqual((l1.totals()["hits"], l1.totals()["misses"]), (1, 1))
+        # Only misses of the first level access the second one
+        self.assertEqual((l2.totals()["hits"], l2.totals()["misses"]), (0, 1))
+        self.assertEqual((l1.flushes[0], l2.flushes[0]), (1, 1))
+        self.assertIsNone(memory.get_stats().mshrs)
+
+    def test_record_accesses(self):
+        self.assertIsNone(MemorySubsystem(_config()).access_stream)
+
+        conf = _config()
+        conf["Cache"]["record_accesses"] = True
+        memory = MemorySubsystem(conf)
+        memory.read_byte(Word(0x00))
+        memory.write_byte(Word(0x11), Byte(1))
+        memory.read_byte(Word(0x20), cache_side_effects=False)
+        memory.flush_line(Word(0x00))
+        memory.read_word(Word(0x00))
+        self.assertEqual(len(memory.access_stream), 3 + Word.WIDTH_BYTES)
+
+        curves = miss_ratio_curves(memory.access_stream, 4, 4)
+        # The flushed line misses again, and the rest of the word hits
+        self.assertEqual(curves.misses(4, 4), 3)
+
+    def test_profile(self):
+        self.assertIsNone(MemorySubsystem(_config()).profiler)
+
+        conf = _config()
+        conf["Cache"]["profile"] = True
+        memory = MemorySubsystem(conf)
+        memory.write_byte(Word(0x10), Byte(1))
+        memory.read_byte(Word(0x11))
+        memory.read_byte(Word(0x20), cache_side_effects=False)
+
+        profiler = memory.profiler
+        self.assertEqual((profiler.line_accesses[4], profiler.line_misses[4]), (2, 1))
+        self.assertEqual(profiler.set_accesses, [2, 0, 0, 0])
+        self.assertEqual(profiler.reuse[0], 1)
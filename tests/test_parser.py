@@ -48,3 +48,47 @@ class ParserTest(TestCase):
             str(exc.exception),
             "Wrong number of operands for 'addi' instruction: 3 expected, 2 given",
         )
+
+    def test_directives(self):
+        """Test that data directives produce the initial memory contents."""
+        addi = all_instructions["addi"]
+
+        p = Parser.from_default()
+        program = p.parse_program(
+            """
+            .org 0x1000
+            .fill 3
+            .byte 0x41, -1
+            a: addi r1, r0, 1
+            .word 0x1234
+            .org 0x2000
+            .fill 2, 0x17
+            beq r0, r0, a
+            """
+        )
+
+        self.assertEqual(program.instructions[0], Instruction(addi, [1, 0, 1]))
+        self.assertEqual(program.instructions[1].ops, [0, 0, 0])
+        self.assertEqual(
+            program.data,
+            [
+                (0x1000, bytes([0, 0, 0, 0x41, 0xff, 0x34, 0x12])),
+                (0x2000, bytes([0x17, 0x17])),
+            ],
+        )
+        # parse() only returns the instructions
+        self.assertEqual(p.parse(".byte 1\naddi r1, r0, 1"), [Instruction(addi, [1, 0, 1])])
+
+        with self.assertRaises(ValueError) as exc:
+            p.parse(".space 4")
+        self.assertEqual(str(exc.exception), "Unknown directive '.space'")
+
+        with self.assertRaises(ValueError):
+            p.parse(".org 0xffff\n.word 0")
+
+        with self.assertRaises(ValueError) as exc:
+            p.parse(".fill -1, 2")
+        self.assertEqual(str(exc.exception), "Negative count -1 for '.fill' directive")
+        for directive in (".byte 1, 256", ".byte -129", ".fill 2, 0x100", ".word 0x10000", ".word -32769"):
+            with self.assertRaises(ValueError):
+                p.parse(directive)
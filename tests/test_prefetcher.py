@@ -0,0 +1,54 @@
+import unittest
+
+from src.prefetcher import (
+    NextLinePrefetcher,
+    StreamPrefetcher,
+    StridePrefetcher,
+    create_prefetcher,
+)
+
+
+class PrefetcherTests(unittest.TestCase):
+    def test_next_line(self):
+        prefetcher = NextLinePrefetcher(4, degree=2)
+        self.assertEqual(prefetcher.observe(0x100, 0, True), [0x104, 0x108])
+        self.assertEqual(prefetcher.observe(0x100, 0, False), [])
+
+    def test_stride(self):
+        prefetcher = StridePrefetcher(4, table_size=2)
+        # The stride of an instruction has to repeat twice before it is prefetched
+        self.assertEqual(prefetcher.observe(0x100, 1, True), [])
+        self.assertEqual(prefetcher.observe(0x140, 1, True), [])
+        self.assertEqual(prefetcher.observe(0x180, 1, True), [])
+        self.assertEqual(prefetcher.observe(0x1c0, 1, False), [0x200])
+
+        # Other instructions are tracked separately
+        self.assertEqual(prefetcher.observe(0x1000, 2, True), [])
+        self.assertEqual(prefetcher.observe(0x200, 1, True), [0x240])
+
+        # Only the most recent instructions are remembered
+        prefetcher.observe(0x1000, 3, True)
+        self.assertEqual(prefetcher.observe(0x240, 1, True), [0x280])
+        self.assertNotIn(2, prefetcher._table)
+
+    def test_stream(self):
+        prefetcher = StreamPrefetcher(4, degree=2)
+        self.assertEqual(prefetcher.observe(0x110, None, True), [])
+        self.assertEqual(prefetcher.observe(0x100, None, False), [])
+        self.assertEqual(prefetcher.observe(0x10c, None, True), [0x108, 0x104])
+        self.assertEqual(prefetcher.observe(0x108, None, True), [0x104, 0x100])
+
+        # A miss in the other direction starts a new stream
+        self.assertEqual(prefetcher.observe(0x10c, None, True), [])
+
+    def test_config(self):
+        prefetcher = create_prefetcher({"type": "stride", "degree": 2, "threshold": 1}, 4)
+        self.assertIsInstance(prefetcher, StridePrefetcher)
+        self.assertEqual((prefetcher.degree, prefetcher.threshold), (2, 1))
+
+        with self.assertRaises(Exception):
+            create_prefetcher({"type": "markov"}, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
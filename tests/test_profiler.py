@@ -0,0 +1,49 @@
+import json
+import os
+import tempfile
+import unittest
+
+from src.profiler import AccessProfiler
+
+
+class ProfilerTests(unittest.TestCase):
+    def test_counts(self):
+        profiler = AccessProfiler(256, 4, 4)
+        profiler.access(0x00, False)
+        profiler.access(0x01, True)
+        profiler.access(0x10, False)
+        profiler.access(0x24, True)
+
+        self.assertEqual((profiler.line_accesses[0], profiler.line_misses[0]), (2, 1))
+        self.assertEqual(profiler.set_accesses, [3, 1, 0, 0])
+        self.assertEqual(profiler.set_misses, [2, 0, 0, 0])
+        self.assertEqual(profiler.hot_lines(2), [(0x00, 2, 1), (0x10, 1, 1)])
+
+    def test_reuse(self):
+        profiler = AccessProfiler(256, 4, 4, max_distance=4)
+        for address in (0x00, 0x04, 0x08, 0x00, 0x00, 0x10, 0x14, 0x04):
+            profiler.access(address, True)
+        self.assertEqual(profiler.reuse_buckets(), [(0, 0), (1, 1), (2, 3), (4, None)])
+        # 0x00 is reused after 2 lines and right away; 0x04 was forgotten after 4 other lines
+        self.assertEqual(profiler.reuse, [1, 0, 1, 6])
+        self.assertEqual(len(profiler._recent), 4)
+
+        with self.assertRaises(ValueError):
+            AccessProfiler(256, 4, 4, max_distance=3)
+
+    def test_export(self):
+        profiler = AccessProfiler(256, 4, 2, max_distance=2)
+        profiler.access(0x0c, False)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "profile.json")
+            profiler.export_json(path)
+            with open(path) as f:
+                profile = json.load(f)
+
+        self.assertEqual(profile["lines"], [{"address": 0x0c, "set": 1, "accesses": 1, "misses": 1}])
+        self.assertEqual(profile["sets"][1], {"index": 1, "accesses": 1, "misses": 1})
+        self.assertEqual(profile["reuse_distances"][-1], {"min": 2, "max": None, "accesses": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
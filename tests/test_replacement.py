@@ -0,0 +1,96 @@
+import unittest
+
+from src import cache
+from src.replacement import (
+    BRRIPPolicy,
+    LFUPolicy,
+    ReplacementPolicy,
+    SRRIPPolicy,
+    TreePLRUPolicy,
+    create_policy,
+    policies,
+    register_policy,
+)
+
+
+class ReplacementTests(unittest.TestCase):
+    def test_random_seed(self):
+        first = create_policy("RR", 1, 8, seed=3)
+        second = create_policy("RR", 1, 8, seed=3)
+        victims = [first.victim(0) for _ in range(32)]
+        self.assertEqual([second.victim(0) for _ in range(32)], victims)
+
+        other = create_policy("RR", 1, 8, seed=4)
+        self.assertNotEqual([other.victim(0) for _ in range(32)], victims)
+
+    def test_plru(self):
+        policy = TreePLRUPolicy(1, 4)
+        for way in range(4):
+            policy.touch(0, way, True)
+        self.assertEqual(policy.victim(0), 0)
+
+        # Unlike LRU, which would evict way 1, the tree only remembers that
+        # the right half was accessed less recently than way 0
+        policy.touch(0, 0, False)
+        self.assertEqual(policy.victim(0), 2)
+
+        with self.assertRaises(Exception):
+            TreePLRUPolicy(1, 3)
+
+    def test_srrip(self):
+        policy = SRRIPPolicy(2, 2)
+        policy.touch(1, 0, True)
+        policy.touch(1, 1, True)
+        policy.touch(1, 0, False)
+        # Both lines age until the one that was not hit is predicted distant
+        self.assertEqual(policy.victim(1), 1)
+        self.assertEqual(list(policy._rrpv), [3, 3, 1, 3])
+
+        # Most lines filled by BRRIP are predicted distant right away
+        policy = BRRIPPolicy(1, 2)
+        policy.touch(0, 0, True)
+        policy.touch(0, 1, True)
+        self.assertEqual(list(policy._rrpv), [3, 3])
+        self.assertEqual(policy.victim(0), 0)
+
+    def test_lfu(self):
+        policy = LFUPolicy(1, 3)
+        for way, hits in enumerate([2, 0, 1]):
+            policy.touch(0, way, True)
+            for _ in range(hits):
+                policy.touch(0, way, False)
+        self.assertEqual(policy.victim(0), 1)
+
+        # Filling a line resets its count
+        policy.touch(0, 0, True)
+        self.assertEqual(policy.victim(0), 0)
+
+    def test_registry(self):
+        @register_policy
+        class MRUPolicy(ReplacementPolicy):
+            name = "MRU"
+
+            def reset(self):
+                self._last = [0] * self.num_sets
+
+            def touch(self, index, way, filled):
+                self._last[index] = way
+
+            def victim(self, index):
+                return self._last[index]
+
+        try:
+            c = cache.PolicyCache(1, 2, 1, "MRU")
+            for addr in (0, 1, 0, 2):
+                c.write(addr, addr)
+            self.assertEqual([c.read(addr) for addr in (0, 1, 2)], [None, 1, 2])
+        finally:
+            del policies["MRU"]
+
+        self.assertIsInstance(create_policy("PLRU", 4, 2), TreePLRUPolicy)
+        with self.assertRaises(Exception):
+            create_policy("MRU", 4, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
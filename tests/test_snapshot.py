@@ -0,0 +1,229 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from benedict import benedict as bd
+from src.byte import Byte
+from src.cpu import CPU
+from src.snapshot import FileSnapshotStore, MemorySnapshotStore, NullSnapshotStore
+from src.word import Word
+
+
+def _state(cpu: CPU) -> tuple:
+    """Collect the parts of the CPU state that a program changes."""
+    mem = cpu.get_memory_subsystem()
+    cache = mem.cache.get_cache_dump()
+    return (
+        list(cpu.get_exec_engine()._registers),
+        list(mem.memory[0x1000:0x1010]),
+        [[(line["tag"], list(line["data"])) for line in s] for s in cache["sets"]],
+        cpu.get_frontend().pc,
+        [info.instr_index for info in cpu.get_frontend().instr_queue],
+        [slot.pc if slot is not None else None for slot in cpu.get_exec_engine()._slots],
+    )
+
+
+def _config(**history) -> bd:
+    config = bd.from_yaml("config.yml")
+    config["History"].update(history)
+    return config
+
+
+class SnapshotTest(TestCase):
+    """Test the snapshot stores."""
+
+    def check_restore_every_cycle(self, config: bd) -> CPU:
+        """Restoring any cycle yields the state the CPU had in that cycle."""
+        cpu = CPU(config)
+        cpu.load_program_from_file("demo/spectre.tea")
+
+        states = [None, _state(cpu)]
+        while cpu.tick().executing_program:
+            states.append(_state(cpu))
+        states.append(_state(cpu))
+
+        store = cpu.get_snapshots()
+        self.assertEqual(len(store), len(states))
+        for index in range(1, len(store)):
+            self.assertEqual(_state(store[index]), states[index], f"snapshot {index}")
+        return cpu
+
+    def test_memory(self):
+        self.check_restore_every_cycle(_config(store="memory"))
+
+    def test_journal(self):
+        self.check_restore_every_cycle(_config(store="journal"))
+
+    def test_none(self):
+        cpu = CPU(_config(store="none"))
+        cpu.load_program_from_file("demo/spectre.tea")
+        for _ in range(10):
+            cpu.tick()
+        self.assertIsInstance(cpu.get_snapshots(), NullSnapshotStore)
+        self.assertIsNone(CPU.restore_snapshot(cpu, -1))
+
+    def test_independent_cpus(self):
+        """CPUs in the same process keep their own history."""
+        first = CPU(bd.from_yaml("config.yml"))
+        first.load_program("addi r1, r0, 1\naddi r1, r1, 1\naddi r1, r1, 1")
+        second = CPU(bd.from_yaml("config.yml"), MemorySnapshotStore())
+        second.load_program("addi r2, r0, 5\naddi r2, r2, 5")
+
+        for _ in range(6):
+            first.tick()
+            second.tick()
+
+        first = CPU.restore_snapshot(first, -6)
+        second = CPU.restore_snapshot(second, -2)
+        self.assertEqual(first.get_exec_engine()._registers[1], Word(0))
+        self.assertEqual(second.get_exec_engine()._registers[2], Word(10))
+        self.assertIsNot(first.get_snapshots(), second.get_snapshots())
+
+    def test_tag_only_cache(self):
+        config = _config(store="journal")
+        config["Cache"]["tag_only"] = True
+        self.check_restore_every_cycle(config)
+
+    def test_array_cache(self):
+        config = _config(store="keyframe", keyframe_interval=16)
+        config["Cache"]["layout"] = "arrays"
+        self.check_restore_every_cycle(config)
+
+    def test_random_replacement(self):
+        """Replaying from a keyframe picks the same random victims."""
+        config = _config(store="keyframe", keyframe_interval=16)
+        config["Cache"]["replacement_policy"] = "RR"
+        self.check_restore_every_cycle(config)
+
+    def test_record_accesses(self):
+        """Recorded accesses are not rolled back, nor recorded again when replaying."""
+        config = _config(store="keyframe", keyframe_interval=16)
+        config["Cache"]["record_accesses"] = True
+        config["Cache"]["profile"] = True
+        cpu = self.check_restore_every_cycle(config)
+        stream = cpu.get_memory_subsystem().access_stream
+        profiler = cpu.get_memory_subsystem().profiler
+        length = len(stream)
+        accesses = sum(profiler.set_accesses)
+        self.assertGreater(length, 0)
+
+        restored = CPU.restore_snapshot(cpu, -5)
+        self.assertIs(restored.get_memory_subsystem().access_stream, stream)
+        self.assertIs(restored.get_memory_subsystem().profiler, profiler)
+        self.assertEqual(len(stream), length)
+        self.assertEqual(sum(profiler.set_accesses), accesses)
+
+    def test_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "history.bin")
+            cpu = self.check_restore_every_cycle(_config(store="file", file=path))
+            cpu.get_snapshots().close()
+
+    def test_file_resume(self):
+        """A history file can be reopened and continued in a new session."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "history.bin")
+            cpu = CPU(_config(store="file", file=path))
+            cpu.load_program_from_file("demo/spectre.tea")
+            for _ in range(50):
+                cpu.tick()
+            expected = _state(cpu)
+            earlier = _state(CPU.restore_snapshot(cpu, -20))
+            length = len(cpu.get_snapshots())
+            cpu.get_snapshots().close()
+
+            store = FileSnapshotStore.open(path)
+            cpu = store.resume(CPU(_config(), NullSnapshotStore()))
+            self.assertEqual(len(store), length)
+            self.assertEqual(_state(cpu), expected)
+            self.assertEqual(_state(CPU.restore_snapshot(cpu, -20)), earlier)
+
+            # Continuing appends to the reopened history
+            for _ in range(5):
+                cpu.tick()
+            self.assertEqual(len(store), length + 5)
+            store.close()
+
+    def test_file_resume_empty(self):
+        """Histories without snapshots cannot be resumed."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "history.bin")
+            FileSnapshotStore(path).close()
+            store = FileSnapshotStore.open(path)
+            with self.assertRaises(ValueError):
+                store.resume(CPU(_config(), NullSnapshotStore()))
+            store.close()
+
+            for name in ("history.bin", "history.bin.idx"):
+                open(os.path.join(directory, name), "wb").close()
+            with self.assertRaises(ValueError):
+                FileSnapshotStore.open(path)
+
+    def test_keyframe(self):
+        cpu = self.check_restore_every_cycle(_config(store="keyframe", keyframe_interval=16))
+        store = cpu.get_snapshots()
+        # Only the initial state, the loaded program and every 16th cycle are kept
+        self.assertEqual(len(store._keyframes), 2 + (len(store) - 1) // 16)
+
+    def test_keyframe_budget(self):
+        """Keyframes are thinned out to stay within the budget."""
+        config = _config(store="keyframe", keyframe_interval=1)
+        store = self.check_restore_every_cycle(config).get_snapshots()
+        # The pages of memory that the keyframes share are only counted once
+        keyframes = list(store._keyframes.values())
+        components = sum(len(data) for keyframe in keyframes for data in keyframe.components)
+        self.assertLess(store._size - components, 2 * len(keyframes[0].memory))
+
+        config["History"]["keyframe_budget_mib"] = 0.25
+        budget_store = self.check_restore_every_cycle(config).get_snapshots()
+
+        self.assertLessEqual(budget_store._size, 1 << 18)
+        self.assertGreater(budget_store.interval, 1)
+        self.assertLess(len(budget_store._keyframes), len(store._keyframes))
+
+    def test_keyframe_edit(self):
+        """Edits between cycles are kept when replaying."""
+        cpu = CPU(_config(store="keyframe", keyframe_interval=100))
+        cpu.load_program("lb r1, r0, 0x100\nlb r2, r0, 0x100")
+        cpu.tick()
+        cpu.get_memory_subsystem().write_byte(Word(0x100), Byte(0x17))
+        cpu.notify_edit()
+        while cpu.tick().executing_program:
+            pass
+
+        cpu = CPU.restore_snapshot(cpu, 0)
+        self.assertEqual(cpu.get_exec_engine()._registers[2], Word(0x17))
+
+    def test_branch_off(self):
+        """Taking a snapshot after restoring discards the newer snapshots and their writes."""
+        cpu = CPU(bd.from_yaml("config.yml"))
+        cpu.load_program_from_file("demo/spectre.tea")
+        for _ in range(30):
+            cpu.tick()
+        original = _state(cpu)
+
+        cpu = CPU.restore_snapshot(cpu, -25)
+        cpu.get_memory_subsystem().write_byte(Word(0x3000), Byte(0x17))
+        cpu._take_snapshot()
+        self.assertEqual(len(cpu.get_snapshots()), 8)
+
+        # Going back undoes the write, and executing again gives the same result as before
+        cpu = CPU.restore_snapshot(cpu, -1)
+        self.assertEqual(cpu.get_memory_subsystem().memory[0x3000], 0)
+        for _ in range(25):
+            cpu.tick()
+        self.assertEqual(_state(cpu), original)
+
+    def test_unchanged_components_are_shared(self):
+        """Components that did not change are not stored again."""
+        cpu = CPU(bd.from_yaml("config.yml"))
+        cpu.load_program("addi r1, r0, 1\naddi r2, r0, 2\naddi r3, r0, 3")
+        for _ in range(3):
+            cpu.tick()
+
+        entries = cpu.get_snapshots()._entries
+        # There are no memory accesses or branches, so the memory subsystem and BPU never change
+        for i in range(2, len(entries)):
+            self.assertIs(entries[i].components[0], entries[1].components[0])
+            self.assertIs(entries[i].components[1], entries[1].components[1])
+            self.assertEqual(entries[i].memory_writes, [])
@@ -0,0 +1,63 @@
+import copy
+import random
+import unittest
+
+from src import cache
+from src.stackdistance import AccessStream, miss_ratio_curves
+
+
+class StackDistanceTests(unittest.TestCase):
+    def test_matches_lru_caches(self):
+        """The curves give the misses that LRU caches of each geometry have."""
+        ops = random.Random(1)
+        events = []
+        for _ in range(3000):
+            kind = ops.randrange(100)
+            events.append(("flush_all" if kind == 0 else "flush" if kind < 5 else "access",
+                           ops.randrange(256)))
+
+        stream = AccessStream(4)
+        for kind, addr in events:
+            if kind == "access":
+                stream.access(addr)
+            else:
+                stream.flush(addr if kind == "flush" else None)
+        curves = miss_ratio_curves(stream, 16, 6)
+        self.assertEqual(curves.set_counts, [1, 2, 4, 8, 16])
+        self.assertEqual(curves.accesses, sum(kind == "access" for kind, _ in events))
+
+        for sets in curves.set_counts:
+            for ways in range(1, 7):
+                c = cache.CacheLRU(sets, ways, 4)
+                misses = 0
+                for kind, addr in events:
+                    if kind == "flush_all":
+                        c.flush_all()
+                    elif kind == "flush":
+                        c.flush(addr)
+                    elif c.read(addr) is None:
+                        misses += 1
+                        c.fill_line(addr & ~3, [0] * 4)
+                self.assertEqual(curves.misses(sets, ways), misses, f"{sets} sets, {ways} ways")
+
+    def test_curve(self):
+        stream = AccessStream(4)
+        for _ in range(2):
+            for addr in (0x00, 0x10, 0x20):
+                stream.access(addr)
+        curves = miss_ratio_curves(stream, 1, 3)
+        # The second round only hits once the three lines fit
+        self.assertEqual(curves.curve(1), [1.0, 1.0, 0.5])
+
+        with self.assertRaises(ValueError):
+            curves.miss_ratio(2, 1)
+        with self.assertRaises(ValueError):
+            miss_ratio_curves(stream, 3, 1)
+
+    def test_shared_by_copies(self):
+        stream = AccessStream(4)
+        self.assertIs(copy.deepcopy(stream), stream)
+
+
+if __name__ == "__main__":
+    unittest.main()
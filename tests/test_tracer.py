@@ -0,0 +1,117 @@
+import os
+import tempfile
+import unittest
+
+from benedict import benedict as bd
+from src.cpu import CPU
+from src.tracer import MemoryTracer, TraceReader
+
+
+class TracerTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "trace.bin")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_outcomes(self):
+        tracer = MemoryTracer(self.path)
+        tracer.cycle = 3
+        first = tracer.record(MemoryTracer.READ, 1, 0x100, 2, False, False)
+        second = tracer.record(MemoryTracer.WRITE, 2, 0x8000, 1, True, True)
+        tracer.retire(second)
+        # The first record holds back the second one
+        self.assertEqual(tracer.written, 0)
+        tracer.retire(first)
+        self.assertEqual(tracer.written, 2)
+
+        faulting = tracer.record(MemoryTracer.READ, 3, 0x8000, 1, False, True)
+        tracer.record(MemoryTracer.READ, 4, 0x104, 1, False, False)
+        tracer.fault(faulting)
+        tracer.squash()
+        tracer.record(MemoryTracer.FLUSH, 5, 0x100, 1, True, False)
+        tracer.close()
+
+        reader = TraceReader(self.path)
+        self.assertEqual(len(reader), 5)
+        self.assertEqual(
+            (reader[0].cycle, reader[0].pc, reader[0].address, reader[0].width, reader[0].kind),
+            (3, 1, 0x100, 2, MemoryTracer.READ),
+        )
+        self.assertEqual((reader[1].hit, reader[1].fault), (True, True))
+        self.assertEqual(
+            [record.outcome for record in reader],
+            [MemoryTracer.RETIRED, MemoryTracer.RETIRED, MemoryTracer.FAULT, MemoryTracer.TRANSIENT,
+             MemoryTracer.UNKNOWN],
+        )
+        self.assertEqual(reader[-1].kind, MemoryTracer.FLUSH)
+        reader.close()
+
+    def test_bounded(self):
+        """Records that are never resolved do not pile up."""
+        tracer = MemoryTracer(self.path)
+        tracer.BUFFER_SIZE = 100
+        for pc in range(tracer.MAX_PENDING + 10):
+            tracer.record(MemoryTracer.READ, pc, 0, 1, False, False)
+        self.assertEqual(tracer.written, 10)
+        self.assertLess(len(tracer._buffer), 100)
+        tracer.close()
+
+        reader = TraceReader(self.path)
+        self.assertEqual(len(reader), tracer.MAX_PENDING + 10)
+        self.assertEqual({record.outcome for record in reader}, {MemoryTracer.UNKNOWN})
+        reader.close()
+
+    def test_program(self):
+        config = bd.from_yaml("config.yml")
+        config["Memory"]["trace"] = self.path
+        config["History"]["store"] = "keyframe"
+        cpu = CPU(config)
+        cpu.load_program_from_file("demo/meltdown.tea")
+        while cpu.tick().executing_program:
+            pass
+        # Replaying cycles from a keyframe does not trace them again
+        CPU.restore_snapshot(cpu, -5)
+        tracer = cpu.get_memory_subsystem().tracer
+        written = tracer.written
+        tracer.close()
+
+        reader = TraceReader(self.path)
+        records = list(reader)
+        self.assertEqual(len(records), written)
+        self.assertEqual([record.cycle for record in records], sorted(record.cycle for record in records))
+        # The faulting load is attempted architecturally, the accesses depending on it are transient
+        outcomes = {record.outcome for record in records}
+        self.assertTrue({MemoryTracer.FAULT, MemoryTracer.TRANSIENT, MemoryTracer.RETIRED} <= outcomes)
+        self.assertTrue(all(record.fault for record in records if record.outcome == MemoryTracer.FAULT))
+        reader.close()
+
+    def test_restore(self):
+        """Going back in history does not leave the accesses in flight pending."""
+        config = bd.from_yaml("config.yml")
+        config["Memory"]["trace"] = self.path
+        cpu = CPU(config)
+        cpu.load_program_from_file("demo/meltdown.tea")
+        tracer = cpu.get_memory_subsystem().tracer
+        while not tracer._pending:
+            cpu.tick()
+
+        CPU.restore_snapshot(cpu, -1)
+        self.assertFalse(tracer._pending)
+        self.assertEqual(tracer.written, tracer._next)
+        tracer.close()
+
+        reader = TraceReader(self.path)
+        self.assertEqual(reader[-1].outcome, MemoryTracer.UNKNOWN)
+        reader.close()
+
+    def test_not_a_trace(self):
+        with open(self.path, "wb") as f:
+            f.write(b"history")
+        with self.assertRaises(ValueError):
+            TraceReader(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()